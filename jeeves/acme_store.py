@@ -0,0 +1,265 @@
+# jeeves/acme_store.py
+
+"""
+Certificate store for Traefik's ACME state.
+
+Every fresh deployment used to make Traefik ask Let's Encrypt for a new
+certificate for DOMAIN. The deploy then waited for issuance, and repeated
+rebuilds ran into Let's Encrypt's rate limits. With ACME_STORE set, the
+acme.json of a deployment whose Traefik holds a certificate for DOMAIN is
+saved, keyed by domain:
+
+  ACME_STORE=local              $JEEVES_HOME/acme/<domain>.json (~/.jeeves)
+  ACME_STORE=/some/dir          <dir>/<domain>.json
+  ACME_STORE=s3://bucket/prefix object <prefix>/<domain>.json; set
+                                ACME_STORE_ENDPOINT for an S3-compatible store
+
+The next deployment of the same DOMAIN writes it to the Traefik node
+before Traefik starts, if the certificate has more than ACME_MIN_DAYS
+(default 7) days left: prefix() is prepended to the Docker bootstraps and
+restore_to_host() runs the same script over SSH. Traefik then serves
+HTTPS as soon as it starts, and renews the certificate itself 30 days before expiry. The
+file holds the ACME account key and the certificate's private key, so the
+store must be private.
+
+The store only saves time. If it cannot be read or written, the deploy
+goes on and Traefik requests a certificate as before.
+"""
+
+from __future__ import annotations
+
+import base64
+import datetime as dt
+import json
+import os
+import pathlib
+import re
+import time
+
+from botocore.exceptions import ClientError
+
+from . import fleet
+from .journal import state_dir
+
+# Where the Docker bootstraps keep acme.json (`sudo bash -s` runs in ~ubuntu)
+ACME_PATH = "/home/ubuntu/acme.json"
+
+MIN_DAYS = 7
+
+_PEM = re.compile(rb"-----BEGIN CERTIFICATE-----(.+?)-----END CERTIFICATE-----", re.S)
+
+
+def location(value: str | None = None, env=None) -> str | None:
+    """None (off), a local directory or an s3:// URL."""
+    env = os.environ if env is None else env
+    value = (value if value is not None else env.get("ACME_STORE", "")).strip()
+    if value.lower() in ("", "0", "false", "no", "off"):
+        return None
+    if value.lower() in ("1", "true", "yes", "on", "local"):
+        return str(state_dir() / "acme")
+    return value if value.startswith("s3://") else str(pathlib.Path(value).expanduser())
+
+
+# ———————————
+# Certificate expiry
+# ———————————
+def _tlv(der: bytes, i: int) -> tuple[int, int, int]:
+    """(tag, content start, content end) of the DER element at `i`."""
+    tag, length, i = der[i], der[i + 1], i + 2
+    if length & 0x80:
+        n = length & 0x7F
+        length, i = int.from_bytes(der[i:i + n], "big"), i + n
+    return tag, i, i + length
+
+
+def _children(der: bytes, start: int, end: int) -> list[tuple[int, int, int]]:
+    out, i = [], start
+    while i < end:
+        out.append(_tlv(der, i))
+        i = out[-1][2]
+    return out
+
+
+def not_after(pem: bytes) -> dt.datetime:
+    """Expiry of the first certificate in a PEM chain."""
+    m = _PEM.search(pem)
+    if not m:
+        raise ValueError("no certificate in PEM data")
+    der = base64.b64decode(b"".join(m.group(1).split()))
+    _, start, end = _tlv(der, 0)                      # Certificate
+    _, start, end = _tlv(der, start)                  # tbsCertificate
+    fields = _children(der, start, end)
+    # [version] serialNumber signature issuer validity …
+    _, start, end = fields[4 if fields[0][0] == 0xA0 else 3]
+    tag, start, end = _children(der, start, end)[1]   # notAfter
+    text = der[start:end].decode()
+    fmt = "%y%m%d%H%M%SZ" if tag == 0x17 else "%Y%m%d%H%M%SZ"
+    return dt.datetime.strptime(text, fmt).replace(tzinfo=dt.timezone.utc)
+
+
+def certificate_expiry(acme: bytes, domain: str) -> dt.datetime | None:
+    """Latest expiry of a certificate for `domain` in a Traefik acme.json, if any."""
+    try:
+        resolvers = json.loads(acme or b"{}")
+    except ValueError:
+        return None
+    expiry = None
+    for resolver in resolvers.values() if isinstance(resolvers, dict) else ():
+        for cert in (resolver or {}).get("Certificates") or ():
+            names = [cert["domain"].get("main")] + list(cert["domain"].get("sans") or ())
+            if domain not in names:
+                continue
+            try:
+                when = not_after(base64.b64decode(cert["certificate"]))
+            except (ValueError, KeyError, IndexError):
+                continue
+            expiry = max(expiry, when) if expiry else when
+    return expiry
+
+
+# ———————————
+# Store
+# ———————————
+class AcmeStore:
+    def __init__(self, where: str, sess=None, env=None):
+        env = os.environ if env is None else env
+        self.where = where
+        self.s3 = None
+        if where.startswith("s3://"):
+            self.bucket, _, self.prefix = where[5:].partition("/")
+            if sess is None:
+                from .aws_helpers import session
+                sess = session()
+            self.s3 = sess.client("s3", endpoint_url=env.get("ACME_STORE_ENDPOINT") or None)
+
+    def _key(self, domain: str) -> str:
+        return "/".join(p for p in (self.prefix.strip("/"), f"{domain}.json") if p)
+
+    def load(self, domain: str) -> bytes | None:
+        if self.s3:
+            try:
+                return self.s3.get_object(Bucket=self.bucket, Key=self._key(domain))["Body"].read()
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                    return None
+                raise
+        path = pathlib.Path(self.where) / f"{domain}.json"
+        return path.read_bytes() if path.exists() else None
+
+    def save(self, domain: str, data: bytes) -> None:
+        if self.s3:
+            self.s3.put_object(Bucket=self.bucket, Key=self._key(domain), Body=data)
+            return
+        root = pathlib.Path(self.where)
+        root.mkdir(parents=True, exist_ok=True, mode=0o700)
+        path = root / f"{domain}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        tmp.chmod(0o600)
+        tmp.replace(path)
+
+
+def check(sess=None, env=None) -> None:
+    """Preflight: fail if ACME_STORE is set but cannot be reached."""
+    where = location(env=env)
+    if where and where.startswith("s3://"):
+        store = AcmeStore(where, sess, env)
+        store.s3.head_bucket(Bucket=store.bucket)
+
+
+def stored(domain: str, env=None, sess=None) -> bytes | None:
+    """The stored acme.json for `domain` if its certificate is still valid."""
+    env = os.environ if env is None else env
+    where = location(env=env)
+    if not where:
+        return None
+    try:
+        data = AcmeStore(where, sess, env).load(domain)
+    except Exception as e:
+        print(f"⚠️  ACME store {where} unavailable ({e}); Traefik will request a certificate")
+        return None
+    expiry = certificate_expiry(data, domain) if data else None
+    if expiry is None:
+        print(f"No stored certificate for {domain}; Traefik will request one")
+        return None
+    left = expiry - dt.datetime.now(dt.timezone.utc)
+    if left < dt.timedelta(days=int(env.get("ACME_MIN_DAYS", MIN_DAYS))):
+        print(f"Stored certificate for {domain} expires {expiry:%Y-%m-%d}; Traefik will request a new one")
+        return None
+    print(f"Reusing the stored certificate for {domain} (valid until {expiry:%Y-%m-%d})")
+    return data
+
+
+def prefix(domain: str, path: str = ACME_PATH, env=None, sess=None) -> str:
+    """
+    Script text that writes the stored acme.json for `domain` to `path`
+    unless a non-empty one is there; prepend it to a bootstrap that starts
+    Traefik. Empty if there is nothing to restore.
+    """
+    data = stored(domain, env, sess)
+    if not data:
+        return ""
+    parent = str(pathlib.PurePosixPath(path).parent)
+    return (f"ACME_JSON_B64={base64.b64encode(data).decode()}\n"
+            f'[[ -s {path} ]] || {{ mkdir -p {parent}; '
+            f'(umask 077; base64 -d <<< "$ACME_JSON_B64" > {path}); '
+            f'echo "acme.json restored; Traefik starts with the stored certificate"; }}\n')
+
+
+def restore_to_host(host: str, key_path, domain: str, path: str,
+                    label: str | None = None, env=None, sess=None) -> bool:
+    """
+    Write the stored acme.json for `domain` to `path` on `host` before
+    Traefik starts there; an existing non-empty file is kept.
+    """
+    script = prefix(domain, path, env, sess)
+    if not script:
+        return False
+    r = fleet.run_on_host(host, "sudo bash -s", key_path, timeout=60, input=script,
+                          label=label, stream=False)
+    if not r.ok:
+        print(f"⚠️  Could not restore {path} on {host}; Traefik will request a certificate")
+    return r.ok
+
+
+def save_from_host(host: str, key_path, domain: str, path: str = ACME_PATH,
+                   timeout: int = 300, label: str | None = None, env=None, sess=None) -> bool:
+    """
+    Wait up to `timeout` seconds for Traefik on `host` to hold a certificate
+    for `domain` in `path`, then store that acme.json unless the store
+    already has one that lasts as long. Returns True if it was stored.
+    """
+    env = os.environ if env is None else env
+    where = location(env=env)
+    if not where:
+        return False
+    deadline = time.time() + timeout
+    while True:
+        r = fleet.run_on_host(host, f"sudo base64 -w0 {path}", key_path, timeout=30,
+                              label=label, stream=False)
+        data = b""
+        if r.ok:
+            try:
+                data = base64.b64decode(r.output.strip())
+            except ValueError:
+                pass
+        expiry = certificate_expiry(data, domain)
+        if expiry:
+            break
+        if time.time() > deadline:
+            print(f"⚠️  No certificate for {domain} in {path} on {host}; nothing stored")
+            return False
+        time.sleep(10)
+
+    try:
+        store = AcmeStore(where, sess, env)
+        stored = store.load(domain)
+        if stored == data or (stored and (certificate_expiry(stored, domain) or expiry) > expiry):
+            print(f"Stored certificate for {domain} is current")
+            return False
+        store.save(domain, data)
+    except Exception as e:
+        print(f"⚠️  Could not save the certificate for {domain} to {where} ({e})")
+        return False
+    print(f"✔ Certificate for {domain} (valid until {expiry:%Y-%m-%d}) saved to {where}")
+    return True
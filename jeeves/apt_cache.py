@@ -0,0 +1,76 @@
+# jeeves/apt_cache.py
+
+"""
+Shared APT cache for node bootstraps.
+
+With APT_CACHE=true (or --apt-cache true), the first node of a deployment
+runs apt-cacher-ng before its own bootstrap. That node is jeeves-mongo,
+or jeeves-mongo-master for Helm. Every later bootstrap gets APT_PROXY in
+its env header, so nodes installing in parallel share one download of
+each Ubuntu, Docker and MongoDB package, and a reused cache node serves
+repeated installs at LAN speed.
+
+APT_CACHE=http://10.0.1.5:3142 (or just the host) uses a cache that is
+already running. scripts/apt_cache.sh is prepended to the bootstraps and
+does the node side. A node falls back to the public mirrors if the cache
+does not answer.
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+
+from botocore.exceptions import ClientError
+
+SCRIPTS_DIR = pathlib.Path(__file__).parents[1] / "scripts"
+SCRIPT      = SCRIPTS_DIR / "apt_cache.sh"
+
+PORT = 3142
+
+
+def mode(value: str | None = None, env=None) -> str | None:
+    """None (off), "node" (the deployment's first node) or the URL of an existing cache."""
+    env = os.environ if env is None else env
+    value = (value if value is not None else env.get("APT_CACHE", "")).strip()
+    if value.lower() in ("", "0", "false", "no", "off"):
+        return None
+    if value.lower() in ("1", "true", "yes", "on", "node"):
+        return "node"
+    if "://" not in value:
+        value = f"http://{value}"
+    if value.count(":") < 2:
+        value = f"{value}:{PORT}"
+    return value.rstrip("/")
+
+
+def url_for(host: str) -> str:
+    return f"http://{host}:{PORT}"
+
+
+def prefix(proxy: str | None = None, serve: bool = False) -> str:
+    """
+    Script text to prepend to a bootstrap: run the cache on this node
+    (`serve`) and/or send apt through `proxy`. Empty when neither.
+    """
+    if not (proxy or serve):
+        return ""
+    exports = ("export APT_CACHE_SERVE=true\n" if serve else "") + \
+              (f"export APT_PROXY={proxy}\n" if proxy else "")
+    return exports + SCRIPT.read_text()
+
+
+def allow(ec2c, sg_id: str, sources: list[str]) -> None:
+    """Open the cache port on `sg_id` to the security groups in `sources`."""
+    for src in sources:
+        try:
+            ec2c.authorize_security_group_ingress(
+                GroupId=sg_id,
+                IpPermissions=[{
+                    "IpProtocol": "tcp", "FromPort": PORT, "ToPort": PORT,
+                    "UserIdGroupPairs": [{"GroupId": src}],
+                }],
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "InvalidPermission.Duplicate":
+                raise
@@ -1,5 +1,10 @@
+import json
+import os
+import pathlib
+
 import boto3
 from .config import settings
+from . import history
 
 # Map numeric Ubuntu version strings to codenames for fallback
 _VERSION_CODENAME: dict[str, str] = {
@@ -16,19 +21,27 @@ _SUPPORTED_UBUNTU_VERSIONS = {"22.04", "20.04", "18.04"}
 def session() -> boto3.Session:
     """
     Create and return a boto3 Session using AWS credentials
-    and region configured in settings or environment.
+    and region configured in settings or environment. Every API call made
+    through it is counted in the run history.
     """
-    return boto3.Session(
+    sess = boto3.Session(
         aws_access_key_id=settings.aws_access_key_id,
         aws_secret_access_key=settings.aws_secret_access_key,
         aws_session_token=settings.aws_session_token,
         region_name=getattr(settings, "region_name", None),
     )
+    sess.events.register("before-call", history.count_aws_call)
+    return sess
+
+
+# (region, os_version) → AMI id; AMI ids differ per region
+_AMI_CACHE: dict[tuple[str, str], str] = {}
 
 
 def latest_ubuntu_ami(ec2_client, os_version: str | None = None) -> str:
     """
-    Retrieve the most recent Ubuntu AMI ID for the specified OS version.
+    Retrieve the most recent Ubuntu AMI ID for the specified OS version
+    in the client's region. Answers are cached per region for the process.
 
     Falls back to 22.04 if an unsupported version like 24.04 is requested.
 
@@ -57,6 +70,10 @@ def latest_ubuntu_ami(ec2_client, os_version: str | None = None) -> str:
             f"Supported versions: {', '.join(sorted(_SUPPORTED_UBUNTU_VERSIONS))}"
         )
 
+    cache_key = (ec2_client.meta.region_name, os_version)
+    if cache_key in _AMI_CACHE:
+        return _AMI_CACHE[cache_key]
+
     canonical_owner = "099720109477"
     codename = _VERSION_CODENAME.get(os_version)
 
@@ -94,4 +111,64 @@ def latest_ubuntu_ami(ec2_client, os_version: str | None = None) -> str:
         )
 
     images.sort(key=lambda img: img["CreationDate"])
-    return images[-1]["ImageId"]
+    _AMI_CACHE[cache_key] = images[-1]["ImageId"]
+    return _AMI_CACHE[cache_key]
+
+
+def _instance_type_cache() -> pathlib.Path:
+    base = os.environ.get("JEEVES_CACHE_DIR") or \
+        os.environ.get("XDG_CACHE_HOME", "~/.cache") + "/jeeves"
+    return pathlib.Path(base).expanduser() / "instance-types.json"
+
+
+_TYPE_INFO: dict[str, dict] = {}
+
+
+def _summarize_instance_type(t: dict) -> dict:
+    ebs = t.get("EbsInfo", {}).get("EbsOptimizedInfo", {})
+    store = t.get("InstanceStorageInfo", {})
+    return {
+        "vcpus":               t["VCpuInfo"]["DefaultVCpus"],
+        "memory_mib":          t.get("MemoryInfo", {}).get("SizeInMiB"),
+        "ebs_max_iops":        ebs.get("MaximumIops"),
+        "ebs_max_throughput":  ebs.get("MaximumThroughputInMBps"),
+        "instance_storage_gb": store.get("TotalSizeInGB", 0) if t.get("InstanceStorageSupported") else 0,
+        "instance_store_nvme": store.get("NvmeSupport") in ("required", "supported"),
+    }
+
+
+def instance_type_info(ec2_client, instance_type: str) -> dict:
+    """
+    Return the specs of `instance_type` Jeeves sizes things by: vCPUs,
+    memory, EBS-optimized IOPS/throughput ceilings and instance storage.
+
+    Instance-type specs never change, so answers from describe_instance_types
+    are kept in memory and in the Jeeves cache directory across runs.
+    """
+    if instance_type in _TYPE_INFO:
+        return _TYPE_INFO[instance_type]
+
+    path = _instance_type_cache()
+    try:
+        cached = json.loads(path.read_text())
+    except (OSError, ValueError):
+        cached = {}
+    if not isinstance(cached.get(instance_type), dict):
+        resp = ec2_client.describe_instance_types(InstanceTypes=[instance_type])
+        types = resp.get("InstanceTypes", [])
+        if not types:
+            raise RuntimeError(f"Unknown instance type '{instance_type}'")
+        cached[instance_type] = _summarize_instance_type(types[0])
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(cached, indent=2, sort_keys=True) + "\n")
+        except OSError:
+            pass
+
+    _TYPE_INFO[instance_type] = cached[instance_type]
+    return _TYPE_INFO[instance_type]
+
+
+def instance_vcpus(ec2_client, instance_type: str) -> int:
+    """Default vCPU count of `instance_type`."""
+    return int(instance_type_info(ec2_client, instance_type)["vcpus"])
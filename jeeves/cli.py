@@ -50,10 +50,14 @@ def list_pipelines():
 @click.pass_context
 def run_pipeline(ctx, pipeline_name):
     """
-    Run a pipeline. Pass any --key value options after the pipeline name.
+    Run a pipeline. Pass any --key value options after the pipeline name;
+    a bare --flag is passed as "true". With --regions r1,r2,... the
+    pipeline runs concurrently in each region (see jeeves/regions.py).
 
     e.g.
       jeeves pipelines run ec2_setup --stack-name foo --instance-type t3.small
+      jeeves pipelines run rc_microservices_helm --resume
+      jeeves pipelines run rc_mongo_docker --regions us-east-1,eu-west-1,ap-southeast-1
     """
     pipelines = discover_pipelines()
     if pipeline_name not in pipelines:
@@ -65,19 +69,31 @@ def run_pipeline(ctx, pipeline_name):
 
     # parse out --key value pairs from ctx.args
     args = ctx.args
-    it = iter(args)
     kwargs = {}
-    for token in it:
+    i = 0
+    while i < len(args):
+        token = args[i]
         if token.startswith("--"):
             key = token.lstrip("-").replace("-", "_")
-            try:
-                val = next(it)
-            except StopIteration:
-                click.echo(f"Error: expected a value after '{token}'")
-                ctx.exit(1)
-            kwargs[key] = val
+            if i + 1 < len(args) and not args[i + 1].startswith("--"):
+                kwargs[key] = args[i + 1]
+                i += 2
+                continue
+            kwargs[key] = "true"
         else:
             click.echo(f"Ignoring unexpected token: {token}")
+        i += 1
+
+    if "regions" in kwargs:
+        from jeeves import regions
+        try:
+            region_list = regions.parse_regions(kwargs.pop("regions"), pipeline_name)
+        except ValueError as e:
+            click.echo(f"Argument error: {e}")
+            ctx.exit(1)
+        forwarded = [a for k, v in kwargs.items() for a in (f"--{k.replace('_', '-')}", v)]
+        results = regions.fan_out(pipeline_name, forwarded, region_list)
+        ctx.exit(0 if all(r.ok for r in results) else 1)
 
     try:
         run_fn(**kwargs)
@@ -135,6 +151,172 @@ def describe_pipeline(pipeline_name):
 
     click.echo(docs_file.read_text())
 
+@cli.command("exec", context_settings=dict(ignore_unknown_options=True))
+@click.option("--deployment", required=True, help="Deployment tag of the target nodes.")
+@click.option("--role", default=None, help="Role tag to match (wildcards allowed, e.g. 'mongo*').")
+@click.option("--parallel", default=10, show_default=True, help="Maximum concurrent SSH sessions.")
+@click.option("--timeout", default=300, show_default=True, help="Per-host timeout in seconds.")
+@click.option("--user", default="ubuntu", show_default=True, help="SSH user.")
+@click.argument("command", nargs=-1, required=True)
+def exec_command(deployment, role, parallel, timeout, user, command):
+    """
+    Run a command on every node of a deployment.
+
+    e.g.
+      jeeves exec --deployment deploy-20250101 --role 'jeeves-k8s-*' -- uptime
+    """
+    from jeeves import fleet
+    nodes = fleet.discover(deployment, role)
+    if not nodes:
+        click.echo(f"No running nodes found for deployment '{deployment}'"
+                   + (f" with role '{role}'" if role else ""))
+        sys.exit(1)
+    key_path = fleet.default_key_path()
+    if not key_path.is_file():
+        click.echo("Error: SSH_KEY_PATH must point at the deployment's private key")
+        sys.exit(1)
+
+    hosts = {n["name"]: n["public_ip"] for n in nodes if n["public_ip"]}
+    results = fleet.run_on_hosts(
+        hosts, " ".join(command), key_path,
+        user=user, max_parallel=parallel, timeout=timeout,
+    )
+    fleet.print_summary(results)
+    sys.exit(0 if all(r.ok for r in results) else 1)
+
+@cli.group()
+def manifests():
+    """Manage the local cache of remote Kubernetes manifests."""
+    pass
+
+@manifests.command("list")
+def list_manifests():
+    """Show cached manifests and their digests."""
+    from jeeves.manifests import ManifestCache
+    cache = ManifestCache()
+    entries = cache.entries()
+    if not entries:
+        click.echo(f"Manifest cache at {cache.root} is empty.")
+        return
+    for url, entry in sorted(entries.items()):
+        click.echo(f"{entry['sha256'][:12]}  {entry['source']:<8}  {url}")
+
+@manifests.command("refresh")
+@click.option("--pin", is_flag=True, help="Also update the pinned copies shipped with the package.")
+@click.argument("urls", nargs=-1)
+def refresh_manifests(pin, urls):
+    """
+    Re-download cached manifests (default: all known ones).
+    """
+    from jeeves.manifests import ManifestCache
+    try:
+        digests = ManifestCache().refresh(list(urls) or None, pin=pin)
+    except Exception as e:
+        click.echo(f"Manifest refresh failed: {e}")
+        sys.exit(1)
+    for url, digest in digests.items():
+        click.echo(f"{digest[:12]}  {url}")
+
+@cli.command("stats")
+@click.option("--pipeline", default=None, help="Only this pipeline (default: all).")
+@click.option("--runs", default=50, show_default=True, help="Successful runs per pipeline to aggregate.")
+@click.option("--openmetrics", is_flag=True, help="Print an OpenMetrics text export instead.")
+@click.option("--output", type=click.Path(dir_okay=False), default=None,
+              help="With --openmetrics, write the export to this file (e.g. a textfile collector).")
+def stats(pipeline, runs, openmetrics, output):
+    """
+    Step timings across recorded runs: p50/p95 per step, the critical path
+    of the latest run, and steps that got slower.
+    """
+    from jeeves import history
+    if not history.db_path().exists():
+        click.echo(f"No runs recorded yet ({history.db_path()}).")
+        return
+    with history.connect() as conn:
+        if openmetrics:
+            text = history.openmetrics(conn, limit=runs)
+            if output:
+                tmp = pathlib.Path(output).with_suffix(".tmp")
+                tmp.write_text(text)
+                tmp.replace(output)
+            else:
+                click.echo(text, nl=False)
+            return
+
+        rows = history.step_stats(conn, pipeline, limit=runs)
+        if not rows:
+            click.echo("No successful runs recorded" + (f" for {pipeline}." if pipeline else "."))
+        current = None
+        for r in rows:
+            if r["pipeline"] != current:
+                current = r["pipeline"]
+                click.echo(f"\n{current}")
+                click.echo(f"  {'step':<22} {'runs':>5} {'p50':>9} {'p95':>9} {'max':>9} {'AWS calls':>10}")
+            click.echo(f"  {r['step']:<22} {r['runs']:>5} {r['p50']:8.1f}s {r['p95']:8.1f}s "
+                       f"{r['max']:8.1f}s {r['aws_calls_p50']:>10.0f}")
+
+        run, path = history.critical_path(conn, pipeline)
+        if run is not None:
+            click.echo(f"\nCritical path of the latest run (#{run['id']} {run['pipeline']}, "
+                       f"{run['outcome']}, {run['duration']:.1f}s):")
+            for s in path:
+                line = f"  {s['step']:<22} {s['duration']:8.1f}s {100 * s['share']:5.1f}%"
+                if s["slowest_cmd"]:
+                    line += f"  ← {s['slowest_cmd'][:50]} ({s['slowest_secs']:.1f}s)"
+                click.echo(line)
+
+        slower = history.regressions(conn, pipeline, limit=runs)
+        if slower:
+            click.echo("\nSlower than usual (latest run vs. earlier runs with the same parameters):")
+            for r in slower:
+                click.echo(f"  {r['pipeline']}/{r['step']}: {r['latest']:.1f}s "
+                           f"(p50 {r['p50']:.1f}s, p95 {r['p95']:.1f}s over {r['runs']} runs)")
+        elif rows:
+            click.echo("\nNo step regressions.")
+
+@cli.command("sizing")
+@click.option("--users", type=int, default=None, help="Show the plan for this many concurrent users.")
+@click.option("--calibrate", is_flag=True,
+              help="Adjust the tiers' max_users from saved loadtest results.")
+@click.option("--dry-run", is_flag=True, help="With --calibrate, show the changes without saving them.")
+def sizing_command(users, calibrate, dry_run):
+    """
+    The capacity table behind CONCURRENT_USERS sizing, the plan for a user
+    count, or a calibration of the table from load-test results.
+    """
+    from jeeves import loadtest, sizing
+    try:
+        if calibrate:
+            changes = sizing.calibrate(loadtest.load_results(limit=1000), write=not dry_run)
+            if not changes:
+                click.echo("No loadtest results change the capacity table.")
+            for name, old, new, reason in changes:
+                click.echo(f"  tier {name}: max_users {old} → {new} ({reason})")
+            if changes and not dry_run:
+                click.echo(f"Saved to {sizing.table_path()}")
+            return
+        if users:
+            plan = sizing.plan(users)
+            click.echo(plan.describe())
+            click.echo(f"  MongoDB:     {plan.mongo_type}, {plan.storage().describe()}")
+            click.echo(f"  Docker:      {plan.rc_nodes or 1} × {plan.rc_type}, "
+                       f"{plan.rc_replicas or 'one per vCPU'} Rocket.Chat replicas each"
+                       + (f", Traefik on {plan.lb_type}" if (plan.rc_nodes or 1) > 1 else ""))
+            click.echo(f"  Helm:        controller + {plan.workers or 1} worker(s) × {plan.k8s_type}, "
+                       f"{plan.mongo_replicas or 0} Mongo read replica(s)")
+            return
+        table = sizing.load_table()
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"{'tier':<6} {'users':>6}  {'mongo':<12} {'rocketchat':<16} {'k8s':<16} volume")
+    for t in table:
+        volume = t.volume if t.volume == "root" else f"{t.volume} {t.volume_gb}G/{t.volume_iops or '-'} IOPS"
+        click.echo(f"{t.name:<6} {t.max_users:>6}  {t.mongo_type:<12} "
+                   f"{f'{t.rc_nodes}×{t.rc_type}×{t.rc_replicas}':<16} "
+                   f"{f'{t.workers}×{t.k8s_type}':<16} {volume}")
+    path = sizing.table_path()
+    click.echo(f"\nOverrides: {path}" + ("" if path.exists() else " (none)"))
+
 def main():
     cli()
 
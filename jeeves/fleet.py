@@ -0,0 +1,140 @@
+# jeeves/fleet.py
+
+"""
+Fan-out remote execution over SSH.
+
+Runs one command on many hosts concurrently (bounded by `max_parallel`),
+streams each host's output with a `[host]` prefix, enforces a per-host
+timeout and returns a per-host exit-code summary.
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from .aws_helpers import session
+from . import supervisor
+
+SSH_OPTS = [
+    "-o", "StrictHostKeyChecking=no",
+    "-o", "BatchMode=yes",
+    "-o", "ConnectTimeout=10",
+]
+
+@dataclass
+class HostResult:
+    host: str
+    label: str
+    exit_code: int | None     # None when the command timed out
+    duration: float
+    output: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0
+
+
+def discover(deployment: str, role: str | None = None, ec2_client=None) -> list[dict]:
+    """
+    Find running instances tagged Deployment=<deployment> (and Role=<role>,
+    wildcards allowed), sorted by Name tag.
+    """
+    ec2c = ec2_client or session().client("ec2")
+    filters = [
+        {"Name": "tag:Deployment",      "Values": [deployment]},
+        {"Name": "instance-state-name", "Values": ["running"]},
+    ]
+    if role:
+        filters.append({"Name": "tag:Role", "Values": [role]})
+
+    nodes = []
+    for page in ec2c.get_paginator("describe_instances").paginate(Filters=filters):
+        for r in page["Reservations"]:
+            for inst in r["Instances"]:
+                tags = {t["Key"]: t["Value"] for t in inst.get("Tags", [])}
+                nodes.append({
+                    "id":         inst["InstanceId"],
+                    "name":       tags.get("Name", inst["InstanceId"]),
+                    "role":       tags.get("Role", ""),
+                    "public_ip":  inst.get("PublicIpAddress"),
+                    "private_ip": inst.get("PrivateIpAddress"),
+                })
+    return sorted(nodes, key=lambda n: (n["name"], n["id"]))
+
+
+def run_on_host(host: str, command: str, key_path: str | pathlib.Path, user: str = "ubuntu",
+                timeout: float = 300, input: str | None = None, label: str | None = None,
+                stream: bool = True) -> HostResult:
+    """
+    Run `command` on one host, optionally feeding `input` on stdin.
+    The ssh process group is killed once `timeout` seconds have passed.
+    """
+    label = label or host
+    res = supervisor.run(
+        ["ssh", *SSH_OPTS, "-i", str(key_path), f"{user}@{host}", command],
+        timeout=timeout, input=input, stream=stream, label=label,
+    )
+    return HostResult(host, label, res.exit_code, res.duration, res.output)
+
+
+def run_on_hosts(hosts: list[str] | dict[str, str], command: str, key_path: str | pathlib.Path,
+                 user: str = "ubuntu", max_parallel: int = 10, timeout: float = 300,
+                 input: str | dict[str, str] | None = None, stream: bool = True) -> list[HostResult]:
+    """
+    Run `command` on every host concurrently, at most `max_parallel` at once.
+    `hosts` may be a list of addresses or a mapping label → address, and
+    `input` one stdin for all hosts or a mapping label → stdin.
+    Results come back in the order the hosts were given.
+    """
+    targets = hosts.items() if isinstance(hosts, dict) else [(h, h) for h in hosts]
+    if not targets:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as pool:
+        futures = [
+            pool.submit(run_on_host, addr, command, key_path, user, timeout,
+                        input.get(label) if isinstance(input, dict) else input, label, stream)
+            for label, addr in targets
+        ]
+        return [f.result() for f in futures]
+
+
+def wait_for_ssh(host: str, key_path: str | pathlib.Path, user: str = "ubuntu", timeout: int = 300) -> None:
+    """
+    Wait until 'ssh -i key_path user@host true' succeeds, or timeout.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        res = supervisor.run(["ssh", *SSH_OPTS, "-i", str(key_path), f"{user}@{host}", "true"],
+                             timeout=30, stream=False)
+        if res.ok:
+            return
+        time.sleep(5)
+    raise TimeoutError(f"SSH to {user}@{host} with key {key_path} timed out")
+
+
+def print_summary(results: list[HostResult]) -> None:
+    width = max((len(r.label) for r in results), default=4)
+    print()
+    print("host".ljust(width) + "  exit    time")
+    for r in results:
+        code = "T/O" if r.exit_code is None else str(r.exit_code)
+        mark = "✔" if r.ok else "✘"
+        print(f"{r.label.ljust(width)}  {code:>4}  {r.duration:6.1f}s {mark}")
+
+
+def check(results: list[HostResult], what: str = "remote command") -> None:
+    """Raise RuntimeError naming every host where the command failed."""
+    failed = [r for r in results if not r.ok]
+    if failed:
+        detail = ", ".join(
+            f"{r.label} ({'timeout' if r.exit_code is None else f'exit {r.exit_code}'})" for r in failed
+        )
+        raise RuntimeError(f"{what} failed on {detail}")
+
+
+def default_key_path() -> pathlib.Path:
+    return pathlib.Path(os.environ.get("SSH_KEY_PATH", "")).expanduser()
@@ -0,0 +1,348 @@
+# jeeves/history.py
+
+"""
+Run history: every pipeline run in a local SQLite database.
+
+Pipeline.execute() opens a record for the run. Pipelines mark where each
+of their steps begins with `history.step("name")`; a step lasts until the
+next one begins. Each step stores its duration, the AWS API calls made
+during it (counted by a botocore before-call hook that aws_helpers.session()
+installs) and the slowest supervised command that ran in it. When the run
+ends its outcome is written to ~/.jeeves/history.db in one transaction.
+
+`jeeves stats` reads the database back: p50/p95 per step, the critical
+path of the latest run, steps that got slower, and an OpenMetrics export.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import sqlite3
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from .journal import state_dir
+from . import supervisor
+
+# A step is a regression when its latest duration exceeds the baseline p95
+# and is at least REGRESSION_RATIO times the baseline p50 and
+# REGRESSION_MIN_SECONDS longer, over at least REGRESSION_MIN_RUNS earlier runs.
+REGRESSION_RATIO       = 1.5
+REGRESSION_MIN_SECONDS = 10.0
+REGRESSION_MIN_RUNS    = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    pipeline    TEXT NOT NULL,
+    params_hash TEXT NOT NULL,
+    params      TEXT NOT NULL,
+    region      TEXT,
+    started_at  REAL NOT NULL,
+    duration    REAL NOT NULL,
+    outcome     TEXT NOT NULL,          -- ok | failed | interrupted
+    error       TEXT
+);
+CREATE TABLE IF NOT EXISTS steps (
+    run_id       INTEGER NOT NULL REFERENCES runs(id),
+    seq          INTEGER NOT NULL,
+    name         TEXT NOT NULL,
+    duration     REAL NOT NULL,
+    aws_calls    INTEGER NOT NULL,
+    slowest_cmd  TEXT,
+    slowest_secs REAL,
+    PRIMARY KEY (run_id, seq)
+);
+CREATE TABLE IF NOT EXISTS aws_calls (
+    run_id    INTEGER NOT NULL REFERENCES runs(id),
+    operation TEXT NOT NULL,
+    count     INTEGER NOT NULL,
+    PRIMARY KEY (run_id, operation)
+);
+CREATE INDEX IF NOT EXISTS runs_by_pipeline ON runs (pipeline, started_at);
+"""
+
+
+def db_path():
+    return state_dir() / "history.db"
+
+
+def connect() -> sqlite3.Connection:
+    path = db_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # regions fanned out by jeeves.regions write concurrently
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+# ———————————
+# Recording
+# ———————————
+@dataclass
+class _Step:
+    name: str
+    started: float
+    duration: float = 0.0
+    aws_calls: int = 0
+
+
+@dataclass
+class RunRecord:
+    pipeline: str
+    params: dict
+    region: str | None
+    started: float = field(default_factory=time.time)
+    steps: list[_Step] = field(default_factory=list)
+    calls: Counter = field(default_factory=Counter)
+    _calls_at_step: int = 0
+
+    @property
+    def params_hash(self) -> str:
+        blob = json.dumps(self.params, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode()).hexdigest()[:12]
+
+    def step(self, name: str) -> None:
+        now = time.time()
+        self._close(now)
+        self.steps.append(_Step(name, now))
+
+    def _close(self, now: float) -> None:
+        total = sum(self.calls.values())
+        if self.steps:
+            last = self.steps[-1]
+            last.duration = now - last.started
+            last.aws_calls = total - self._calls_at_step
+        self._calls_at_step = total
+
+
+_current: RunRecord | None = None
+_lock = threading.Lock()
+
+
+def start(pipeline: str, params: dict, region: str | None = None) -> RunRecord:
+    """Begin recording a run; Pipeline.execute() calls this."""
+    global _current
+    with _lock:
+        _current = RunRecord(pipeline, params, region)
+    return _current
+
+
+def step(name: str) -> None:
+    """Mark the start of step `name` (and the end of the previous one)."""
+    with _lock:
+        if _current is not None:
+            _current.step(name)
+
+
+def count_aws_call(model=None, **kwargs) -> None:
+    """botocore before-call handler: count one API call on the current run."""
+    with _lock:
+        if _current is not None and model is not None:
+            _current.calls[f"{model.service_model.service_name}.{model.name}"] += 1
+
+
+def finish(outcome: str, error: str | None = None) -> int | None:
+    """
+    Close the current run and store it. Returns the run id, or None if
+    nothing was being recorded or the database could not be written
+    (history must never fail a deployment).
+    """
+    global _current
+    with _lock:
+        rec, _current = _current, None
+    if rec is None:
+        return None
+    end = time.time()
+    rec._close(end)
+
+    commands = list(supervisor.history)
+    try:
+        with connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO runs (pipeline, params_hash, params, region, started_at, duration, outcome, error)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (rec.pipeline, rec.params_hash, json.dumps(rec.params, sort_keys=True, default=str),
+                 rec.region, rec.started, end - rec.started, outcome, error),
+            )
+            run_id = cur.lastrowid
+            for seq, s in enumerate(rec.steps):
+                slowest = max(
+                    (c for c in commands if s.started <= c.started < s.started + s.duration),
+                    key=lambda c: c.duration, default=None,
+                )
+                conn.execute(
+                    "INSERT INTO steps VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (run_id, seq, s.name, s.duration, s.aws_calls,
+                     " ".join(slowest.cmd)[:200] if slowest else None,
+                     slowest.duration if slowest else None),
+                )
+            conn.executemany(
+                "INSERT INTO aws_calls VALUES (?, ?, ?)",
+                [(run_id, op, n) for op, n in sorted(rec.calls.items())],
+            )
+        return run_id
+    except sqlite3.Error as e:
+        print(f"⚠️  Could not record run history in {db_path()}: {e}")
+        return None
+
+
+# ———————————
+# Statistics
+# ———————————
+def percentile(values: list[float], q: float) -> float:
+    """Linear-interpolated percentile, q in [0, 1]."""
+    if not values:
+        return math.nan
+    values = sorted(values)
+    pos = (len(values) - 1) * q
+    lo, hi = math.floor(pos), math.ceil(pos)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def _runs(conn, pipeline: str | None, limit: int, outcome: str | None = "ok") -> list[sqlite3.Row]:
+    sql, args = "SELECT * FROM runs WHERE 1=1", []
+    if pipeline:
+        sql += " AND pipeline = ?"
+        args.append(pipeline)
+    if outcome:
+        sql += " AND outcome = ?"
+        args.append(outcome)
+    sql += " ORDER BY started_at DESC LIMIT ?"
+    args.append(limit)
+    return conn.execute(sql, args).fetchall()
+
+
+def _steps(conn, run_ids: list[int]) -> dict[int, list[sqlite3.Row]]:
+    out: dict[int, list] = {i: [] for i in run_ids}
+    if run_ids:
+        marks = ",".join("?" * len(run_ids))
+        for row in conn.execute(f"SELECT * FROM steps WHERE run_id IN ({marks}) ORDER BY run_id, seq", run_ids):
+            out[row["run_id"]].append(row)
+    return out
+
+
+def step_stats(conn, pipeline: str | None = None, limit: int = 50) -> list[dict]:
+    """p50/p95/max per (pipeline, step) over the last `limit` successful runs."""
+    runs = _runs(conn, pipeline, limit)
+    steps = _steps(conn, [r["id"] for r in runs])
+    by_step: dict[tuple[str, str], list[float]] = {}
+    calls: dict[tuple[str, str], list[int]] = {}
+    order: dict[tuple[str, str], int] = {}
+    for r in runs:
+        for s in steps[r["id"]]:
+            key = (r["pipeline"], s["name"])
+            by_step.setdefault(key, []).append(s["duration"])
+            calls.setdefault(key, []).append(s["aws_calls"])
+            order[key] = min(order.get(key, s["seq"]), s["seq"])
+    return [
+        {
+            "pipeline": p, "step": name, "runs": len(d),
+            "p50": percentile(d, 0.5), "p95": percentile(d, 0.95), "max": max(d),
+            "sum": sum(d), "aws_calls_p50": percentile(calls[(p, name)], 0.5),
+        }
+        for (p, name), d in sorted(by_step.items(), key=lambda kv: (kv[0][0], order[kv[0]]))
+    ]
+
+
+def critical_path(conn, pipeline: str | None = None) -> tuple[sqlite3.Row | None, list[dict]]:
+    """
+    The latest run and its steps in order. Steps run one after another, so
+    together they are the critical path; within a step the slowest command
+    is what the step waited on.
+    """
+    runs = _runs(conn, pipeline, 1, outcome=None)
+    if not runs:
+        return None, []
+    run = runs[0]
+    rows = _steps(conn, [run["id"]])[run["id"]]
+    return run, [
+        {"step": s["name"], "duration": s["duration"],
+         "share": s["duration"] / run["duration"] if run["duration"] else 0.0,
+         "aws_calls": s["aws_calls"], "slowest_cmd": s["slowest_cmd"], "slowest_secs": s["slowest_secs"]}
+        for s in rows
+    ]
+
+
+def regressions(conn, pipeline: str | None = None, limit: int = 50) -> list[dict]:
+    """
+    Steps of each pipeline's latest successful run that were much slower
+    than the earlier successful runs with the same parameters.
+    """
+    found = []
+    pipelines = [pipeline] if pipeline else \
+        [r[0] for r in conn.execute("SELECT DISTINCT pipeline FROM runs ORDER BY pipeline")]
+    for p in pipelines:
+        runs = _runs(conn, p, limit + 1)
+        if not runs:
+            continue
+        latest, earlier = runs[0], [r for r in runs[1:] if r["params_hash"] == runs[0]["params_hash"]]
+        if len(earlier) < REGRESSION_MIN_RUNS:
+            continue
+        steps = _steps(conn, [r["id"] for r in runs])
+        for s in steps[latest["id"]]:
+            base = [b["duration"] for r in earlier for b in steps[r["id"]] if b["name"] == s["name"]]
+            if len(base) < REGRESSION_MIN_RUNS:
+                continue
+            p50, p95 = percentile(base, 0.5), percentile(base, 0.95)
+            if s["duration"] > p95 and s["duration"] >= p50 * REGRESSION_RATIO \
+                    and s["duration"] - p50 >= REGRESSION_MIN_SECONDS:
+                found.append({"pipeline": p, "step": s["name"], "latest": s["duration"],
+                              "p50": p50, "p95": p95, "runs": len(base), "run_id": latest["id"]})
+    return found
+
+
+def openmetrics(conn, limit: int = 50) -> str:
+    """OpenMetrics text exposition of run counts, step durations and AWS calls."""
+    def esc(v: str) -> str:
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    lines = [
+        "# TYPE jeeves_runs counter",
+        "# HELP jeeves_runs Pipeline runs recorded, by outcome.",
+    ]
+    for row in conn.execute("SELECT pipeline, outcome, COUNT(*) FROM runs GROUP BY pipeline, outcome ORDER BY 1, 2"):
+        lines.append(f'jeeves_runs_total{{pipeline="{esc(row[0])}",outcome="{esc(row[1])}"}} {row[2]}')
+
+    lines += [
+        "# TYPE jeeves_last_run_duration_seconds gauge",
+        "# UNIT jeeves_last_run_duration_seconds seconds",
+        "# HELP jeeves_last_run_duration_seconds Wall time of the latest run.",
+    ]
+    for row in conn.execute(
+        "SELECT pipeline, duration, outcome FROM runs r WHERE started_at = "
+        "(SELECT MAX(started_at) FROM runs WHERE pipeline = r.pipeline) ORDER BY pipeline"
+    ):
+        lines.append(f'jeeves_last_run_duration_seconds{{pipeline="{esc(row[0])}",outcome="{esc(row[2])}"}} '
+                     f"{row[1]:.3f}")
+
+    lines += [
+        "# TYPE jeeves_step_duration_seconds summary",
+        "# UNIT jeeves_step_duration_seconds seconds",
+        f"# HELP jeeves_step_duration_seconds Step durations over the last {limit} successful runs.",
+    ]
+    for s in step_stats(conn, limit=limit):
+        labels = f'pipeline="{esc(s["pipeline"])}",step="{esc(s["step"])}"'
+        for q in ("0.5", "0.95"):
+            v = s["p50"] if q == "0.5" else s["p95"]
+            lines.append(f'jeeves_step_duration_seconds{{{labels},quantile="{q}"}} {v:.3f}')
+        lines.append(f"jeeves_step_duration_seconds_sum{{{labels}}} {s['sum']:.3f}")
+        lines.append(f"jeeves_step_duration_seconds_count{{{labels}}} {s['runs']}")
+
+    lines += [
+        "# TYPE jeeves_aws_calls counter",
+        "# HELP jeeves_aws_calls AWS API calls made by pipeline runs, by operation.",
+    ]
+    for row in conn.execute(
+        "SELECT r.pipeline, a.operation, SUM(a.count) FROM aws_calls a JOIN runs r ON r.id = a.run_id "
+        "GROUP BY r.pipeline, a.operation ORDER BY 1, 2"
+    ):
+        lines.append(f'jeeves_aws_calls_total{{pipeline="{esc(row[0])}",operation="{esc(row[1])}"}} {row[2]}')
+
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
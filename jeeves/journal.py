@@ -0,0 +1,141 @@
+# jeeves/journal.py
+
+"""
+Step checkpoint journal for resumable pipeline runs.
+
+Each pipeline run writes ~/.jeeves/deployments/<deployment>/<pipeline>.json
+recording the run's parameters and, in order, every step that completed
+together with its outputs (instance IDs, IPs, file paths). A run started
+with --resume reloads the journal, lets the pipeline cheaply re-validate
+the recorded outputs and skips straight to the first incomplete step.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+from datetime import datetime, timezone
+
+
+def state_dir() -> pathlib.Path:
+    return pathlib.Path(os.environ.get("JEEVES_HOME", "~/.jeeves")).expanduser()
+
+
+def deployment_dir(deployment: str) -> pathlib.Path:
+    return state_dir() / "deployments" / deployment
+
+
+class Journal:
+    """
+    Ordered record of completed steps for one pipeline in one deployment.
+
+    Usage:
+        journal = Journal.open("rc_microservices_helm", deployment, params, resume=True)
+        if not journal.done("provision"):
+            ...
+            journal.record("provision", nodes={...})
+        nodes = journal.outputs("provision")["nodes"]
+    """
+
+    def __init__(self, pipeline: str, deployment: str, path: pathlib.Path | None = None):
+        self.pipeline = pipeline
+        self.deployment = deployment
+        self.path = path or deployment_dir(deployment) / f"{pipeline}.json"
+        self.data = {"pipeline": pipeline, "deployment": deployment, "params": {}, "steps": []}
+
+    # ———————————
+    # Loading
+    # ———————————
+    @classmethod
+    def latest(cls, pipeline: str) -> "Journal | None":
+        """Most recently updated journal of `pipeline` that did not finish."""
+        candidates = []
+        for path in (state_dir() / "deployments").glob(f"*/{pipeline}.json"):
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            if not data.get("finished"):
+                candidates.append((path.stat().st_mtime, path, data))
+        if not candidates:
+            return None
+        _, path, data = max(candidates, key=lambda c: c[0])
+        journal = cls(pipeline, data["deployment"], path)
+        journal.data = data
+        return journal
+
+    @classmethod
+    def open(cls, pipeline: str, deployment: str | None, params: dict,
+             resume: bool = False) -> "Journal":
+        """
+        Start a journal for a fresh run, or with `resume` reload the one for
+        `deployment` (default: the latest unfinished run of `pipeline`).
+        Resuming with different parameters is refused.
+        """
+        if resume:
+            journal = cls(pipeline, deployment) if deployment else cls.latest(pipeline)
+            if journal is None or not journal.path.exists():
+                raise RuntimeError(f"Nothing to resume: no unfinished {pipeline} journal found")
+            journal.data = json.loads(journal.path.read_text())
+            changed = {
+                k for k in set(params) | set(journal.data.get("params", {}))
+                if params.get(k) != journal.data["params"].get(k)
+            }
+            if changed:
+                raise RuntimeError(
+                    f"Cannot resume {journal.deployment}: {', '.join(sorted(changed))} changed "
+                    "since the journaled run; re-run without --resume"
+                )
+            done = ", ".join(journal.completed()) or "none"
+            print(f"↩️  Resuming {pipeline} for {journal.deployment} (completed: {done})")
+            return journal
+
+        journal = cls(pipeline, deployment)
+        journal.data["params"] = params
+        journal.data["started_at"] = _now()
+        journal._save()
+        return journal
+
+    # ———————————
+    # Steps
+    # ———————————
+    def completed(self) -> list[str]:
+        return [s["name"] for s in self.data["steps"]]
+
+    def done(self, step: str) -> bool:
+        return step in self.completed()
+
+    def outputs(self, step: str) -> dict:
+        for s in self.data["steps"]:
+            if s["name"] == step:
+                return s["outputs"]
+        raise KeyError(f"Step '{step}' has not completed")
+
+    def record(self, step: str, **outputs) -> None:
+        """Mark `step` complete with its outputs (replacing any earlier record)."""
+        self.data["steps"] = [s for s in self.data["steps"] if s["name"] != step]
+        self.data["steps"].append({"name": step, "finished_at": _now(), "outputs": outputs})
+        self._save()
+
+    def invalidate(self, step: str) -> None:
+        """Forget `step` and every step recorded after it."""
+        names = self.completed()
+        if step in names:
+            self.data["steps"] = self.data["steps"][:names.index(step)]
+            self._save()
+            print(f"↩️  Journal: re-running from '{step}'")
+
+    def finish(self) -> None:
+        self.data["finished"] = _now()
+        self._save()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.data, indent=2, default=str) + "\n")
+        tmp.replace(self.path)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
@@ -0,0 +1,521 @@
+# jeeves/kube.py
+
+"""
+Minimal in-process access to the Kubernetes API.
+
+Reads the kubeconfig that the Helm pipeline fetches from the MicroK8s
+controller and talks to the kube-apiserver over one persistent HTTPS
+connection, so readiness checks don't have to fork kubectl in a loop.
+
+StandInAPIServer is a local stand-in that keeps objects in memory and
+answers the calls Jeeves makes (get, list and deletecollection by label,
+delete, merge-patch), so the cleanup path can be run without a cluster.
+"""
+
+from __future__ import annotations
+
+import base64
+import http.client
+import http.server
+import json
+import os
+import pathlib
+import ssl
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import yaml
+
+# Label Jeeves puts on the objects it applies, and the selector its cleanup uses
+MANAGED_LABELS   = {"app.kubernetes.io/managed-by": "jeeves"}
+MANAGED_SELECTOR = ",".join(f"{k}={v}" for k, v in MANAGED_LABELS.items())
+
+
+def load_kubeconfig(path: str | pathlib.Path) -> dict:
+    """
+    Resolve the current context of a kubeconfig into the bits needed to
+    open a connection: server URL, CA data and client credentials.
+    """
+    cfg = yaml.safe_load(pathlib.Path(path).read_text())
+
+    current = cfg.get("current-context")
+    contexts = {c["name"]: c["context"] for c in cfg.get("contexts", [])}
+    clusters = {c["name"]: c["cluster"] for c in cfg.get("clusters", [])}
+    users    = {u["name"]: u.get("user", {}) for u in cfg.get("users", [])}
+
+    if current and current in contexts:
+        ctx = contexts[current]
+    elif contexts:
+        ctx = next(iter(contexts.values()))
+    else:
+        raise RuntimeError(f"No context found in kubeconfig {path}")
+
+    cluster = clusters.get(ctx["cluster"])
+    if not cluster or "server" not in cluster:
+        raise RuntimeError(f"Cluster '{ctx['cluster']}' missing from kubeconfig {path}")
+    user = users.get(ctx.get("user"), {})
+
+    def _data(entry: dict, key: str) -> str | None:
+        if entry.get(f"{key}-data"):
+            return base64.b64decode(entry[f"{key}-data"]).decode()
+        if entry.get(key):
+            return pathlib.Path(entry[key]).expanduser().read_text()
+        return None
+
+    return {
+        "server":   cluster["server"].rstrip("/"),
+        "ca":       _data(cluster, "certificate-authority"),
+        "insecure": bool(cluster.get("insecure-skip-tls-verify")),
+        "cert":     _data(user, "client-certificate"),
+        "key":      _data(user, "client-key"),
+        "token":    user.get("token"),
+        "username": user.get("username"),
+        "password": user.get("password"),
+    }
+
+
+class KubeAPI:
+    """
+    Thin client for the kube-apiserver that keeps a single HTTPS
+    connection open and transparently reconnects when it drops.
+    """
+
+    def __init__(self, kubeconfig_path: str | pathlib.Path, timeout: float = 10.0):
+        self.kubeconfig_path = pathlib.Path(kubeconfig_path)
+        self.timeout = timeout
+        self.config = load_kubeconfig(self.kubeconfig_path)
+
+        url = urlsplit(self.config["server"])
+        self.host = url.hostname
+        self.secure = url.scheme != "http"      # plain HTTP only for StandInAPIServer
+        self.port = url.port or (443 if self.secure else 80)
+        self._ssl = self._ssl_context() if self.secure else None
+        self._conn: http.client.HTTPConnection | None = None
+
+        self._headers = {"Accept": "application/json"}
+        if self.config["token"]:
+            self._headers["Authorization"] = f"Bearer {self.config['token']}"
+        elif self.config["username"]:
+            basic = f"{self.config['username']}:{self.config['password'] or ''}"
+            self._headers["Authorization"] = "Basic " + base64.b64encode(basic.encode()).decode()
+
+    def _ssl_context(self) -> ssl.SSLContext:
+        ctx = ssl.create_default_context(cadata=self.config["ca"]) if self.config["ca"] \
+            else ssl.create_default_context()
+        # The kubeconfig is patched to reach the API through a local tunnel,
+        # so the hostname never matches the certificate SANs.
+        ctx.check_hostname = False
+        insecure = self.config["insecure"] or \
+            os.environ.get("KUBE_INSECURE_SKIP_TLS_VERIFY", "").lower() == "true"
+        if insecure:
+            ctx.verify_mode = ssl.CERT_NONE
+
+        if self.config["cert"] and self.config["key"]:
+            # load_cert_chain only accepts file paths
+            with tempfile.TemporaryDirectory() as tmp:
+                cert_file = pathlib.Path(tmp) / "client.crt"
+                key_file  = pathlib.Path(tmp) / "client.key"
+                cert_file.write_text(self.config["cert"])
+                key_file.write_text(self.config["key"])
+                key_file.chmod(0o600)
+                ctx.load_cert_chain(str(cert_file), str(key_file))
+        return ctx
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            self._conn = http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.timeout, context=self._ssl
+            ) if self.secure else http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def request(self, method: str, path: str, body: dict | None = None,
+                headers: dict | None = None) -> tuple[int, bytes]:
+        """
+        Issue a request on the persistent connection and return
+        (status, raw body). A stale keep-alive connection is retried once.
+        """
+        payload = json.dumps(body).encode() if body is not None else None
+        hdrs = dict(self._headers)
+        if payload is not None:
+            hdrs["Content-Type"] = "application/json"
+        hdrs.update(headers or {})
+
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=payload, headers=hdrs)
+                resp = conn.getresponse()
+                return resp.status, resp.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self.close()
+                if attempt == 2:
+                    raise
+            except Exception:
+                self.close()
+                raise
+        raise AssertionError("unreachable")
+
+    def get_json(self, path: str, **params) -> dict | None:
+        """GET `path` and decode the JSON body; returns None on 404."""
+        status, body = self.request("GET", _with_query(path, params))
+        if status == 404:
+            return None
+        if status >= 400:
+            raise RuntimeError(f"GET {path} failed: HTTP {status} {body[:200]!r}")
+        return json.loads(body)
+
+    def delete(self, path: str, propagation: str = "Background", **params) -> int:
+        """
+        DELETE a single object or, when `path` is a collection, every object
+        matching `params` (e.g. labelSelector). Missing objects are not an error.
+        """
+        status, body = self.request(
+            "DELETE", _with_query(path, params),
+            body={"kind": "DeleteOptions", "apiVersion": "v1", "propagationPolicy": propagation},
+        )
+        if status >= 400 and status not in (404, 405):
+            raise RuntimeError(f"DELETE {path} failed: HTTP {status} {body[:200]!r}")
+        return status
+
+    def patch(self, path: str, body: dict) -> dict | None:
+        """JSON merge-patch one object; returns None if it does not exist."""
+        status, raw = self.request("PATCH", path, body=body,
+                                   headers={"Content-Type": "application/merge-patch+json"})
+        if status == 404:
+            return None
+        if status >= 400:
+            raise RuntimeError(f"PATCH {path} failed: HTTP {status} {raw[:200]!r}")
+        return json.loads(raw)
+
+    def __enter__(self) -> "KubeAPI":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _with_query(path: str, params: dict) -> str:
+    params = {k: v for k, v in params.items() if v is not None}
+    return f"{path}?{urlencode(params)}" if params else path
+
+
+# Plural resource names for the kinds Jeeves creates, so deletes don't need
+# an API discovery round-trip per kind.
+_PLURALS = {
+    "CustomResourceDefinition": "customresourcedefinitions",
+    "ClusterRole":              "clusterroles",
+    "ClusterRoleBinding":       "clusterrolebindings",
+    "Role":                     "roles",
+    "RoleBinding":              "rolebindings",
+    "ServiceAccount":           "serviceaccounts",
+    "IngressRoute":             "ingressroutes",
+    "IngressRouteTCP":          "ingressroutetcps",
+    "IngressRouteUDP":          "ingressrouteudps",
+    "Middleware":               "middlewares",
+    "MiddlewareTCP":            "middlewaretcps",
+    "TLSOption":                "tlsoptions",
+    "TLSStore":                 "tlsstores",
+    "TraefikService":           "traefikservices",
+    "ServersTransport":         "serverstransports",
+    "ServersTransportTCP":      "serverstransporttcps",
+    "Ingress":                  "ingresses",
+    "ConfigMap":                "configmaps",
+    "Secret":                   "secrets",
+    "Service":                  "services",
+    "Deployment":               "deployments",
+    "PersistentVolumeClaim":    "persistentvolumeclaims",
+    "PersistentVolume":         "persistentvolumes",
+    "Namespace":                "namespaces",
+}
+
+_CLUSTER_SCOPED = {
+    "CustomResourceDefinition", "ClusterRole", "ClusterRoleBinding",
+    "Namespace", "PersistentVolume", "StorageClass",
+}
+
+
+def resource_path(api_version: str, kind: str, namespace: str | None = None,
+                  name: str | None = None) -> str:
+    """
+    Build the REST path for a kind (or one object of it), e.g.
+    ("traefik.io/v1alpha1", "Middleware", "psautoinfra") →
+    /apis/traefik.io/v1alpha1/namespaces/psautoinfra/middlewares
+    """
+    prefix = "/api/v1" if api_version == "v1" else f"/apis/{api_version}"
+    plural = _PLURALS.get(kind, kind.lower() + "s")
+    path = prefix
+    if namespace and kind not in _CLUSTER_SCOPED:
+        path += f"/namespaces/{namespace}"
+    path += f"/{plural}"
+    if name:
+        path += f"/{name}"
+    return path
+
+
+def manifest_object_paths(text: str, default_namespace: str = "default") -> list[str]:
+    """
+    Parse a (multi-document) YAML manifest into the REST paths of its objects.
+    """
+    paths = []
+    for doc in yaml.safe_load_all(text):
+        if not doc or "kind" not in doc:
+            continue
+        if doc["kind"].endswith("List"):
+            items = doc.get("items", [])
+        else:
+            items = [doc]
+        for obj in items:
+            meta = obj.get("metadata", {})
+            paths.append(resource_path(
+                obj["apiVersion"], obj["kind"],
+                meta.get("namespace", default_namespace), meta["name"],
+            ))
+    return paths
+
+
+def label_objects(api: KubeAPI, object_paths: list[str],
+                  labels: dict[str, str] = MANAGED_LABELS) -> list[str]:
+    """Add `labels` to every object that exists; returns the paths labelled."""
+    return [p for p in object_paths
+            if api.patch(p, {"metadata": {"labels": labels}}) is not None]
+
+
+def wait_for_deletion(api: KubeAPI, object_paths: list[str],
+                      collections: list[tuple[str, str | None]] = (),
+                      timeout: float = 300, max_delay: float = 5.0) -> list[str]:
+    """
+    Wait for every object path to 404 and every (collection, labelSelector)
+    to list empty, checking them all on each pass. Returns whatever is still
+    present when `timeout` expires (empty list on success).
+    """
+    pending_objects = list(object_paths)
+    pending_colls = list(collections)
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    while True:
+        pending_objects = [p for p in pending_objects if api.get_json(p) is not None]
+        still = []
+        for path, selector in pending_colls:
+            listing = api.get_json(path, labelSelector=selector)
+            if listing and listing.get("items"):
+                still.append((path, selector))
+        pending_colls = still
+
+        remaining = pending_objects + [p if not s else f"{p}?labelSelector={s}" for p, s in pending_colls]
+        if not remaining or time.monotonic() + delay > deadline:
+            return remaining
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+def wait_for_apiserver(kubeconfig_path: str | pathlib.Path, timeout: float = 300,
+                       initial_delay: float = 0.05, max_delay: float = 5.0) -> float:
+    """
+    Poll /readyz on the API server until it answers 200, backing off
+    exponentially from `initial_delay` up to `max_delay` between attempts.
+
+    Returns the number of seconds it took; raises TimeoutError otherwise.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = initial_delay
+    last_error = "no response"
+
+    with KubeAPI(kubeconfig_path, timeout=min(10.0, timeout)) as api:
+        while True:
+            try:
+                status, body = api.request("GET", "/readyz")
+                if status == 200:
+                    return time.monotonic() - start
+                last_error = f"HTTP {status}: {body[:200].decode(errors='replace').strip()}"
+            except (OSError, http.client.HTTPException) as e:
+                last_error = str(e) or e.__class__.__name__
+
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(
+                    f"kube-apiserver at {api.config['server']} not ready after {timeout}s ({last_error})"
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+
+def patch_kubeconfig_server(path: str | pathlib.Path, server: str) -> bool:
+    """
+    Point every cluster in the kubeconfig at `server` (e.g. the local end
+    of an SSH tunnel). Returns True if the file was changed.
+    """
+    path = pathlib.Path(path)
+    cfg = yaml.safe_load(path.read_text())
+    changed = False
+    for entry in cfg.get("clusters", []):
+        cluster = entry.get("cluster", {})
+        if cluster.get("server") != server:
+            cluster["server"] = server
+            changed = True
+    if changed:
+        path.write_text(yaml.safe_dump(cfg, default_flow_style=False))
+    return changed
+
+
+# ———————————
+# Local stand-in
+# ———————————
+def _matches(obj: dict, selector: str | None) -> bool:
+    """Equality-based label selectors (k=v,k2=v2), the only kind Jeeves uses."""
+    labels = obj.get("metadata", {}).get("labels") or {}
+    for term in filter(None, (selector or "").split(",")):
+        key, _, value = term.partition("=")
+        if labels.get(key) != value:
+            return False
+    return True
+
+
+class _StandInAPIHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status: int, body: dict) -> None:
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _request(self) -> tuple[str, str | None, dict | None]:
+        url = urlsplit(self.path)
+        selector = parse_qs(url.query).get("labelSelector", [None])[0]
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        self.server.stand_in.requests.append((self.command, self.path))
+        return url.path, selector, body
+
+    def do_GET(self):
+        path, selector, _ = self._request()
+        server = self.server.stand_in
+        if path == "/readyz":
+            self._reply(200, {"status": "ok"})
+        elif path in server.live():
+            self._reply(200, server.live()[path])
+        elif server.is_collection(path):
+            self._reply(200, {"kind": "List", "items": server.list(path, selector)})
+        else:
+            self._reply(404, {"kind": "Status", "code": 404})
+
+    def do_DELETE(self):
+        path, selector, body = self._request()
+        server = self.server.stand_in
+        policy = (body or {}).get("propagationPolicy", "Background")
+        if path in server.live():
+            server.delete([path], policy)
+            self._reply(200, {"kind": "Status", "status": "Success"})
+        elif server.is_collection(path):
+            server.delete([p for p, o in server.live().items()
+                           if server.in_collection(p, path) and _matches(o, selector)], policy)
+            self._reply(200, {"kind": "List", "items": []})
+        else:
+            self._reply(404, {"kind": "Status", "code": 404})
+
+    def do_PATCH(self):
+        path, _, body = self._request()
+        server = self.server.stand_in
+        obj = server.live().get(path)
+        if obj is None:
+            self._reply(404, {"kind": "Status", "code": 404})
+            return
+        with server.lock:
+            labels = obj.setdefault("metadata", {}).setdefault("labels", {})
+            labels.update(((body or {}).get("metadata") or {}).get("labels") or {})
+        self._reply(200, obj)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInAPIServer:
+    """
+    In-memory stand-in for the kube-apiserver, over plain HTTP.
+
+    Objects are seeded by REST path. A delete with Background propagation
+    takes `linger` seconds to land, like an object held by a finalizer, so
+    callers have to wait for it the way they do on a real cluster.
+
+    Usage:
+        with StandInAPIServer(objects) as server:
+            server.write_kubeconfig(path)
+            with KubeAPI(path) as api: ...
+    """
+
+    def __init__(self, objects: dict[str, dict] | None = None, linger: float = 0.5,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.objects = dict(objects or {})
+        self.linger = linger
+        self.gone_at: dict[str, float] = {}
+        self.requests: list[tuple[str, str]] = []
+        self.lock = threading.Lock()
+        self.httpd = http.server.ThreadingHTTPServer((host, port), _StandInAPIHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.stand_in = self
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def live(self) -> dict[str, dict]:
+        now = time.monotonic()
+        with self.lock:
+            for path in [p for p, t in self.gone_at.items() if t <= now]:
+                self.objects.pop(path, None)
+                del self.gone_at[path]
+            return dict(self.objects)
+
+    def delete(self, paths: list[str], policy: str) -> None:
+        delay = self.linger if policy == "Background" else 0
+        with self.lock:
+            for path in paths:
+                self.gone_at.setdefault(path, time.monotonic() + delay)
+
+    @staticmethod
+    def in_collection(obj_path: str, collection: str) -> bool:
+        """True if `obj_path` is an object of `collection`, namespaced or across namespaces."""
+        parent = obj_path.rsplit("/", 1)[0]
+        if parent == collection:
+            return True
+        # /api/v1/secrets lists /api/v1/namespaces/<ns>/secrets/<name>
+        prefix, _, plural = collection.rpartition("/")
+        parts = parent.split("/")
+        return (len(parts) >= 3 and parts[-1] == plural and parts[-3] == "namespaces"
+                and "/".join(parts[:-3]) == prefix)
+
+    def is_collection(self, path: str) -> bool:
+        return path.rsplit("/", 1)[-1] in _PLURALS.values()
+
+    def list(self, collection: str, selector: str | None) -> list[dict]:
+        return [o for p, o in self.live().items()
+                if self.in_collection(p, collection) and _matches(o, selector)]
+
+    def write_kubeconfig(self, path: str | pathlib.Path) -> pathlib.Path:
+        path = pathlib.Path(path)
+        path.write_text(yaml.safe_dump({
+            "apiVersion": "v1", "kind": "Config", "current-context": "stand-in",
+            "clusters": [{"name": "stand-in", "cluster": {"server": self.url}}],
+            "contexts": [{"name": "stand-in", "context": {"cluster": "stand-in", "user": "stand-in"}}],
+            "users":    [{"name": "stand-in", "user": {"token": "stand-in"}}],
+        }))
+        return path
+
+    def __enter__(self) -> "StandInAPIServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,694 @@
+# jeeves/loadtest.py
+
+"""
+Asyncio load generator for a deployed Rocket.Chat.
+
+Every simulated user does what the web client does:
+
+  login      POST /api/v1/login
+  connect    websocket upgrade on /websocket, then DDP `connect`
+  ddp_login  DDP method `login` with the REST token
+  subscribe  DDP sub `stream-room-messages` on the test room
+  send       DDP method `sendMessage` every ~`interval` seconds
+  deliver    a message of any user arriving on the subscription; the text
+             carries the sender's monotonic send time, so with every user
+             in this one process the latency is send → fan-out → receive
+
+Users start evenly over `ramp` seconds and send for `duration` seconds.
+Everything runs on one event loop with stdlib streams (a minimal RFC 6455
+client, no extensions), so a runner can drive a few thousand users.
+
+MockRocketChat speaks the same REST and DDP subset in-process, for
+exercising the engine without a deployment.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import os
+import random
+import secrets
+import ssl
+import struct
+import time
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from .history import percentile
+from .journal import deployment_dir, state_dir
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_TEXT, _CLOSE, _PING, _PONG = 0x1, 0x8, 0x9, 0xA
+
+OPERATIONS = ("login", "connect", "ddp_login", "subscribe", "send", "deliver")
+
+
+@dataclass
+class LoadProfile:
+    users: int = 50
+    duration: float = 60.0       # seconds of sending, after the ramp
+    ramp: float = 30.0           # seconds over which users start
+    interval: float = 10.0       # mean seconds between a user's messages
+    room: str = "GENERAL"
+    prefix: str = "jeeves-load-"
+    password: str = ""
+    timeout: float = 30.0        # per request / DDP call
+
+    def username(self, i: int) -> str:
+        return f"{self.prefix}{i:05d}"
+
+
+# ———————————
+# Wire protocols
+# ———————————
+def _frame(opcode: int, payload: bytes, mask: bool) -> bytes:
+    head = bytes([0x80 | opcode])
+    n = len(payload)
+    bit = 0x80 if mask else 0
+    if n < 126:
+        head += bytes([bit | n])
+    elif n < 1 << 16:
+        head += bytes([bit | 126]) + struct.pack("!H", n)
+    else:
+        head += bytes([bit | 127]) + struct.pack("!Q", n)
+    if not mask:
+        return head + payload
+    key = os.urandom(4)
+    return head + key + _xor(payload, key)
+
+
+def _xor(payload: bytes, key: bytes) -> bytes:
+    n = len(payload)
+    k = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(k, "big")).to_bytes(n, "big")
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> tuple[bool, int, bytes]:
+    b0, b1 = await reader.readexactly(2)
+    n = b1 & 0x7F
+    if n == 126:
+        n = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif n == 127:
+        n = struct.unpack("!Q", await reader.readexactly(8))[0]
+    key = await reader.readexactly(4) if b1 & 0x80 else None
+    payload = await reader.readexactly(n)
+    return bool(b0 & 0x80), b0 & 0x0F, _xor(payload, key) if key else payload
+
+
+def _accept(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+
+
+async def _open(url: str, timeout: float, context: ssl.SSLContext | None):
+    parts = urlsplit(url)
+    tls = parts.scheme in ("https", "wss")
+    port = parts.port or (443 if tls else 80)
+    ctx = (context or ssl.create_default_context()) if tls else None
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parts.hostname, port, ssl=ctx,
+                                server_hostname=parts.hostname if tls else None),
+        timeout)
+    return parts, reader, writer
+
+
+async def _read_head(reader: asyncio.StreamReader) -> tuple[int, dict]:
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lines[1:] if l)}
+    return status, headers
+
+
+async def http_json(base: str, method: str, path: str, body: dict | None = None,
+                    headers: dict | None = None, timeout: float = 30.0,
+                    context: ssl.SSLContext | None = None) -> tuple[int, dict]:
+    """One JSON request on its own connection; returns (status, decoded body)."""
+    parts, reader, writer = await _open(base, timeout, context)
+    try:
+        data = json.dumps(body).encode() if body is not None else b""
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {parts.netloc}", "Connection: close",
+                 "User-Agent: jeeves-loadtest", "Accept: application/json"]
+        if body is not None:
+            lines += ["Content-Type: application/json", f"Content-Length: {len(data)}"]
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + data)
+
+        async def response():
+            status, hdrs = await _read_head(reader)
+            if hdrs.get("transfer-encoding", "").lower() == "chunked":
+                raw = b""
+                while True:
+                    size = int((await reader.readline()).split(b";")[0], 16)
+                    if not size:
+                        break
+                    raw += await reader.readexactly(size)
+                    await reader.readexactly(2)
+            elif "content-length" in hdrs:
+                raw = await reader.readexactly(int(hdrs["content-length"]))
+            else:
+                raw = await reader.read()
+            return status, json.loads(raw) if raw.strip() else {}
+
+        return await asyncio.wait_for(response(), timeout)
+    finally:
+        writer.close()
+
+
+class WebSocket:
+    """Client end of a text-only websocket."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader, self.writer = reader, writer
+
+    @classmethod
+    async def connect(cls, url: str, timeout: float = 30.0,
+                      context: ssl.SSLContext | None = None) -> "WebSocket":
+        parts, reader, writer = await _open(url, timeout, context)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write((
+            f"GET {parts.path or '/'} HTTP/1.1\r\n"
+            f"Host: {parts.netloc}\r\n"
+            "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n"
+            "User-Agent: jeeves-loadtest\r\n\r\n"
+        ).encode())
+        try:
+            status, headers = await asyncio.wait_for(_read_head(reader), timeout)
+        except BaseException:
+            writer.close()
+            raise
+        if status != 101 or headers.get("sec-websocket-accept") != _accept(key):
+            writer.close()
+            raise ConnectionError(f"websocket upgrade refused (HTTP {status})")
+        return cls(reader, writer)
+
+    async def send(self, text: str) -> None:
+        self.writer.write(_frame(_TEXT, text.encode(), mask=True))
+        await self.writer.drain()
+
+    async def recv(self) -> str:
+        message = b""
+        while True:
+            fin, opcode, payload = await _read_frame(self.reader)
+            if opcode == _PING:
+                self.writer.write(_frame(_PONG, payload, mask=True))
+            elif opcode == _CLOSE:
+                raise ConnectionError("websocket closed by server")
+            elif opcode != _PONG:
+                message += payload
+                if fin:
+                    return message.decode()
+
+    def close(self) -> None:
+        if not self.writer.is_closing():
+            try:
+                self.writer.write(_frame(_CLOSE, struct.pack("!H", 1000), mask=True))
+            except (OSError, RuntimeError):
+                pass
+            self.writer.close()
+
+
+class DDPClient:
+    """Meteor DDP over a WebSocket: method calls, subscriptions, `changed` events."""
+
+    def __init__(self, ws: WebSocket, on_changed=None):
+        self.ws = ws
+        self.on_changed = on_changed
+        self._ids = itertools.count(1)
+        self._pending: dict[str, asyncio.Future] = {}
+        self._connected = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._read())
+
+    async def _read(self) -> None:
+        try:
+            while True:
+                msg = json.loads(await self.ws.recv())
+                kind = msg.get("msg")
+                if kind == "ping":
+                    await self.ws.send(json.dumps({"msg": "pong", **({"id": msg["id"]} if "id" in msg else {})}))
+                elif kind == "connected":
+                    self._connected.set_result(msg.get("session"))
+                elif kind == "failed":
+                    self._connected.set_exception(ConnectionError(f"DDP version refused: {msg}"))
+                elif kind == "result":
+                    fut = self._pending.pop(msg["id"], None)
+                    if fut and not fut.done():
+                        if "error" in msg:
+                            fut.set_exception(RuntimeError(msg["error"].get("reason") or msg["error"]))
+                        else:
+                            fut.set_result(msg.get("result"))
+                elif kind == "ready":
+                    for sub in msg.get("subs", []):
+                        fut = self._pending.pop(sub, None)
+                        if fut and not fut.done():
+                            fut.set_result(None)
+                elif kind == "nosub":
+                    fut = self._pending.pop(msg["id"], None)
+                    if fut and not fut.done():
+                        fut.set_exception(RuntimeError(f"subscription refused: {msg.get('error')}"))
+                elif kind == "changed" and self.on_changed:
+                    self.on_changed(msg)
+        except (ConnectionError, asyncio.IncompleteReadError, OSError, ValueError) as e:
+            for fut in [self._connected, *self._pending.values()]:
+                if not fut.done():
+                    fut.set_exception(ConnectionError(f"DDP connection lost: {e}"))
+            self._pending.clear()
+
+    async def _request(self, msg: dict, timeout: float):
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[msg["id"]] = fut
+        await self.ws.send(json.dumps(msg))
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            self._pending.pop(msg["id"], None)
+
+    async def connect(self, timeout: float = 30.0) -> None:
+        await self.ws.send(json.dumps({"msg": "connect", "version": "1", "support": ["1", "pre2", "pre1"]}))
+        await asyncio.wait_for(self._connected, timeout)
+
+    async def call(self, method: str, *params, timeout: float = 30.0):
+        return await self._request({"msg": "method", "id": str(next(self._ids)),
+                                    "method": method, "params": list(params)}, timeout)
+
+    async def subscribe(self, name: str, *params, timeout: float = 30.0) -> None:
+        await self._request({"msg": "sub", "id": f"s{next(self._ids)}",
+                             "name": name, "params": list(params)}, timeout)
+
+    def close(self) -> None:
+        self._task.cancel()
+        self.ws.close()
+
+
+# ———————————
+# Engine
+# ———————————
+@dataclass
+class Stats:
+    samples: dict = field(default_factory=lambda: defaultdict(list))   # op → [ms]
+    errors: Counter = field(default_factory=Counter)                    # op → count
+    error_kinds: Counter = field(default_factory=Counter)               # "op: message" → count
+
+    def ok(self, op: str, ms: float) -> None:
+        self.samples[op].append(ms)
+
+    def fail(self, op: str, exc: BaseException) -> None:
+        self.errors[op] += 1
+        self.error_kinds[f"{op}: {type(exc).__name__}: {str(exc)[:80]}"] += 1
+
+    async def timed(self, op: str, coro):
+        start = time.monotonic()
+        try:
+            result = await coro
+        except (Exception, asyncio.TimeoutError) as e:
+            self.fail(op, e)
+            raise
+        self.ok(op, (time.monotonic() - start) * 1000)
+        return result
+
+
+class _UserGone(Exception):
+    pass
+
+
+async def _user(i: int, base: str, ws_url: str, profile: LoadProfile, stats: Stats,
+                start_at: float, stop_at: float, context) -> bool:
+    """One simulated user; True if it got as far as sending."""
+    await asyncio.sleep(max(0.0, start_at - time.monotonic()))
+    name = profile.username(i)
+
+    def on_changed(msg: dict) -> None:
+        for m in msg.get("fields", {}).get("args", []):
+            text = m.get("msg", "") if isinstance(m, dict) else ""
+            if text.startswith("lt:"):
+                try:
+                    sent = float(text.split(":")[3])
+                except (IndexError, ValueError):
+                    continue
+                stats.ok("deliver", (time.monotonic() - sent) * 1000)
+
+    ddp = None
+    try:
+        async def login():
+            status, body = await http_json(base, "POST", "/api/v1/login",
+                                           {"user": name, "password": profile.password},
+                                           timeout=profile.timeout, context=context)
+            if status != 200 or body.get("status") != "success":
+                raise PermissionError(f"HTTP {status} {body.get('error', body.get('message', ''))}")
+            return body["data"]["authToken"]
+
+        token = await stats.timed("login", login())
+
+        async def connect():
+            ws = await WebSocket.connect(ws_url, profile.timeout, context)
+            client = DDPClient(ws, on_changed)
+            try:
+                await client.connect(profile.timeout)
+            except BaseException:
+                client.close()
+                raise
+            return client
+
+        ddp = await stats.timed("connect", connect())
+        await stats.timed("ddp_login", ddp.call("login", {"resume": token}, timeout=profile.timeout))
+        await stats.timed("subscribe", ddp.subscribe(
+            "stream-room-messages", profile.room, {"useCollection": False, "args": []},
+            timeout=profile.timeout))
+    except (Exception, asyncio.TimeoutError):
+        if ddp:
+            ddp.close()
+        return False
+
+    try:
+        # Jittered think time so users do not send in lockstep
+        await asyncio.sleep(random.uniform(0, profile.interval))
+        for seq in itertools.count():
+            if time.monotonic() >= stop_at:
+                break
+            text = f"lt:{name}:{seq}:{time.monotonic():.6f}"
+            try:
+                await stats.timed("send", ddp.call(
+                    "sendMessage", {"_id": secrets.token_hex(9), "rid": profile.room, "msg": text},
+                    timeout=profile.timeout))
+            except ConnectionError:
+                raise _UserGone
+            except (Exception, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(min(random.uniform(0.5, 1.5) * profile.interval,
+                                    max(0.0, stop_at - time.monotonic())))
+        await asyncio.sleep(2)      # let the last messages arrive
+    except _UserGone:
+        pass
+    finally:
+        ddp.close()
+    return True
+
+
+async def ensure_users(base: str, profile: LoadProfile, admin_user: str, admin_password: str,
+                       context: ssl.SSLContext | None = None, concurrency: int = 10) -> int:
+    """Create the profile's users that do not exist yet; returns how many were created."""
+    status, body = await http_json(base, "POST", "/api/v1/login",
+                                   {"user": admin_user, "password": admin_password},
+                                   timeout=profile.timeout, context=context)
+    if status != 200:
+        raise RuntimeError(f"Admin login as '{admin_user}' failed: HTTP {status} {body.get('error', '')}")
+    auth = {"X-Auth-Token": body["data"]["authToken"], "X-User-Id": body["data"]["userId"]}
+    gate = asyncio.Semaphore(concurrency)
+
+    async def create(i: int) -> bool:
+        name = profile.username(i)
+        async with gate:
+            status, body = await http_json(base, "POST", "/api/v1/users.create", {
+                "username": name, "name": name, "email": f"{name}@loadtest.invalid",
+                "password": profile.password, "verified": True, "joinDefaultChannels": True,
+            }, headers=auth, timeout=profile.timeout, context=context)
+        if status == 200:
+            return True
+        if "already in use" in json.dumps(body):
+            return False
+        raise RuntimeError(f"Creating {name} failed: HTTP {status} {body.get('error', '')}")
+
+    return sum(await asyncio.gather(*(create(i) for i in range(profile.users))))
+
+
+def _summary(stats: Stats, wall: float, send_window: float) -> dict:
+    ops = {}
+    for op in OPERATIONS:
+        d = stats.samples.get(op, [])
+        ops[op] = {
+            "count":  len(d),
+            "errors": stats.errors.get(op, 0),
+            **({"p50_ms": round(percentile(d, 0.50), 1),
+                "p95_ms": round(percentile(d, 0.95), 1),
+                "p99_ms": round(percentile(d, 0.99), 1),
+                "max_ms": round(max(d), 1)} if d else {}),
+        }
+    attempts = sum(o["count"] + o["errors"] for op, o in ops.items() if op != "deliver")
+    errors = sum(o["errors"] for o in ops.values())
+    return {
+        "wall_seconds":     round(wall, 1),
+        "operations":       ops,
+        "error_rate":       round(errors / attempts, 4) if attempts else 0.0,
+        "errors":           dict(stats.error_kinds.most_common(10)),
+        "sent_per_sec":     round(ops["send"]["count"] / send_window, 2) if send_window else 0.0,
+        "delivered_per_sec": round(ops["deliver"]["count"] / send_window, 2) if send_window else 0.0,
+    }
+
+
+async def run_load(base_url: str, profile: LoadProfile,
+                   context: ssl.SSLContext | None = None) -> dict:
+    """Drive `profile.users` users against `base_url`; returns the result summary."""
+    base = base_url.rstrip("/")
+    parts = urlsplit(base)
+    ws_url = f"{'wss' if parts.scheme == 'https' else 'ws'}://{parts.netloc}/websocket"
+    status, info = await http_json(base, "GET", "/api/info", timeout=profile.timeout, context=context)
+    release = info.get("version", "unknown") if status == 200 else "unknown"
+
+    stats = Stats()
+    t0 = time.monotonic()
+    stop_at = t0 + profile.ramp + profile.duration
+    tasks = [
+        asyncio.create_task(_user(i, base, ws_url, profile, stats,
+                                  t0 + profile.ramp * i / profile.users, stop_at, context))
+        for i in range(profile.users)
+    ]
+    active = sum(await asyncio.gather(*tasks))
+    wall = time.monotonic() - t0
+    result = {
+        "url":     base,
+        "release": release,
+        "profile": {k: v for k, v in asdict(profile).items() if k != "password"},
+        "users_active": active,
+        **_summary(stats, wall, profile.duration + profile.ramp / 2),
+    }
+    return result
+
+
+def print_report(result: dict) -> None:
+    p = result["profile"]
+    print(f"\nLoad test of {result['url']} (Rocket.Chat {result['release']}): "
+          f"{result['users_active']}/{p['users']} users active, {result['wall_seconds']}s")
+    print(f"  {'operation':<10} {'ok':>8} {'errors':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for op, o in result["operations"].items():
+        cols = [f"{o[k]:.1f}ms" if k in o else "-" for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms")]
+        print(f"  {op:<10} {o['count']:>8} {o['errors']:>7} " + " ".join(f"{c:>9}" for c in cols))
+    print(f"  throughput: {result['sent_per_sec']} msg/s sent, {result['delivered_per_sec']} msg/s delivered")
+    print(f"  error rate: {result['error_rate']:.2%}")
+    for kind, n in result["errors"].items():
+        print(f"    {n:>5} × {kind}")
+
+
+# ———————————
+# Results
+# ———————————
+def save(result: dict, deployment: str, sizing: dict | None = None) -> "os.PathLike":
+    """Write the result to ~/.jeeves/deployments/<deployment>/loadtest/<timestamp>.json."""
+    now = datetime.now(timezone.utc)
+    result = {"deployment": deployment, "finished": now.isoformat(timespec="seconds"),
+              "sizing": sizing or {}, **result}
+    path = deployment_dir(deployment) / "loadtest" / f"{now:%Y%m%dT%H%M%SZ}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(result, indent=2))
+    os.replace(tmp, path)
+    return path
+
+
+def load_results(limit: int = 10) -> list[dict]:
+    """The `limit` most recent saved results of every deployment, oldest first."""
+    results = []
+    for path in (state_dir() / "deployments").glob("*/loadtest/*.json"):
+        try:
+            results.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    results.sort(key=lambda r: r.get("finished", ""))
+    return results[-limit:]
+
+
+def print_comparison(results: list[dict]) -> None:
+    """One row per saved run, to compare sizes and releases."""
+    if not results:
+        return
+    print(f"\n{'finished':<20} {'deployment':<28} {'release':<9} {'users':>6} "
+          f"{'msg/s':>7} {'send p95':>9} {'deliver p95':>12} {'errors':>7}  sizing")
+    for r in results:
+        ops = r.get("operations", {})
+        sizing = _sizing_label(r.get("sizing") or {})
+        print(f"{r.get('finished', '')[:19]:<20} {r.get('deployment', '')[:28]:<28} "
+              f"{r.get('release', '')[:9]:<9} {r.get('profile', {}).get('users', 0):>6} "
+              f"{r.get('sent_per_sec', 0):>7} "
+              f"{ops.get('send', {}).get('p95_ms', '-'):>9} "
+              f"{ops.get('deliver', {}).get('p95_ms', '-'):>12} "
+              f"{r.get('error_rate', 0):>7.2%}  {sizing}")
+
+
+def _sizing_label(sizing: dict) -> str:
+    if "mongo_type" in sizing:      # a jeeves.sizing plan
+        return (f"tier={sizing.get('tier') or '-'} mongo={sizing['mongo_type']} "
+                f"rc={sizing.get('rc_nodes') or 1}×{sizing['rc_type']} "
+                f"k8s={sizing.get('workers') or 1}×{sizing['k8s_type']}")
+    return " ".join(f"{k}={v}" for k, v in sorted(sizing.items())) or "-"
+
+
+def sizing_from_env(env=None) -> dict:
+    """The settings that size a deployment, to tell saved results apart."""
+    env = os.environ if env is None else env
+    keys = ("RC_NODES", "ROCKETCHAT_SCALE", "RELEASE", "MONGO_DATA_VOLUME", "WORKER_HA")
+    return {k.lower(): env[k] for k in env
+            if env[k] and (k in keys or k.endswith("INSTANCE_TYPE"))}
+
+
+# ———————————
+# Mock server
+# ———————————
+class MockRocketChat:
+    """
+    In-process stand-in for Rocket.Chat's REST login, users.create and the
+    DDP subset the load test uses; sendMessage fans out to every
+    subscriber of the room. `delay` adds server-side latency (seconds).
+
+    Usage:
+        async with MockRocketChat() as url:
+            result = await run_load(url, LoadProfile(users=20, password="x"))
+    """
+
+    version = "7.7.4"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0,
+                 admin: tuple[str, str] = ("admin", "admin")):
+        self.host, self.port, self.delay = host, port, delay
+        self.users = {admin[0]: admin[1]}
+        self.tokens: dict[str, str] = {}
+        self.rooms: dict[str, set] = defaultdict(set)     # rid → {(ws writer, sub id)}
+        self.messages = 0
+        self.server = None
+
+    async def __aenter__(self) -> str:
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def __aexit__(self, *exc) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    @staticmethod
+    def _reply(writer, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        writer.write(f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+
+    async def _handle(self, reader, writer) -> None:
+        try:
+            line = await reader.readline()
+            method, path, _ = line.decode().split(" ", 2)
+            headers = await _read_headers(reader)
+            body = json.loads(await reader.readexactly(int(headers.get("content-length", 0))) or b"{}")
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            if path == "/websocket" and headers.get("upgrade", "").lower() == "websocket":
+                writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                              "Connection: Upgrade\r\n"
+                              f"Sec-WebSocket-Accept: {_accept(headers['sec-websocket-key'])}\r\n\r\n").encode())
+                await self._ddp(reader, writer)
+                return
+            if path == "/api/info":
+                self._reply(writer, 200, {"version": self.version, "success": True})
+            elif path == "/api/v1/login" and method == "POST":
+                user = body.get("user")
+                if user in self.users and self.users[user] == body.get("password"):
+                    token = secrets.token_hex(16)
+                    self.tokens[token] = user
+                    self._reply(writer, 200, {"status": "success",
+                                              "data": {"authToken": token, "userId": user}})
+                else:
+                    self._reply(writer, 401, {"status": "error", "error": "Unauthorized"})
+            elif path == "/api/v1/users.create" and method == "POST":
+                if headers.get("x-auth-token") not in self.tokens:
+                    self._reply(writer, 401, {"success": False, "error": "You must be logged in"})
+                elif body["username"] in self.users:
+                    self._reply(writer, 400, {"success": False,
+                                              "error": f"{body['username']} is already in use :( [error-field-unavailable]"})
+                else:
+                    self.users[body["username"]] = body["password"]
+                    self._reply(writer, 200, {"success": True, "user": {"_id": body["username"]}})
+            else:
+                self._reply(writer, 404, {"success": False, "error": "Not found"})
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _ddp(self, reader, writer) -> None:
+        user, subs = None, []
+
+        async def send(msg: dict) -> None:
+            writer.write(_frame(_TEXT, json.dumps(msg).encode(), mask=False))
+            await writer.drain()
+
+        try:
+            await send({"server_id": "0"})
+            while True:
+                fin, opcode, payload = await _read_frame(reader)
+                if opcode == _CLOSE:
+                    break
+                if opcode != _TEXT:
+                    continue
+                msg = json.loads(payload)
+                kind = msg.get("msg")
+                if kind == "connect":
+                    await send({"msg": "connected", "session": secrets.token_hex(8)})
+                elif kind == "ping":
+                    await send({"msg": "pong"})
+                elif kind == "sub" and msg["name"] == "stream-room-messages":
+                    if user is None:
+                        await send({"msg": "nosub", "id": msg["id"], "error": {"error": "not-authorized"}})
+                        continue
+                    entry = (writer, msg["id"])
+                    self.rooms[msg["params"][0]].add(entry)
+                    subs.append((msg["params"][0], entry))
+                    await send({"msg": "ready", "subs": [msg["id"]]})
+                elif kind == "method" and msg["method"] == "login":
+                    user = self.tokens.get(msg["params"][0].get("resume"))
+                    if user is None:
+                        await send({"msg": "result", "id": msg["id"],
+                                    "error": {"error": 403, "reason": "You've been logged out by the server."}})
+                    else:
+                        await send({"msg": "result", "id": msg["id"], "result": {"id": user, "token": "x"}})
+                elif kind == "method" and msg["method"] == "sendMessage":
+                    m = {**msg["params"][0], "u": {"_id": user, "username": user}}
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                    self.messages += 1
+                    await send({"msg": "result", "id": msg["id"], "result": m})
+                    event = _frame(_TEXT, json.dumps({
+                        "msg": "changed", "collection": "stream-room-messages", "id": "id",
+                        "fields": {"eventName": m["rid"], "args": [m]},
+                    }).encode(), mask=False)
+                    for w, _ in list(self.rooms.get(m["rid"], ())):
+                        if not w.is_closing():
+                            w.write(event)
+                elif kind == "method":
+                    await send({"msg": "result", "id": msg["id"],
+                                "error": {"error": 404, "reason": f"Method '{msg['method']}' not found"}})
+        finally:
+            for rid, entry in subs:
+                self.rooms[rid].discard(entry)
+
+
+async def _read_headers(reader: asyncio.StreamReader) -> dict:
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").rstrip("\r\n")
+        if not line:
+            return headers
+        k, _, v = line.partition(":")
+        headers[k.strip().lower()] = v.strip()
@@ -0,0 +1,187 @@
+# jeeves/manifests.py
+
+"""
+Local content-addressed cache for remote Kubernetes manifests.
+
+Remote manifests (the Traefik CRD and RBAC definitions) are stored under
+the user cache directory by SHA-256 digest, with an index mapping each URL
+to the digest of its current copy. Pinned copies shipped in
+jeeves/data/manifests seed the cache, so the Helm teardown works on
+air-gapped runners; `jeeves manifests refresh` re-downloads them. The
+deploy applies these manifests from the ps-auto-infra Terraform module,
+which fetches its own copies.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+import urllib.request
+from datetime import datetime, timezone
+
+from .kube import manifest_object_paths
+
+TRAEFIK_CRD_URL = (
+    "https://raw.githubusercontent.com/traefik/traefik/v3.3/docs/content/"
+    "reference/dynamic-configuration/kubernetes-crd-definition-v1.yml"
+)
+TRAEFIK_RBAC_URL = (
+    "https://raw.githubusercontent.com/traefik/traefik/v3.3/docs/content/"
+    "reference/dynamic-configuration/kubernetes-crd-rbac.yml"
+)
+TRAEFIK_MANIFEST_URLS = [TRAEFIK_CRD_URL, TRAEFIK_RBAC_URL]
+
+# Manifests ps-auto-infra applies from its own directory
+PS_AUTO_INFRA_MANIFESTS = [
+    "redirect-to-https.yaml",
+    "rocketchat-ingress-http.yaml",
+    "rocketchat-ingress-https.yaml",
+]
+
+PINNED_DIR = pathlib.Path(__file__).parent / "data" / "manifests"
+
+
+def cache_dir() -> pathlib.Path:
+    base = os.environ.get("JEEVES_CACHE_DIR") or \
+        os.environ.get("XDG_CACHE_HOME", "~/.cache") + "/jeeves"
+    return pathlib.Path(base).expanduser() / "manifests"
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _load_index(path: pathlib.Path) -> dict:
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def _save_index(path: pathlib.Path, index: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(index, indent=2, sort_keys=True) + "\n")
+    tmp.replace(path)
+
+
+class ManifestCache:
+    """
+    URL → local file resolver backed by a content-addressed store.
+
+    Lookup order: cached copy (digest verified), pinned package copy,
+    then the network unless JEEVES_OFFLINE is set.
+    """
+
+    def __init__(self, root: pathlib.Path | None = None, pinned_dir: pathlib.Path = PINNED_DIR):
+        self.root = root or cache_dir()
+        self.pinned_dir = pinned_dir
+        self.index_path = self.root / "index.json"
+
+    def _blob(self, digest: str) -> pathlib.Path:
+        return self.root / "sha256" / f"{digest}.yml"
+
+    def _store(self, url: str, data: bytes, source: str) -> pathlib.Path:
+        digest = _digest(data)
+        blob = self._blob(digest)
+        if not blob.exists():
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            tmp = blob.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            tmp.replace(blob)
+        index = _load_index(self.index_path)
+        index[url] = {
+            "sha256":    digest,
+            "source":    source,
+            "stored_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        _save_index(self.index_path, index)
+        return blob
+
+    def _cached(self, url: str) -> pathlib.Path | None:
+        entry = _load_index(self.index_path).get(url)
+        if not entry:
+            return None
+        blob = self._blob(entry["sha256"])
+        if blob.exists() and _digest(blob.read_bytes()) == entry["sha256"]:
+            return blob
+        return None
+
+    def _pinned(self, url: str) -> bytes | None:
+        entry = _load_index(self.pinned_dir / "index.json").get(url) or {}
+        if not entry.get("sha256"):
+            return None
+        path = self.pinned_dir / entry["file"]
+        if not path.exists():
+            return None
+        data = path.read_bytes()
+        if _digest(data) != entry["sha256"]:
+            raise RuntimeError(f"Pinned manifest {path} does not match its recorded digest")
+        return data
+
+    @staticmethod
+    def _fetch(url: str) -> bytes:
+        with urllib.request.urlopen(url, timeout=30) as resp:
+            return resp.read()
+
+    def path(self, url: str) -> pathlib.Path:
+        """Return a local file holding the manifest published at `url`."""
+        cached = self._cached(url)
+        if cached:
+            return cached
+        pinned = self._pinned(url)
+        if pinned is not None:
+            return self._store(url, pinned, "pinned")
+        if os.environ.get("JEEVES_OFFLINE", "").lower() in ("1", "true", "yes"):
+            raise RuntimeError(f"Manifest {url} is not cached and JEEVES_OFFLINE is set")
+        return self._store(url, self._fetch(url), "network")
+
+    def read_text(self, url: str) -> str:
+        return self.path(url).read_text()
+
+    def refresh(self, urls: list[str] | None = None, pin: bool = False) -> dict[str, str]:
+        """
+        Re-download `urls` (default: every known URL) into the cache.
+        With `pin`, also write them into the package's pinned copies.
+        Returns url → sha256.
+        """
+        pinned_index = _load_index(self.pinned_dir / "index.json")
+        urls = urls or sorted(set(TRAEFIK_MANIFEST_URLS)
+                              | set(pinned_index)
+                              | set(_load_index(self.index_path)))
+        digests = {}
+        for url in urls:
+            data = self._fetch(url)
+            self._store(url, data, "network")
+            digests[url] = _digest(data)
+            if pin:
+                name = pinned_index.get(url, {}).get("file") or url.rsplit("/", 1)[-1]
+                self.pinned_dir.mkdir(parents=True, exist_ok=True)
+                (self.pinned_dir / name).write_bytes(data)
+                pinned_index[url] = {"file": name, "sha256": digests[url]}
+        if pin:
+            _save_index(self.pinned_dir / "index.json", pinned_index)
+        return digests
+
+    def entries(self) -> dict:
+        return _load_index(self.index_path)
+
+
+def manifest_path(url: str) -> pathlib.Path:
+    """Local path for `url` from the default cache."""
+    return ManifestCache().path(url)
+
+
+def applied_object_paths(tf_dir: pathlib.Path, namespace: str) -> list[str]:
+    """
+    REST paths of the objects a Helm deploy applies from manifests: the
+    ps-auto-infra files in `tf_dir` and the Traefik CRD/RBAC definitions.
+    """
+    paths = []
+    for fn in PS_AUTO_INFRA_MANIFESTS:
+        path = tf_dir / fn
+        if path.exists():
+            paths += manifest_object_paths(path.read_text(), namespace)
+    cache = ManifestCache()
+    for url in TRAEFIK_MANIFEST_URLS:
+        paths += manifest_object_paths(cache.read_text(url), "default")
+    return paths
@@ -0,0 +1,133 @@
+# jeeves/mongo_tuning.py
+
+"""
+MongoDB tuning profiles.
+
+A profile is computed from the instance type's memory and vCPUs, the data
+volume and a workload class, and handed to scripts/mongodb_bootstrap.sh as
+environment variables. The script renders it into mongod.conf (WiredTiger
+cache, compressors, oplog size) and into OS settings applied before mongod
+starts (transparent huge pages, readahead on the data device, ulimits,
+sysctls).
+
+Workload classes (MONGO_WORKLOAD):
+
+  balanced     a dedicated mongod node serving Rocket.Chat (default)
+  read-heavy   large working set: bigger cache share, zstd to fit more in it
+  write-heavy  high message volume: a longer oplog window
+  colocated    mongod shares the host with other services: small cache share
+
+MONGO_TUNING=off keeps MongoDB's defaults. MONGO_WT_CACHE_GB and
+MONGO_OPLOG_SIZE_MB override the computed values.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import asdict, dataclass
+
+from .aws_helpers import instance_type_info
+from .storage import StorageProfile
+
+# workload → (share of RAM-1GiB for the WiredTiger cache, block compressor, share of the data volume for the oplog)
+WORKLOADS = {
+    "balanced":    (0.50, "snappy", 0.05),
+    "read-heavy":  (0.60, "zstd",   0.05),
+    "write-heavy": (0.50, "snappy", 0.10),
+    "colocated":   (0.25, "zstd",   0.05),
+}
+
+# mongod's own bounds for the default oplog size
+_OPLOG_MB = (990, 51200)
+
+
+@dataclass
+class TuningProfile:
+    workload: str
+    instance_type: str
+    memory_gb: float
+    vcpus: int
+    cache_gb: float
+    block_compressor: str
+    journal_compressor: str
+    oplog_size_mb: int | None        # None: mongod's default (5% of free disk)
+    readahead_sectors: int = 32      # 16 KiB; WiredTiger reads small pages at random
+    thp: str = "never"
+    nofile: int = 64000
+    nproc: int = 64000
+    swappiness: int = 1
+    max_map_count: int = 262144
+    tcp_keepalive: int = 120
+
+    @classmethod
+    def compute(cls, info: dict, instance_type: str, workload: str = "balanced",
+                storage: StorageProfile | None = None, env=None) -> "TuningProfile":
+        """Profile for an instance with `info` (aws_helpers.instance_type_info)."""
+        env = os.environ if env is None else env
+        if workload not in WORKLOADS:
+            raise ValueError(f"MONGO_WORKLOAD must be one of {', '.join(WORKLOADS)}, got '{workload}'")
+        cache_share, compressor, oplog_share = WORKLOADS[workload]
+        memory_gb = (info.get("memory_mib") or 0) / 1024
+        if not memory_gb:
+            raise ValueError(f"Memory of {instance_type} is unknown")
+
+        # mongod's own default is 50% of (RAM - 1 GiB), at least 0.25 GiB
+        cache_gb = max(0.25, round(cache_share * (memory_gb - 1), 2))
+        if env.get("MONGO_WT_CACHE_GB"):
+            cache_gb = float(env["MONGO_WT_CACHE_GB"])
+            if cache_gb > 0.8 * memory_gb:
+                raise ValueError(f"MONGO_WT_CACHE_GB={cache_gb} leaves too little of "
+                                 f"{instance_type}'s {memory_gb:.1f} GiB for connections and the OS")
+
+        oplog = None
+        if env.get("MONGO_OPLOG_SIZE_MB"):
+            oplog = int(env["MONGO_OPLOG_SIZE_MB"])
+            if oplog < _OPLOG_MB[0]:
+                raise ValueError(f"MONGO_OPLOG_SIZE_MB must be at least {_OPLOG_MB[0]}")
+        elif storage is not None and storage.kind in ("gp3", "io2"):
+            oplog = int(min(max(storage.size_gb * 1024 * oplog_share, _OPLOG_MB[0]), _OPLOG_MB[1]))
+
+        return cls(
+            workload=workload,
+            instance_type=instance_type,
+            memory_gb=round(memory_gb, 1),
+            vcpus=int(info["vcpus"]),
+            cache_gb=cache_gb,
+            block_compressor=compressor,
+            journal_compressor=compressor,
+            oplog_size_mb=oplog,
+        )
+
+    def bootstrap_env(self) -> str:
+        """Export lines for scripts/mongodb_bootstrap.sh."""
+        values = {
+            "MONGO_TUNE_OS":            "true",
+            "MONGO_WT_CACHE_GB":        self.cache_gb,
+            "MONGO_BLOCK_COMPRESSOR":   self.block_compressor,
+            "MONGO_JOURNAL_COMPRESSOR": self.journal_compressor,
+            "MONGO_OPLOG_SIZE_MB":      self.oplog_size_mb or "",
+            "MONGO_READAHEAD_SECTORS":  self.readahead_sectors,
+            "MONGO_THP":                self.thp,
+            "MONGO_NOFILE":             self.nofile,
+            "MONGO_NPROC":              self.nproc,
+            "MONGO_SWAPPINESS":         self.swappiness,
+            "MONGO_MAX_MAP_COUNT":      self.max_map_count,
+            "MONGO_TCP_KEEPALIVE":      self.tcp_keepalive,
+        }
+        return "".join(f"export {k}={v}\n" for k, v in values.items())
+
+    def describe(self) -> dict:
+        """The applied profile, for deployment summaries."""
+        d = asdict(self)
+        d["oplog_size_mb"] = self.oplog_size_mb or "default"
+        return d
+
+
+def from_env(ec2_client, instance_type: str, storage: StorageProfile | None = None,
+             env=None) -> TuningProfile | None:
+    """Profile for `instance_type` from MONGO_WORKLOAD etc.; None with MONGO_TUNING=off."""
+    env = os.environ if env is None else env
+    if env.get("MONGO_TUNING", "on").lower() in ("off", "false", "0", "no"):
+        return None
+    return TuningProfile.compute(instance_type_info(ec2_client, instance_type), instance_type,
+                                 env.get("MONGO_WORKLOAD", "balanced").lower(), storage, env)
@@ -0,0 +1,121 @@
+# jeeves/mongo_url.py
+
+"""
+MongoDB connection strings for Rocket.Chat.
+
+Both deploy pipelines and mongo_scale_out build MONGO_URL and
+MONGO_OPLOG_URL here, from the replica set's members and the number of
+Rocket.Chat processes that will connect to it:
+
+  maxPoolSize     MONGO_CONNECTION_BUDGET (connections per mongod, default
+                  3000) shared by the Rocket.Chat processes, 10..100 each
+  readPreference  secondaryPreferred once the set has secondaries
+  compressors     zstd,snappy (MONGO_COMPRESSORS; mongod negotiates the first
+                  one both sides support)
+  timeouts        connect 10s, server selection 15s, idle connections
+                  closed after 5 min
+
+MONGO_MAX_POOL_SIZE fixes the pool size. The oplog URL points at the
+`local` database, always reads from the primary and uses a small pool:
+each process tails the oplog on a single cursor.
+"""
+
+from __future__ import annotations
+
+import os
+import shlex
+from dataclasses import dataclass
+from urllib.parse import quote_plus
+
+CONNECTION_BUDGET = 3000
+POOL_BOUNDS       = (10, 100)    # 100 is the Node.js driver's own default
+OPLOG_POOL_SIZE   = 5
+COMPRESSORS       = "zstd,snappy"
+TIMEOUTS = {
+    "connectTimeoutMS":         10000,
+    "serverSelectionTimeoutMS": 15000,
+    "maxIdleTimeMS":            300000,
+}
+
+# One Rocket.Chat process serves roughly this many active users (see sizing.CAPACITY)
+USERS_PER_PROCESS = 500
+
+
+def pool_size(rc_processes: int, env=None) -> int:
+    """maxPoolSize per Rocket.Chat process, so that all of them fit the budget."""
+    env = os.environ if env is None else env
+    if env.get("MONGO_MAX_POOL_SIZE"):
+        return int(env["MONGO_MAX_POOL_SIZE"])
+    budget = int(env.get("MONGO_CONNECTION_BUDGET") or CONNECTION_BUDGET)
+    low, high = POOL_BOUNDS
+    return max(low, min(high, budget // max(1, rc_processes)))
+
+
+def processes_for_users(users: int | None) -> int:
+    """Rocket.Chat processes expected for `users`, when no replica count is known."""
+    return max(1, -(-int(users or 0) // USERS_PER_PROCESS))
+
+
+def mongo_url(user: str, password: str, hosts: list[str], db: str, replset: str,
+              read_preference: str | None = None, **options) -> str:
+    """
+    Build a replica-set connection string for `hosts`; `options` are added
+    as query parameters in order.
+    """
+    params = [f"replicaSet={replset}", "authSource=admin"]
+    if read_preference:
+        params.append(f"readPreference={read_preference}")
+    # a single seed may be a member's private address that is not the one in
+    # rs.conf(); connect to it directly rather than through discovery
+    if len(hosts) == 1:
+        params.append("directConnection=true")
+    params += [f"{k}={v}" for k, v in options.items()]
+    return (f"mongodb://{quote_plus(user)}:{quote_plus(password)}@{','.join(hosts)}"
+            f"/{db}?{'&'.join(params)}")
+
+
+@dataclass
+class MongoURLs:
+    url: str
+    oplog_url: str
+    hosts: list
+    max_pool_size: int
+    read_preference: str | None
+    compressors: str
+
+    def env(self) -> str:
+        """Export lines for the Rocket.Chat bootstrap scripts."""
+        return (f"export MONGO_URL={shlex.quote(self.url)}\n"
+                f"export MONGO_OPLOG_URL={shlex.quote(self.oplog_url)}\n")
+
+    def describe(self) -> dict:
+        """Connection settings without credentials, for deployment summaries."""
+        return {
+            "hosts":           self.hosts,
+            "maxPoolSize":     self.max_pool_size,
+            "readPreference":  self.read_preference or "primary",
+            "compressors":     self.compressors,
+        }
+
+
+def build(user: str, password: str, hosts: list[str], replset: str, rc_processes: int,
+          db: str = "rocketchat", env=None) -> MongoURLs:
+    """
+    MONGO_URL / MONGO_OPLOG_URL for `rc_processes` Rocket.Chat processes
+    connecting to the replica set `hosts` (host:port, primary first).
+    """
+    env = os.environ if env is None else env
+    pool = pool_size(rc_processes, env)
+    compressors = env.get("MONGO_COMPRESSORS", COMPRESSORS)
+    read_preference = "secondaryPreferred" if len(hosts) > 1 else None
+    common = {**TIMEOUTS, "compressors": compressors} if compressors else dict(TIMEOUTS)
+    return MongoURLs(
+        url=mongo_url(user, password, hosts, db, replset, read_preference,
+                      maxPoolSize=pool, **common),
+        oplog_url=mongo_url(user, password, hosts, "local", replset,
+                            maxPoolSize=min(pool, OPLOG_POOL_SIZE), **common),
+        hosts=list(hosts),
+        max_pool_size=pool,
+        read_preference=read_preference,
+        compressors=compressors or "none",
+    )
@@ -1,6 +1,9 @@
 import pathlib
 from abc import ABC, abstractmethod
 
+from . import history, supervisor
+from .config import settings
+
 class Pipeline(ABC):
     # every pipeline must define:
     pipeline_name: str
@@ -9,3 +12,44 @@ class Pipeline(ABC):
 
     @abstractmethod
     def run(self) -> None: ...
+
+    def preflight(self) -> None:
+        """
+        Validate every input before anything is created; raise
+        jeeves.preflight.PreflightError listing all problems. The default
+        checks nothing.
+        """
+
+    def history_params(self) -> dict:
+        """
+        Parameters that make runs comparable in jeeves.history: the
+        pipeline's public scalar attributes. Pipelines that resolve more
+        (instance types, sizing tier) add those values.
+        """
+        return {k: v for k, v in vars(self).items()
+                if not k.startswith("_") and (v is None or isinstance(v, (str, int, float, bool)))}
+
+    def execute(self) -> None:
+        """
+        Entry point for the CLI: preflight, then run, then a table of every
+        external command the run started (jeeves.supervisor.history). The
+        run and its step timings are recorded in jeeves.history.
+        """
+        history.start(type(self).__module__.rsplit(".", 1)[-1], self.history_params(),
+                      settings.region_name)
+        history.step("preflight")
+        outcome, error = "failed", None
+        try:
+            self.preflight()
+            history.step("run")
+            self.run()
+            outcome = "ok"
+        except KeyboardInterrupt:
+            outcome = "interrupted"
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            supervisor.print_summary()
+            history.finish(outcome, error)
@@ -1,31 +1,30 @@
 from __future__ import annotations
 import pathlib
-import subprocess
+import tempfile
 import time
-import threading
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 from ..pipeline import Pipeline
 from ..aws_helpers import session
+from ..preflight import Preflight
+from .. import history, supervisor
 import shlex
+import os
+from ..kube import (
+    MANAGED_LABELS, MANAGED_SELECTOR, KubeAPI, StandInAPIServer,
+    patch_kubeconfig_server, resource_path, wait_for_deletion,
+)
+from ..manifests import applied_object_paths
+from ..ssh_tunnel import SSHTunnel
 
-def run_with_timeout(cmd: list[str], timeout: int, cwd: str | None = None) -> bool:
-    """Run command with timeout, return True if successful, False if timed out or errored."""
-    def target(proc_result):
-        try:
-            subprocess.run(cmd, cwd=cwd, check=True)
-            proc_result.append(True)
-        except subprocess.CalledProcessError:
-            proc_result.append(False)
-
-    result = []
-    thread = threading.Thread(target=target, args=(result,))
-    thread.start()
-    thread.join(timeout)
+# Kinds swept per namespace with a single deletecollection call each; only
+# objects labelled MANAGED_SELECTOR (set by rc_microservices_helm) are removed
+MANAGED_COLLECTIONS = [
+    ("traefik.io/v1alpha1", "IngressRoute"),
+    ("traefik.io/v1alpha1", "Middleware"),
+    ("networking.k8s.io/v1", "Ingress"),
+]
 
-    if thread.is_alive():
-        print(f"⚠️ Command timed out: {' '.join(cmd)}")
-        return False
-    return result[0]
 
 class K8sDestroyHelm(Pipeline):
     pipeline_name        = "Destroy Rocket.Chat Microservices Deployment with Helm Charts"
@@ -34,68 +33,177 @@ class K8sDestroyHelm(Pipeline):
     )
     docs_path = pathlib.Path(__file__).parents[2] / "docs" / "destroy_rc_microservices_helm.md"
 
-    def run(self) -> None:
-        tf_dir = pathlib.Path(__file__).parents[2] / "ps-auto-infra"
-        kubeconfig = tf_dir / "microk8s.config"
+    def __init__(self, stand_in: bool | str = False):
+        self.stand_in = str(stand_in).lower() in ("1", "true", "yes")
 
+    def cleanup_kubernetes(self, ec2, tf_dir: pathlib.Path, kubeconfig: pathlib.Path) -> None:
+        """
+        Remove everything Jeeves put into the cluster, through an SSH tunnel
+        to the controller's API server (see cleanup_cluster).
+        """
+        if not kubeconfig.exists():
+            print(f"No kubeconfig at {kubeconfig}, skipping Kubernetes cleanup")
+            return
 
+        ctrl = ec2.describe_instances(
+            Filters=[
+                {"Name": "tag:Name", "Values": ["jeeves-k8s-controller"]},
+                {"Name": "instance-state-name", "Values": ["running"]},
+            ]
+        )["Reservations"]
+        if not ctrl:
+            print("Controller is not running, skipping Kubernetes cleanup")
+            return
+        ctrl_pub = ctrl[0]["Instances"][0].get("PublicIpAddress")
+        key_path = pathlib.Path(os.environ["SSH_KEY_PATH"]).expanduser()
 
+        def uninstall(name: str, namespace: str) -> bool:
+            return supervisor.run([
+                "helm", "--kubeconfig", str(kubeconfig),
+                "uninstall", name, "--namespace", namespace,
+            ], timeout=300, stream=False).ok
 
-        try:
-            result = subprocess.run(
-                ["helm", "--kubeconfig", str(kubeconfig), "list", "--all-namespaces", "--short", "--output", "json"],
-                capture_output=True, text=True, check=True
-            )
+        with SSHTunnel(ctrl_pub, key_path, remote_port=16443, local_port=16443) as tunnel:
+            patch_kubeconfig_server(kubeconfig, f"https://127.0.0.1:{tunnel.local_port}")
+            with KubeAPI(kubeconfig) as api:
+                self.cleanup_cluster(api, applied_object_paths(tf_dir, self.namespace()), uninstall)
 
-            # If you want namespace info, parse JSON instead of relying on --short
-            list_result = subprocess.run(
-                ["helm", "--kubeconfig", str(kubeconfig), "list", "--all-namespaces", "--output", "json"],
-                capture_output=True, text=True, check=True
-            )
-            import json
-            releases = json.loads(list_result.stdout)
+    @staticmethod
+    def namespace() -> str:
+        return os.environ.get("NAMESPACE", "psautoinfra")
 
-            for release in releases:
-                name = release["name"]
-                namespace = release["namespace"]
+    def cleanup_cluster(self, api: KubeAPI, objects: list[str], uninstall,
+                        timeout: float = 300) -> list[str]:
+        """
+        Remove Jeeves' objects with a handful of API calls: Helm releases are
+        uninstalled concurrently (`uninstall(name, namespace) -> ok`), the
+        Jeeves-labelled objects are deleted per namespace and kind with
+        background propagation, `objects` are deleted by path, and all
+        deletions are then awaited together. Returns what is left.
+        """
+        with ThreadPoolExecutor(max_workers=supervisor.TOOL_LIMITS["helm"]) as pool:
+            # 1) Helm releases: one list call, concurrent uninstalls
+            secrets = api.get_json("/api/v1/secrets", labelSelector="owner=helm") or {}
+            releases = sorted({
+                (item["metadata"]["labels"]["name"], item["metadata"]["namespace"])
+                for item in secrets.get("items", [])
+            })
+            uninstalls = []
+            for name, namespace in releases:
                 print(f"  • Uninstalling Helm release '{name}' in namespace '{namespace}'")
-                subprocess.run([
-                    "helm", "--kubeconfig", str(kubeconfig), "uninstall", name, "--namespace", namespace
-                ], check=False)
+                uninstalls.append(pool.submit(uninstall, name, namespace))
 
-        except subprocess.CalledProcessError as e:
-            print(f"⚠️ Helm release listing failed: {e}")
+            # 2) Jeeves-labelled objects, in bulk per namespace and kind
+            collections = [
+                (resource_path(api_version, kind, ns), MANAGED_SELECTOR)
+                for ns in (self.namespace(), "kube-system")
+                for api_version, kind in MANAGED_COLLECTIONS
+            ]
+            for path, selector in collections:
+                api.delete(path, labelSelector=selector)
 
-        print("🔴 Cleaning up Kubernetes resources…")
-        yaml_files = [
-            "redirect-to-https.yaml",
-            "rocketchat-ingress-http.yaml",
-            "rocketchat-ingress-https.yaml",
-        ]
-        for fn in yaml_files:
-            path = tf_dir / fn
-            if path.exists():
-                subprocess.run([
-                    "kubectl", "--kubeconfig", str(kubeconfig),
-                    "delete", "-f", str(path),
-                    "--ignore-not-found"
-                ], check=False)
-
-        crd_urls = [
-            "https://raw.githubusercontent.com/traefik/traefik/v3.3/docs/content/reference/dynamic-configuration/kubernetes-crd-definition-v1.yml",
-            "https://raw.githubusercontent.com/traefik/traefik/v3.3/docs/content/reference/dynamic-configuration/kubernetes-crd-rbac.yml",
+            # 3) Objects from the applied manifests, one DELETE each
+            for path in objects:
+                api.delete(path)
+            print(f"  • Issued deletes for {len(collections)} collection(s) and {len(objects)} object(s)")
+
+            # 4) Wait for releases and deletions together
+            results = [u.result() for u in uninstalls]
+        failed = [r for r, ok in zip(releases, results) if not ok]
+        if failed:
+            print(f"⚠️ helm uninstall failed for: {failed}")
+        remaining = wait_for_deletion(
+            api, objects,
+            collections + [("/api/v1/secrets", "owner=helm")],
+            timeout=timeout,
+        )
+        if remaining:
+            print(f"⚠️ Still present after {timeout:.0f}s: {remaining}")
+        else:
+            print("✔ Kubernetes resources removed")
+        return remaining
+
+    def run_stand_in(self) -> None:
+        """
+        Run cleanup_cluster against a StandInAPIServer seeded with a Helm
+        release, labelled and unlabelled objects in both swept namespaces
+        and one manifest object; only the unlabelled ones may survive.
+        """
+        ns = self.namespace()
+        route = resource_path("traefik.io/v1alpha1", "IngressRoute", ns, "rocketchat-https")
+        crd = resource_path("apiextensions.k8s.io/v1", "CustomResourceDefinition",
+                            name="ingressroutes.traefik.io")
+        labelled = {"metadata": {"labels": dict(MANAGED_LABELS)}}
+        objects = {
+            resource_path("v1", "Secret", ns, "sh.helm.release.v1.rocketchat.v1"):
+                {"metadata": {"namespace": ns, "labels": {"owner": "helm", "name": "rocketchat"}}},
+            route: labelled,
+            resource_path("traefik.io/v1alpha1", "Middleware", ns, "redirect-to-https"): labelled,
+            resource_path("traefik.io/v1alpha1", "Middleware", "kube-system", "jeeves-headers"): labelled,
+            crd: {"metadata": {}},
+        }
+        foreign = [
+            resource_path("traefik.io/v1alpha1", "IngressRoute", ns, "grafana"),
+            resource_path("networking.k8s.io/v1", "Ingress", "kube-system", "dashboard"),
         ]
-        for url in crd_urls:
-            subprocess.run([
-                "kubectl", "--kubeconfig", str(kubeconfig),
-                "delete", "-f", url,
-                "--ignore-not-found"
-            ], check=False)
+        objects.update({path: {"metadata": {"labels": {"team": "other"}}} for path in foreign})
 
+        with tempfile.TemporaryDirectory() as tmp, StandInAPIServer(objects) as server:
+            kubeconfig = server.write_kubeconfig(pathlib.Path(tmp) / "stand-in.config")
+
+            def uninstall(name: str, namespace: str) -> bool:
+                # what `helm uninstall` does to the release record
+                with KubeAPI(kubeconfig) as helm:
+                    helm.delete(resource_path("v1", "Secret", namespace, f"sh.helm.release.v1.{name}.v1"))
+                return True
+
+            with KubeAPI(kubeconfig) as api:
+                remaining = self.cleanup_cluster(api, [crd], uninstall, timeout=30)
+            left = sorted(server.live())
+            deletes = sum(1 for method, _ in server.requests if method == "DELETE")
+
+        print(f"Stand-in API server: {deletes} DELETE call(s), {len(left)} object(s) left")
+        if remaining or left != sorted(foreign):
+            raise RuntimeError(f"Stand-in cleanup left {left}, expected only {sorted(foreign)}")
+        print("✔ Only objects without the Jeeves label survived")
+
+    def preflight(self) -> None:
+        pf = Preflight("destroy_rc_microservices_helm")
+        if self.stand_in:
+            pf.check()
+            return
+        # Kubernetes cleanup only runs when a kubeconfig was left behind
+        if (pathlib.Path(__file__).parents[2] / "ps-auto-infra" / "microk8s.config").exists():
+            env = pf.require_env("SSH_KEY_PATH")
+            if "SSH_KEY_PATH" in env:
+                pf.require_key(env["SSH_KEY_PATH"])
+            pf.require_tools("ssh", "helm")
+        pf.check_credentials(session())
+        pf.check()
+
+    def run(self) -> None:
+        if self.stand_in:
+            history.step("k8s_cleanup")
+            print("🔴 Cleaning up a local stand-in API server (no AWS resources are touched)…")
+            self.run_stand_in()
+            return
+        tf_dir = pathlib.Path(__file__).parents[2] / "ps-auto-infra"
+        kubeconfig = tf_dir / "microk8s.config"
 
         sess = session()
         ec2 = sess.client("ec2")
-        names = ["jeeves-mongo-master", "jeeves-k8s-controller", "jeeves-k8s-worker"]
+
+        history.step("k8s_cleanup")
+        print("🔴 Cleaning up Kubernetes resources…")
+        try:
+            self.cleanup_kubernetes(ec2, tf_dir, kubeconfig)
+        except Exception as e:
+            print(f"⚠️ Kubernetes cleanup failed, continuing with teardown: {e}")
+
+        names = [
+            "jeeves-mongo-master", "jeeves-k8s-controller",
+            "jeeves-k8s-worker*", "jeeves-mongo-read-replica*",
+        ]
         to_terminate: list[str] = []
 
         for name in names:
@@ -121,6 +229,7 @@ class K8sDestroyHelm(Pipeline):
         else:
             print("No Jeeves-managed instances found, skipping termination")
 
+        history.step("security_groups")
         print("🔴 Cleaning up Security Groups…")
         sg_names = ["jeeves-k8s-mongo", "jeeves-k8s-controller", "jeeves-k8s-worker"]
         for name in sg_names:
@@ -179,6 +288,7 @@ class K8sDestroyHelm(Pipeline):
 
         print("\n✅ k8s_deployment_helm destroy complete")
 
+        history.step("local_state")
         # ─────────────────────────────────────────────────────────────
         # Final cleanup: Remove Terraform state and cached files
         # ─────────────────────────────────────────────────────────────
@@ -196,6 +306,6 @@ class K8sDestroyHelm(Pipeline):
             print("  • Deleted .terraform/ directory")
 
 
-def run(**kwargs):
-    K8sDestroyHelm().run()
+def run(stand_in=False, **kwargs):
+    K8sDestroyHelm(stand_in=stand_in).execute()
 
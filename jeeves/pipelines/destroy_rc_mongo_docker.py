@@ -13,19 +13,31 @@ import pathlib
 from botocore.exceptions import ClientError
 from ..pipeline import Pipeline
 from ..aws_helpers import session
+from ..preflight import Preflight
+from ..warm_pool import POOL_TAG
 
 class DestroyBasicDocker(Pipeline):
     pipeline_name        = "Destroy Rocket.Chat Docker Deployment  "
     pipeline_description = "Destroy the two-node Deployment. One MongoDB, One Rocket.Chat Node"
     docs_path            = pathlib.Path(__file__).parents[2] / "docs" / "destroy_rc_mongo_docker.md"
+
+    def preflight(self) -> None:
+        pf = Preflight("destroy_rc_mongo_docker")
+        pf.check_credentials(session())
+        pf.check()
+
     def run(self) -> None:
         sess = session()
         ec2 = sess.resource("ec2")
         ec2c = sess.client("ec2")
 
-        # 1) Find instances tagged jeeves-mongo or jeeves-rocketchat
+        # 1) Find instances tagged jeeves-mongo or jeeves-rocketchat (plus the
+        #    app nodes and Traefik front node of a multi-node RC tier, and the
+        #    secondaries added by mongo_scale_out)
         filters = [
-            {"Name": "tag:Name", "Values": ["jeeves-mongo", "jeeves-rocketchat"]},
+            {"Name": "tag:Name", "Values": ["jeeves-mongo", "jeeves-mongo-secondary*",
+                                            "jeeves-rocketchat", "jeeves-rocketchat-app*",
+                                            "jeeves-rc-lb"]},
             {"Name": "instance-state-name", "Values": ["pending","running","stopped","stopping"]},
         ]
         instances = list(ec2.instances.filter(Filters=filters))
@@ -48,6 +60,21 @@ class DestroyBasicDocker(Pipeline):
             sgs = resp.get("SecurityGroups", [])
             if sgs:
                 sg_id = sgs[0]["GroupId"]
+                # Warm-pool members are kept across deployments and live in this SG
+                pooled = [
+                    i["InstanceId"]
+                    for r in ec2c.describe_instances(Filters=[
+                        {"Name": "instance.group-id",   "Values": [sg_id]},
+                        {"Name": "tag-key",              "Values": [POOL_TAG]},
+                        {"Name": "instance-state-name", "Values": ["pending", "running", "stopping", "stopped"]},
+                    ])["Reservations"]
+                    for i in r["Instances"]
+                ]
+                if pooled:
+                    print(f"Keeping security group 'jeeves-basic' ({sg_id}): warm-pool members "
+                          f"{', '.join(pooled)} use it. Run `jeeves pipelines run warm_pool --drain` "
+                          "to remove them, then destroy again.")
+                    return
                 print(f"Deleting security group 'jeeves-basic' ({sg_id})")
                 ec2c.delete_security_group(GroupId=sg_id)
                 print("✔ Security group deleted")
@@ -57,4 +84,4 @@ class DestroyBasicDocker(Pipeline):
             print(f"Error deleting security group: {e}")
 
 def run(**kwargs):
-    DestroyBasicDocker().run()
+    DestroyBasicDocker().execute()
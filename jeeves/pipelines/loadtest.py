@@ -0,0 +1,117 @@
+# jeeves/pipelines/loadtest.py
+
+"""
+Pipeline: loadtest
+
+Drives simulated Rocket.Chat users (REST login, DDP subscription, sending
+and receiving messages) against a deployment from the runner, reports
+throughput, latency percentiles and error rates, and stores the result
+under ~/.jeeves/deployments/<deployment>/loadtest/ for comparison across
+sizes and releases.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import pathlib
+import resource
+
+from ..pipeline import Pipeline
+from ..preflight import Preflight
+from .. import history, loadtest, sizing
+from .verify import default_url
+
+
+class LoadTest(Pipeline):
+    pipeline_name        = "Load Test"
+    pipeline_description = "Simulates N Rocket.Chat users against a deployment and records the results"
+    docs_path            = pathlib.Path(__file__).parents[2] / "docs" / "loadtest.md"
+
+    def __init__(self, users: int | str | None = None, duration: float | str = 60,
+                 ramp: float | str = 30, interval: float | str = 10, room: str = "GENERAL",
+                 url: str | None = None, deployment: str | None = None,
+                 mock: bool | str = False):
+        env = os.environ
+        self.mock = str(mock).lower() in ("1", "true", "yes")
+        self.url = url or default_url()
+        self.deployment = deployment or env.get("DEPLOYMENT_NAME") or ("mock" if self.mock else "")
+        self.max_error_rate = float(env.get("LOADTEST_MAX_ERROR_RATE", 0.01))
+        # CONCURRENT_USERS is what the Helm deployment was sized for
+        self.profile = loadtest.LoadProfile(
+            users=int(users or env.get("CONCURRENT_USERS") or 50),
+            duration=float(duration), ramp=float(ramp), interval=float(interval), room=room,
+            prefix=env.get("LOADTEST_USER_PREFIX", "jeeves-load-"),
+            password=env.get("LOADTEST_PASSWORD", "") or ("load" if self.mock else ""),
+        )
+
+    @property
+    def files_needed(self) -> int:
+        # Two sockets per user while logging in, one afterwards
+        return 2 * self.profile.users + 64
+
+    def history_params(self) -> dict:
+        params = super().history_params()
+        params["profile"] = {k: v for k, v in vars(self.profile).items() if k != "password"}
+        return params
+
+    def preflight(self) -> None:
+        pf = Preflight("loadtest")
+        if not self.mock:
+            pf.require_env("LOADTEST_PASSWORD")
+            if not self.url:
+                pf.fail("nothing to load: pass --url or set ROOT_URL or DOMAIN")
+            if not self.deployment:
+                pf.fail("results are stored per deployment: pass --deployment or set DEPLOYMENT_NAME")
+        if self.profile.users < 1:
+            pf.fail("--users must be at least 1")
+        if self.profile.interval <= 0 or self.profile.duration <= 0:
+            pf.fail("--interval and --duration must be positive")
+        hard = resource.getrlimit(resource.RLIMIT_NOFILE)[1]
+        if hard != resource.RLIM_INFINITY and self.files_needed > hard:
+            pf.fail(f"{self.profile.users} users need about {self.files_needed} open files; "
+                    f"the hard limit is {hard}")
+        pf.check()
+
+    async def _drive(self) -> dict:
+        env = os.environ
+        if self.mock:
+            async with loadtest.MockRocketChat() as url:
+                await loadtest.ensure_users(url, self.profile, "admin", "admin")
+                return await loadtest.run_load(url, self.profile)
+        admin = env.get("LOADTEST_ADMIN_USER")
+        if admin:
+            created = await loadtest.ensure_users(self.url, self.profile, admin,
+                                                  env.get("LOADTEST_ADMIN_PASSWORD", ""))
+            print(f"✔ {created} load-test users created ({self.profile.users} in use)")
+        return await loadtest.run_load(self.url, self.profile)
+
+    def run(self) -> None:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY and soft < self.files_needed:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (self.files_needed, hard))
+
+        p = self.profile
+        print(f"▶ {p.users} users against {'a local mock' if self.mock else self.url}: "
+              f"ramp {p.ramp:g}s, send for {p.duration:g}s, a message every ~{p.interval:g}s each",
+              flush=True)
+        history.step("load")
+        result = asyncio.run(self._drive())
+        loadtest.print_report(result)
+
+        history.step("save")
+        # the sizing plan the deployment was built with, else the environment's settings
+        applied = sizing.load_applied(self.deployment) or loadtest.sizing_from_env()
+        path = loadtest.save(result, self.deployment, applied)
+        print(f"\nResults saved to {path}")
+        loadtest.print_comparison(loadtest.load_results())
+
+        if result["error_rate"] > self.max_error_rate:
+            raise RuntimeError(f"Load test error rate {result['error_rate']:.2%} is above "
+                               f"LOADTEST_MAX_ERROR_RATE ({self.max_error_rate:.2%})")
+
+
+def run(users=None, duration=60, ramp=30, interval=10, room="GENERAL",
+        url=None, deployment=None, mock=False, **kwargs):
+    LoadTest(users=users, duration=duration, ramp=ramp, interval=interval, room=room,
+             url=url, deployment=deployment, mock=mock).execute()
@@ -6,13 +6,14 @@ import json
 import os
 import pathlib
 import socket
-import subprocess
 import time
 import pathlib
 from botocore.exceptions import ClientError
 from ..pipeline import Pipeline
 from ..aws_helpers import session, latest_ubuntu_ami
 from ..config import settings
+from ..preflight import Preflight
+from .. import history, mongo_tuning, supervisor
 
 
 def wait_for_port(host: str, port: int = 22, timeout: int = 300) -> None:
@@ -35,6 +36,32 @@ class BasicDeploymentDocker(Pipeline):
     pipeline_description = "Deploys standalone MongoDB "
     docs_path            = pathlib.Path(__file__).parents[2] / "docs" / "mongo.md"
 
+    def history_params(self) -> dict:
+        return {"instance_type": settings.default_instance_type}
+
+    def preflight(self) -> None:
+        pf = Preflight("mongo")
+        env = pf.require_env("SSH_KEY_NAME", "SSH_KEY_PATH", "SSH_PUBLIC_KEY_PATH",
+                             "MONGO_USERNAME", "MONGO_PASSWORD")
+        if "SSH_KEY_PATH" in env:
+            pf.require_key(env["SSH_KEY_PATH"])
+        if "SSH_PUBLIC_KEY_PATH" in env:
+            pf.require_files(env["SSH_PUBLIC_KEY_PATH"])
+        pf.require_files(pathlib.Path(__file__).resolve().parents[2] / "scripts" / "mongodb_bootstrap.sh")
+        pf.require_tools("ssh")
+
+        sess = session()
+        if pf.check_credentials(sess):
+            ec2c = sess.client("ec2")
+            pf.check_instance_types(ec2c, [settings.default_instance_type])
+            pf.run("MongoDB tuning profile", mongo_tuning.from_env, ec2c, settings.default_instance_type)
+            # a new node reuses the 'jeeves-basic' SG from rc_mongo_docker
+            if not ec2c.describe_security_groups(
+                Filters=[{"Name": "group-name", "Values": ["jeeves-basic"]}]
+            )["SecurityGroups"]:
+                pf.fail("security group 'jeeves-basic' not found; run rc_mongo_docker first")
+        pf.check()
+
     def run(self) -> None:
         # ────────────────────────────────────────────────────
         # 1) SSH key validation/import (omitted for brevity)
@@ -59,6 +86,7 @@ class BasicDeploymentDocker(Pipeline):
             else:
                 raise
 
+        history.step("mongo_instance")
         # ────────────────────────────────────────────────────
         # 2) Find-or-create MongoDB instance
         # ────────────────────────────────────────────────────
@@ -126,6 +154,7 @@ class BasicDeploymentDocker(Pipeline):
         mongo_ip = mongo_inst.public_ip_address
         print(f"MongoDB instance is {mongo_inst.id} @ {mongo_ip}")
 
+        history.step("mongo_bootstrap")
         # ────────────────────────────────────────────────────
         # 3) Wait for SSH & install MongoDB via SSH
         # ────────────────────────────────────────────────────
@@ -147,22 +176,24 @@ class BasicDeploymentDocker(Pipeline):
         if not mongo_username or not mongo_password:
             raise RuntimeError("MONGO_USERNAME and MONGO_PASSWORD must be set in your .env")
 
+        tuning = mongo_tuning.from_env(ec2c, mongo_inst.instance_type)
+
         # build an export header for the remote script
         exports = "\n".join([
             f"export MONGO_PORT={port}",
             f"export REPLSET_NAME={replset_name}",
             f"export MONGO_USERNAME={mongo_username}",
             f"export MONGO_PASSWORD={mongo_password}",
-        ]) + "\n"
+        ]) + "\n" + (tuning.bootstrap_env() if tuning else "")
         full_script = exports + script.read_text()
 
         print("Running MongoDB bootstrap over SSH as root…")
         # stream the combined script into sudo bash on the remote host
-        subprocess.run([
+        supervisor.run([
             "ssh", "-o", "StrictHostKeyChecking=no",
             "-i", str(key_path),
             f"ubuntu@{mongo_ip}", "sudo", "bash", "-s"
-        ], check=True, input=full_script, text=True)
+        ], check=True, input=full_script, timeout=600)
 
         print("✔ MongoDB installation complete.")
 
@@ -170,10 +201,11 @@ class BasicDeploymentDocker(Pipeline):
         print("Running Rocket.Chat  Installation …")
         # Final summary
         summary = {
-            "mongodb": {"id": mongo_inst.id, "public_ip": mongo_ip},
+            "mongodb": {"id": mongo_inst.id, "public_ip": mongo_ip,
+                        "tuning": tuning.describe() if tuning else "mongod defaults"},
         }
         print(json.dumps(summary, indent=2))
 
 
 def run(**kwargs):
-    BasicDeploymentDocker().run()
+    BasicDeploymentDocker().execute()
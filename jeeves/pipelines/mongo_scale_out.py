@@ -0,0 +1,324 @@
+# jeeves/pipelines/mongo_scale_out.py
+
+"""
+Pipeline: mongo_scale_out
+
+Adds N secondaries to the replica set of an existing Jeeves MongoDB node
+(`jeeves-mongo`), streams initial-sync progress and replication lag until
+every member is SECONDARY, then points Rocket.Chat at the whole set with
+reads going to secondaries.
+
+With apt / APT_CACHE the secondaries install their packages through the
+APT cache on the primary (jeeves/apt_cache.py), started there if needed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import shlex
+import time
+
+from ..pipeline import Pipeline
+from ..aws_helpers import session, latest_ubuntu_ami
+from ..config import settings
+from ..preflight import Preflight
+from .. import apt_cache, fleet, history, mongo_tuning, mongo_url, sizing, supervisor
+from ..fleet import wait_for_ssh
+
+# stderr is captured along with stdout, so keep ssh's own warnings out of it
+SSH_OPTS = ["-o", "StrictHostKeyChecking=no", "-o", "BatchMode=yes", "-o", "LogLevel=ERROR"]
+
+SCRIPTS_DIR = pathlib.Path(__file__).parents[2] / "scripts"
+
+# Prints one JSON line describing every member as seen by the primary
+_STATUS_JS = """
+const s = rs.status();
+const primary = s.members.find(m => m.stateStr === "PRIMARY");
+print(JSON.stringify(s.members.map(m => ({
+  name: m.name,
+  state: m.stateStr,
+  lag: primary && m.optimeDate ? (primary.optimeDate - m.optimeDate) / 1000 : null,
+  msg: m.infoMessage || "",
+}))));
+"""
+
+# Run on a syncing member; prints its initial-sync byte counters
+_INITIAL_SYNC_JS = """
+const s = db.adminCommand({replSetGetStatus: 1, initialSync: 1}).initialSyncStatus || {};
+print(JSON.stringify({
+  copied: s.approxTotalBytesCopied || 0,
+  total: s.approxTotalDataSize || 0,
+}));
+"""
+
+
+class MongoScaleOut(Pipeline):
+    pipeline_name        = "MongoDB Replica-Set Scale-Out"
+    pipeline_description = "Adds N secondaries to an existing Jeeves MongoDB replica set"
+    docs_path            = pathlib.Path(__file__).parents[2] / "docs" / "mongo_scale_out.md"
+
+    def __init__(self, secondaries: int | str | None = None, deployment: str | None = None,
+                 sync_timeout: int | str = 3600, apt: str | None = None):
+        env = os.environ
+        self.apt          = apt_cache.mode(apt)
+        self.secondaries  = int(secondaries if secondaries is not None else env.get("MONGO_SECONDARIES", 2))
+        self.deployment   = deployment or env.get("DEPLOYMENT_NAME")
+        self.sync_timeout = int(sync_timeout)
+        if not 1 <= self.secondaries <= 6:
+            # 7 voting members max, one of which is the primary
+            raise ValueError("--secondaries must be between 1 and 6")
+
+    def _primary_filters(self) -> list[dict]:
+        filters = [
+            {"Name": "tag:Name",            "Values": ["jeeves-mongo"]},
+            {"Name": "instance-state-name", "Values": ["running"]},
+        ]
+        if self.deployment:
+            filters.append({"Name": "tag:Deployment", "Values": [self.deployment]})
+        return filters
+
+    def preflight(self) -> None:
+        pf = Preflight("mongo_scale_out")
+        env = pf.require_env("SSH_KEY_NAME", "SSH_KEY_PATH", "MONGO_USERNAME", "MONGO_PASSWORD")
+        if "SSH_KEY_PATH" in env:
+            pf.require_key(env["SSH_KEY_PATH"])
+        pf.require_files(SCRIPTS_DIR / "mongodb_bootstrap.sh",
+                         SCRIPTS_DIR / "rocket_chat_update_mongo_url.sh",
+                         *([apt_cache.SCRIPT] if self.apt else []))
+        pf.require_tools("ssh")
+
+        sess = session()
+        if pf.check_credentials(sess):
+            ec2c = sess.client("ec2")
+            rs = ec2c.describe_instances(Filters=self._primary_filters())["Reservations"]
+            if not rs:
+                pf.fail("no running 'jeeves-mongo' node found to scale out")
+            else:
+                # secondaries are launched like the primary, in its subnet
+                primary = rs[0]["Instances"][0]
+                pf.check_instance_types(ec2c, [primary["InstanceType"]], subnet_id=primary["SubnetId"])
+                pf.run("MongoDB tuning profile", mongo_tuning.from_env, ec2c, primary["InstanceType"])
+        pf.check()
+
+    def _mongosh(self, host: str, js: str, key_path: pathlib.Path) -> str:
+        env = os.environ
+        cmd = " ".join([
+            "mongosh", "--quiet",
+            "--port", shlex.quote(env.get("MONGO_PORT", "27017")),
+            "-u", shlex.quote(env["MONGO_USERNAME"]),
+            "-p", shlex.quote(env["MONGO_PASSWORD"]),
+            "--authenticationDatabase", "admin",
+            "--eval", shlex.quote(js),
+        ])
+        res = supervisor.run(
+            ["ssh", *SSH_OPTS, "-i", str(key_path), f"ubuntu@{host}", cmd],
+            timeout=120, stream=False,
+        )
+        if not res.ok:
+            reason = "timed out" if res.exit_code is None else "failed"
+            raise RuntimeError(f"mongosh on {host} {reason}: {res.output.strip()}")
+        return res.output.strip().splitlines()[-1] if res.output.strip() else ""
+
+    def run(self) -> None:
+        env = os.environ
+        key_name   = env["SSH_KEY_NAME"]
+        key_path   = pathlib.Path(env["SSH_KEY_PATH"]).expanduser()
+        mongo_user = env["MONGO_USERNAME"]
+        mongo_pass = env["MONGO_PASSWORD"]
+        port       = env.get("MONGO_PORT", "27017")
+        repl_name  = env.get("REPLSET_NAME", "rs0")
+
+        sess = session()
+        ec2c = sess.client("ec2")
+        ec2  = sess.resource("ec2")
+
+        # 1) Locate the current primary node
+        rs = ec2c.describe_instances(Filters=self._primary_filters())["Reservations"]
+        if not rs:
+            raise RuntimeError("No running 'jeeves-mongo' node found to scale out")
+        primary = rs[0]["Instances"][0]
+        tags = {t["Key"]: t["Value"] for t in primary.get("Tags", [])}
+        deployment = self.deployment or tags.get("Deployment", "")
+        primary_pub = primary["PublicIpAddress"]
+        primary_pri = primary["PrivateIpAddress"]
+        print(f"Primary: {primary['InstanceId']} @ {primary_pub} ({primary_pri})")
+
+        history.step("launch")
+        # 2) Launch (or reuse) secondaries with one batched call
+        names = [f"jeeves-mongo-secondary{i}" for i in range(1, self.secondaries + 1)]
+        existing = {}
+        resp = ec2c.describe_instances(Filters=[
+            {"Name": "tag:Name",            "Values": names},
+            {"Name": "instance-state-name", "Values": ["pending", "running", "stopped"]},
+        ] + ([{"Name": "tag:Deployment", "Values": [deployment]}] if deployment else []))
+        for r in resp["Reservations"]:
+            for inst in r["Instances"]:
+                name = next(t["Value"] for t in inst["Tags"] if t["Key"] == "Name")
+                existing.setdefault(name, ec2.Instance(inst["InstanceId"]))
+                if inst["State"]["Name"] == "stopped":
+                    existing[name].start()
+                print(f"Reusing {name} {inst['InstanceId']} ({inst['State']['Name']})")
+
+        missing = [n for n in names if n not in existing]
+        if missing:
+            launched = ec2.create_instances(
+                ImageId=latest_ubuntu_ami(ec2c, settings.default_os_version),
+                InstanceType=primary["InstanceType"],
+                MinCount=len(missing), MaxCount=len(missing),
+                KeyName=key_name,
+                NetworkInterfaces=[{
+                    "SubnetId": primary["SubnetId"],
+                    "DeviceIndex": 0,
+                    "AssociatePublicIpAddress": True,
+                    "Groups": [g["GroupId"] for g in primary["SecurityGroups"]],
+                }],
+                TagSpecifications=[{
+                    "ResourceType": "instance",
+                    "Tags": [
+                        {"Key": "Name",       "Value": missing[0]},
+                        {"Key": "Project",    "Value": "jeeves"},
+                        {"Key": "Role",       "Value": "mongo-secondary"},
+                        {"Key": "Deployment", "Value": deployment},
+                    ],
+                }],
+                UserData="#!/usr/bin/env bash\nexit 0\n",
+            )
+            for name, inst in zip(missing, launched):
+                if name != missing[0]:
+                    ec2c.create_tags(Resources=[inst.id], Tags=[{"Key": "Name", "Value": name}])
+                existing[name] = inst
+                print(f"Launching {name} {inst.id}…")
+
+        nodes = [existing[n] for n in names]
+        ec2c.get_waiter("instance_running").wait(InstanceIds=[i.id for i in nodes])
+        for inst in nodes:
+            inst.reload()
+        secondaries = {n: existing[n] for n in names}
+
+        history.step("bootstrap")
+        # 3) Bootstrap all secondaries concurrently with the primary's keyfile
+        keyfile = supervisor.run(
+            ["ssh", *SSH_OPTS, "-i", str(key_path), f"ubuntu@{primary_pub}",
+             "sudo base64 -w0 /etc/mongo-keyfile"],
+            check=True, timeout=60, stream=False,
+        ).output.strip()
+
+        # Secondaries share the primary's instance type, so the same profile;
+        # their data is on the root volume, so the oplog keeps mongod's default
+        # size unless MONGO_OPLOG_SIZE_MB is set
+        tuning = mongo_tuning.from_env(ec2c, primary["InstanceType"])
+        if tuning:
+            print(f"MongoDB tuning ({tuning.workload}): WiredTiger cache {tuning.cache_gb} GiB, "
+                  f"{tuning.block_compressor}")
+
+        script = SCRIPTS_DIR / "mongodb_bootstrap.sh"
+        header = "\n".join([
+            f"export MONGO_PORT={port}",
+            f"export REPLSET_NAME={repl_name}",
+            f"export MONGO_USERNAME={shlex.quote(mongo_user)}",
+            f"export MONGO_PASSWORD={shlex.quote(mongo_pass)}",
+            "export MONGO_ROLE=secondary",
+            f"export MONGO_KEYFILE_B64={keyfile}",
+        ]) + "\n" + (tuning.bootstrap_env() if tuning else "")
+
+        apt_url = self.apt
+        if self.apt == "node":
+            # the primary serves the cache; a no-op restart if it already does
+            sg_ids = [g["GroupId"] for g in primary["SecurityGroups"]]
+            for sg_id in sg_ids:
+                apt_cache.allow(ec2c, sg_id, sg_ids)
+            fleet.check([fleet.run_on_host(primary_pub, "sudo bash -s", key_path, timeout=600,
+                                           input=apt_cache.prefix(serve=True), label="jeeves-mongo")],
+                        "APT cache")
+            apt_url = apt_cache.url_for(primary_pri)
+        if apt_url:
+            print(f"Secondaries install packages through the APT cache at {apt_url}")
+            header += apt_cache.prefix(apt_url)
+
+        hosts = {n: i.public_ip_address for n, i in secondaries.items()}
+        for host in hosts.values():
+            wait_for_ssh(host, key_path)
+        print(f"→ Bootstrapping {len(hosts)} secondar{'y' if len(hosts) == 1 else 'ies'} in parallel…")
+        fleet.check(
+            fleet.run_on_hosts(hosts, "sudo bash -s", key_path,
+                               input=header + script.read_text(), timeout=900),
+            "MongoDB secondary bootstrap",
+        )
+
+        history.step("rs_add")
+        # 4) rs.add() every new member on the primary
+        members = [f"{i.private_ip_address}:{port}" for i in secondaries.values()]
+        add_js = "const cfg = rs.conf(); const have = cfg.members.map(m => m.host);\n" + "".join(
+            f'if (!have.includes("{m}")) {{ rs.add({{host: "{m}"}}); print("added {m}"); }}\n'
+            for m in members
+        )
+        self._mongosh(primary_pub, add_js, key_path)
+        print(f"✔ rs.add() issued for {', '.join(members)}")
+
+        history.step("initial_sync")
+        # 5) Stream initial-sync progress and lag until all are SECONDARY
+        by_private = {i.private_ip_address: i.public_ip_address for i in secondaries.values()}
+        deadline = time.time() + self.sync_timeout
+        while True:
+            status = json.loads(self._mongosh(primary_pub, _STATUS_JS, key_path))
+            lines = []
+            for m in status:
+                line = f"  {m['name']:<22} {m['state']:<10}"
+                if m["lag"] is not None and m["state"] == "SECONDARY":
+                    line += f" lag {m['lag']:.0f}s"
+                elif m["state"] == "STARTUP2":
+                    ip = m["name"].rsplit(":", 1)[0]
+                    try:
+                        prog = json.loads(self._mongosh(by_private[ip], _INITIAL_SYNC_JS, key_path))
+                        if prog["total"]:
+                            line += f" initial sync {100 * prog['copied'] / prog['total']:.1f}%"
+                            line += f" ({prog['copied'] >> 20}/{prog['total'] >> 20} MiB)"
+                    except (KeyError, ValueError, RuntimeError):
+                        line += " initial sync in progress"
+                if m["msg"]:
+                    line += f" — {m['msg']}"
+                lines.append(line)
+            print(time.strftime("%H:%M:%S") + " replica set:\n" + "\n".join(lines), flush=True)
+
+            if all(m["state"] in ("PRIMARY", "SECONDARY") for m in status) \
+                    and len(status) >= len(members) + 1:
+                break
+            if time.time() > deadline:
+                raise TimeoutError(f"Secondaries not in sync after {self.sync_timeout}s")
+            time.sleep(10)
+        print("✔ All members are SECONDARY")
+
+        history.step("rc_update")
+        # 6) Point Rocket.Chat at the full set, reads to secondaries
+        rc_nodes = [n for n in (fleet.discover(deployment, "rocketchat-node", ec2c) if deployment else [])
+                    if n["public_ip"]]
+        if rc_nodes:
+            # pool sizes follow the replicas the deployment was built with
+            applied = (sizing.load_applied(deployment) or {}) if deployment else {}
+            per_node = applied.get("rc_replicas") or int(env.get("ROCKETCHAT_SCALE") or 4)
+            urls = mongo_url.build(mongo_user, mongo_pass, [f"{primary_pri}:{port}"] + members,
+                                   repl_name, rc_processes=len(rc_nodes) * per_node)
+            print(f"Rocket.Chat → MongoDB: {urls.describe()}")
+            update_header = urls.env()
+            update_script = SCRIPTS_DIR / "rocket_chat_update_mongo_url.sh"
+            fleet.check(
+                fleet.run_on_hosts({n["name"]: n["public_ip"] for n in rc_nodes}, "sudo bash -s", key_path,
+                                   input=update_header + update_script.read_text(), timeout=600),
+                "Rocket.Chat Mongo URL update",
+            )
+            print(f"✔ Rocket.Chat on {len(rc_nodes)} node(s) now reads from secondaries")
+        else:
+            print("⚠️  No Rocket.Chat nodes found for this deployment; connection string not updated")
+
+        print(json.dumps({
+            "primary":     {"id": primary["InstanceId"], "private_ip": primary_pri},
+            "secondaries": {n: {"id": i.id, "public_ip": i.public_ip_address,
+                                "private_ip": i.private_ip_address}
+                            for n, i in secondaries.items()},
+        }, indent=2))
+
+
+def run(secondaries=None, deployment=None, apt_cache=None, **kwargs):
+    MongoScaleOut(secondaries=secondaries, deployment=deployment, apt=apt_cache, **kwargs).execute()
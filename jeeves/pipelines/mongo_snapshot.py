@@ -0,0 +1,144 @@
+# jeeves/pipelines/mongo_snapshot.py
+
+"""
+Pipeline: mongo_snapshot
+
+Takes a consistent EBS snapshot of a running deployment's MongoDB data
+volume (fsyncLock → create_snapshot → fsyncUnlock). A new rc_mongo_docker
+environment seeds its data volume from it with MONGO_DATA_SNAPSHOT.
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+import shlex
+from datetime import datetime
+
+from ..pipeline import Pipeline
+from ..aws_helpers import session
+from ..preflight import Preflight
+from ..storage import DATA_DEVICE
+from .. import history, supervisor
+from .mongo_scale_out import SSH_OPTS
+
+
+class MongoSnapshot(Pipeline):
+    pipeline_name        = "MongoDB Data Snapshot"
+    pipeline_description = "Snapshots a deployment's MongoDB data volume for seeding new environments"
+    docs_path            = pathlib.Path(__file__).parents[2] / "docs" / "mongo_snapshot.md"
+
+    def __init__(self, deployment: str | None = None, name: str | None = None,
+                 wait: bool | str = True):
+        self.deployment = deployment or os.environ.get("DEPLOYMENT_NAME")
+        self.name = name
+        self.wait = str(wait).lower() in ("1", "true", "yes")
+
+    def _find_mongo(self, ec2c) -> dict | None:
+        filters = [
+            {"Name": "tag:Name",            "Values": ["jeeves-mongo"]},
+            {"Name": "instance-state-name", "Values": ["running"]},
+        ]
+        if self.deployment:
+            filters.append({"Name": "tag:Deployment", "Values": [self.deployment]})
+        rs = ec2c.describe_instances(Filters=filters)["Reservations"]
+        return rs[0]["Instances"][0] if rs else None
+
+    @staticmethod
+    def _data_volume(data: dict) -> str | None:
+        for bdm in data.get("BlockDeviceMappings", []):
+            if bdm["DeviceName"] == DATA_DEVICE:
+                return bdm["Ebs"]["VolumeId"]
+        return None
+
+    def preflight(self) -> None:
+        pf = Preflight("mongo_snapshot")
+        env = pf.require_env("SSH_KEY_PATH", "MONGO_USERNAME", "MONGO_PASSWORD")
+        if "SSH_KEY_PATH" in env:
+            pf.require_key(env["SSH_KEY_PATH"])
+        pf.require_tools("ssh")
+
+        sess = session()
+        if pf.check_credentials(sess):
+            mongo = self._find_mongo(sess.client("ec2"))
+            if mongo is None:
+                pf.fail("no running 'jeeves-mongo' node found"
+                        + (f" for deployment {self.deployment}" if self.deployment else ""))
+            elif not self._data_volume(mongo):
+                pf.fail(f"{mongo['InstanceId']} keeps its data on the root volume; only a "
+                        "gp3/io2 data volume (MONGO_DATA_VOLUME) can be snapshotted")
+        pf.check()
+
+    def _mongosh(self, host: str, js: str, key_path: pathlib.Path) -> None:
+        env = os.environ
+        cmd = " ".join([
+            "mongosh", "--quiet",
+            "--port", shlex.quote(env.get("MONGO_PORT", "27017")),
+            "-u", shlex.quote(env["MONGO_USERNAME"]),
+            "-p", shlex.quote(env["MONGO_PASSWORD"]),
+            "--authenticationDatabase", "admin",
+            "--eval", shlex.quote(js),
+        ])
+        supervisor.run(
+            ["ssh", *SSH_OPTS, "-i", str(key_path), f"ubuntu@{host}", cmd],
+            check=True, timeout=120, stream=False,
+        )
+
+    def run(self) -> None:
+        key_path = pathlib.Path(os.environ["SSH_KEY_PATH"]).expanduser()
+        sess = session()
+        ec2c = sess.client("ec2")
+
+        mongo = self._find_mongo(ec2c)
+        if mongo is None:
+            raise RuntimeError("No running 'jeeves-mongo' node found")
+        tags = {t["Key"]: t["Value"] for t in mongo.get("Tags", [])}
+        deployment = self.deployment or tags.get("Deployment", "")
+        volume_id = self._data_volume(mongo)
+        if not volume_id:
+            raise RuntimeError(f"{mongo['InstanceId']} has no dedicated MongoDB data volume")
+        name = self.name or datetime.utcnow().strftime(f"jeeves-mongo-{deployment or 'data'}-%Y%m%d%H%M%S")
+        host = mongo["PublicIpAddress"]
+        print(f"MongoDB {mongo['InstanceId']} @ {host}, data volume {volume_id}")
+
+        history.step("snapshot")
+        # 1) Flush and block writes so the volume is consistent at the snapshot's
+        #    point in time. That point is fixed when create_snapshot returns, so
+        #    writes resume long before the snapshot completes.
+        print("→ fsyncLock…", flush=True)
+        self._mongosh(host, "db.fsyncLock()", key_path)
+        try:
+            snap = ec2c.create_snapshot(
+                VolumeId=volume_id,
+                Description=f"Jeeves MongoDB data of {deployment or mongo['InstanceId']}",
+                TagSpecifications=[{
+                    "ResourceType": "snapshot",
+                    "Tags": [
+                        {"Key": "Name",       "Value": name},
+                        {"Key": "Project",    "Value": "jeeves"},
+                        {"Key": "Role",       "Value": "mongo-data"},
+                        {"Key": "Deployment", "Value": deployment},
+                    ],
+                }],
+            )
+        finally:
+            self._mongosh(host, "db.fsyncUnlock()", key_path)
+            print("✔ fsyncUnlock", flush=True)
+        snap_id = snap["SnapshotId"]
+        print(f"✔ Snapshot {snap_id} ('{name}') started from {volume_id} ({snap['VolumeSize']} GiB)")
+
+        history.step("wait")
+        # 2) Optionally wait for the copy to S3 to finish
+        if self.wait:
+            print("→ Waiting for the snapshot to complete…", flush=True)
+            ec2c.get_waiter("snapshot_completed").wait(
+                SnapshotIds=[snap_id], WaiterConfig={"Delay": 30, "MaxAttempts": 240}
+            )
+            print(f"✔ Snapshot {snap_id} completed")
+
+        print(f"\nSeed a new environment from it with:\n"
+              f"  MONGO_DATA_VOLUME=gp3 MONGO_DATA_SNAPSHOT={name} jeeves pipelines run rc_mongo_docker")
+
+
+def run(deployment=None, name=None, wait=True, **kwargs):
+    MongoSnapshot(deployment=deployment, name=name, wait=wait).execute()
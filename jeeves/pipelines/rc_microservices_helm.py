@@ -9,31 +9,37 @@ import shutil
 import subprocess
 import time
 import pathlib
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 from ..pipeline import Pipeline
 from ..aws_helpers import session, latest_ubuntu_ami
 from ..config import settings
+from .. import acme_store, apt_cache, fleet, history, mongo_url, registry_mirror, sizing, supervisor
+from ..fleet import wait_for_ssh
+from ..kube import KubeAPI, label_objects, wait_for_apiserver, patch_kubeconfig_server
+from ..manifests import applied_object_paths
+from ..ssh_tunnel import SSHTunnel
+from ..journal import Journal
+from ..preflight import Preflight
+from .verify import post_deploy
 from datetime import datetime
 
+# Upper bound for one `terraform apply`; its process group is killed after this
+TERRAFORM_TIMEOUT = int(os.environ.get("TERRAFORM_TIMEOUT", 3600))
 
-def wait_for_ssh(host: str, key_path: pathlib.Path, user: str = "ubuntu", timeout: int = 300):
+
+def write_tfvars(path: pathlib.Path, tfvars: dict) -> None:
     """
-    Wait until 'ssh -i key_path user@host true' succeeds, or timeout.
+    Render `tfvars` as a terraform.tfvars file.
     """
-    deadline = time.time() + timeout
-    while time.time() < deadline:
-        res = subprocess.run([
-            "ssh",
-            "-o", "StrictHostKeyChecking=no",
-            "-o", "BatchMode=yes",
-            "-i", str(key_path),
-            f"{user}@{host}",
-            "true",
-        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        if res.returncode == 0:
-            return
-        time.sleep(5)
-    raise TimeoutError(f"SSH to {user}@{host} with key {key_path} timed out")
+    with open(path, "w") as f:
+        for k, v in tfvars.items():
+            if isinstance(v, bool):
+                # write booleans unquoted, lowercase
+                f.write(f"{k} = {str(v).lower()}\n")
+            else:
+                f.write(f'{k} = "{v}"\n')
+
 
 class K8sDeploymentHelm(Pipeline):
     pipeline_name        = "Rocket.Chat Microservices Deployment with Helm Charts "
@@ -41,28 +47,107 @@ class K8sDeploymentHelm(Pipeline):
     docs_path            = pathlib.Path(__file__).parents[2] / "docs" / "rc_microservices_helm.md"
     """
     1. Import SSH keypair into AWS (if missing)
-    2. Provision Mongo master, MicroK8s controller & worker EC2 nodes
+    2. Provision Mongo master, MicroK8s controller & worker EC2 nodes, plus
+       optional extra workers (--workers N) and Mongo read replicas
+       (--mongo-replicas N), launched in one batch per role
     3. Copy SSH key into ps-auto-infra/
     4. Write terraform.tfvars with their IPs + all settings (including instance types)
     5. Wait for SSH on worker & re-install public key
     6. terraform init & apply ps-auto-infra
     7. Post-apply: wait for SSH & re-install public key again
+
+    Completed steps are journaled under ~/.jeeves/deployments/<deployment>/;
+    with --resume true a failed run re-validates them and carries on from
+    the first incomplete step.
+
+    With users / CONCURRENT_USERS the instance types, worker and read-replica
+    counts and the MongoDB data volume come from the sizing planner
+    (jeeves/sizing.py).
+
+    With mirror / REGISTRY_MIRROR, MicroK8s' containerd pulls through an
+    in-VPC registry mirror (jeeves/registry_mirror.py).
+
+    With apt / APT_CACHE, jeeves-mongo-master runs an APT cache
+    (jeeves/apt_cache.py) and every other node installs through it.
+
+    With ACME_STORE and ACME_HOST_PATH (where Traefik's hostPath volume keeps
+    acme.json on the controller), the certificate for DOMAIN is restored
+    there before Traefik is installed and saved after the deploy
+    (jeeves/acme_store.py).
     """
 
+    MAX_WORKERS        = 5
+    MAX_MONGO_REPLICAS = 4
+
+    def __init__(self, workers: int | str | None = None, mongo_replicas: int | str | None = None,
+                 resume: bool | str = False, users: int | str | None = None,
+                 mirror: str | None = None, apt: str | None = None):
+        env = os.environ
+        self.resume = str(resume).lower() in ("1", "true", "yes")
+        self.mirror = registry_mirror.mode(mirror)
+        self.apt    = apt_cache.mode(apt)
+        self.plan = sizing.plan(int(users)) if users else sizing.plan_from_env()
+        self.workers        = int(workers if workers is not None else self.plan.workers or 1)
+        self.mongo_replicas = int(mongo_replicas if mongo_replicas is not None else self.plan.mongo_replicas or 0)
+        # Without a sizing tier or MONGO_INSTANCE_TYPE, Mongo nodes keep the K8s node type
+        self.k8s_instance_type   = self.plan.k8s_type
+        self.mongo_instance_type = (self.plan.mongo_type if self.plan.tier or env.get("MONGO_INSTANCE_TYPE")
+                                    else self.k8s_instance_type)
+        if not 1 <= self.workers <= self.MAX_WORKERS:
+            raise ValueError(f"--workers must be between 1 and {self.MAX_WORKERS}")
+        if not 0 <= self.mongo_replicas <= self.MAX_MONGO_REPLICAS:
+            raise ValueError(f"--mongo-replicas must be between 0 and {self.MAX_MONGO_REPLICAS}")
+
+    def history_params(self) -> dict:
+        params = super().history_params()
+        params.pop("resume")        # a resumed run deploys the same thing
+        params.update(tier=self.plan.tier, users=self.plan.users)
+        return params
+
+    def preflight(self) -> None:
+        env = os.environ
+        pf = Preflight("rc_microservices_helm")
+        keys = pf.require_env("SSH_KEY_NAME", "SSH_KEY_PATH", "SSH_PUBLIC_KEY_PATH", "DOMAIN")
+        # the key's mode is fixed up in step 5.9, so only its presence matters here
+        pf.require_files(*(keys[k] for k in ("SSH_KEY_PATH", "SSH_PUBLIC_KEY_PATH") if k in keys))
+        pf.require_files(pathlib.Path(__file__).parents[2] / "ps-auto-infra",
+                         pathlib.Path(__file__).parents[2] / "scripts" / "mount_data_volume.sh")
+        if self.mirror == "node":
+            pf.require_files(registry_mirror.SCRIPTS_DIR / "registry_mirror_bootstrap.sh")
+        if self.apt:
+            pf.require_files(apt_cache.SCRIPT)
+        pf.require_tools("ssh", "terraform")
+        if self.resume and not env.get("DEPLOYMENT_NAME") and not Journal.latest("rc_microservices_helm"):
+            pf.fail("--resume given but no unfinished rc_microservices_helm journal exists")
+
+        storage = self.plan.storage()
+        storage.mount_point = "/var/lib/mongodb"
+        storage.snapshot = None
+        sess = session()
+        if pf.check_credentials(sess):
+            ec2c = sess.client("ec2")
+            pf.check_instance_types(ec2c, [self.k8s_instance_type, self.mongo_instance_type]
+                                    + ([registry_mirror.instance_type()] if self.mirror == "node" else []))
+            pf.run("storage profile", storage.validate, ec2c, self.mongo_instance_type)
+            pf.run("ACME certificate store", acme_store.check, sess)
+            if "DOMAIN" in keys:
+                pf.check_hosted_zone(sess, settings.domain.strip())
+        pf.check()
+
     def run(self) -> None:
         env          = os.environ
         deployment_name = env.get("DEPLOYMENT_NAME")
-        if not deployment_name:
-            deployment_name = datetime.utcnow().strftime("deploy-%Y%m%d%H%M%S")
-        print(f"▶ Deployment name: {deployment_name}")
         ssh_key_name = env["SSH_KEY_NAME"]            # e.g. "ps-lab"
         ssh_key_path = pathlib.Path(env["SSH_KEY_PATH"]).expanduser()
         pubkey_path  = pathlib.Path(env["SSH_PUBLIC_KEY_PATH"]).expanduser()
         tf_dir       = pathlib.Path(__file__).parents[2] / "ps-auto-infra"
         tfvars_path  = tf_dir / "terraform.tfvars"
 
-        # derive the K8s instance type (controller+worker) from .env, else default
-        k8s_instance_type = env.get("KUBERNETES_INSTANCE_TYPE", settings.default_instance_type)
+        # instance types per role from the sizing plan (KUBERNETES_INSTANCE_TYPE etc. win)
+        k8s_instance_type   = self.k8s_instance_type
+        mongo_instance_type = self.mongo_instance_type
+        print(f"▶ Sizing: {self.plan.describe()}; K8s nodes {k8s_instance_type}, "
+              f"MongoDB {mongo_instance_type}")
 
         # ———————————
         # 1) AWS & KeyPair import
@@ -85,6 +170,34 @@ class K8sDeploymentHelm(Pipeline):
             else:
                 raise
 
+        # Mongo data volume: validate against the instance type before launching.
+        # Terraform installs mongod with its default dbPath, so mount there.
+        storage = self.plan.storage()
+        if storage.mount_point != "/var/lib/mongodb":
+            print(f"⚠️  MONGO_DBPATH={storage.mount_point} is ignored here; mounting at /var/lib/mongodb")
+            storage.mount_point = "/var/lib/mongodb"
+        if storage.seeded:
+            # every Mongo node would get the same seeded volume and a stale replica-set config
+            print("⚠️  MONGO_DATA_SNAPSHOT is ignored here; seeding is supported by rc_mongo_docker only")
+            storage.snapshot = None
+        storage.validate(ec2c, mongo_instance_type)
+        print(f"✔ MongoDB storage: {storage.describe()}")
+
+        # Step journal: a fresh run starts a new one, --resume picks up the last
+        if not (deployment_name or self.resume):
+            deployment_name = datetime.utcnow().strftime("deploy-%Y%m%d%H%M%S")
+        journal = Journal.open("rc_microservices_helm", deployment_name, {
+            "workers":        self.workers,
+            "mongo_replicas": self.mongo_replicas,
+            "instance_type":  k8s_instance_type,
+            "mongo_instance_type": mongo_instance_type,
+            "storage":        storage.describe(),
+        }, resume=self.resume)
+        deployment_name = journal.deployment
+        print(f"▶ Deployment name: {deployment_name}")
+        self.plan.save(deployment_name)
+
+        history.step("network")
         # ———————————
         # 2) VPC & Subnet
         # ———————————
@@ -178,39 +291,78 @@ class K8sDeploymentHelm(Pipeline):
                 if e.response["Error"]["Code"] != "InvalidPermission.Duplicate":
                     raise
 
+        # e) Mongo replication between replica-set members
+        if self.mongo_replicas:
+            try:
+                ec2c.authorize_security_group_ingress(
+                    GroupId=mongo_sg,
+                    IpPermissions=[{
+                        "IpProtocol":"tcp","FromPort":27017,"ToPort":27017,
+                        "UserIdGroupPairs":[{"GroupId":mongo_sg}],
+                    }]
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "InvalidPermission.Duplicate":
+                    raise
+
+        # f) APT cache on jeeves-mongo-master for every node
+        if self.apt == "node":
+            apt_cache.allow(ec2c, mongo_sg, [controller_sg, worker_sg, mongo_sg])
+
+        # The registry mirror comes up while the nodes launch and Terraform installs MicroK8s
+        mirror_job = None
+        if self.mirror == "node":
+            print("Starting the registry mirror in the background…")
+            executor = ThreadPoolExecutor(max_workers=1)
+            mirror_job = executor.submit(
+                registry_mirror.ensure_node, sess.resource("ec2"), sess.client("ec2"),
+                vpc_id, subnet_id, ssh_key_name, ssh_key_path, registry_mirror.preseed_images(),
+            )
+            executor.shutdown(wait=False)
+
         # ———————————
         # 4) Provision helper
         # ———————————
-        def provision(tag: str, sg_id: str):
+        # Launches (or starts) every node of a role with a single API call
+        # and returns without waiting; all nodes are awaited together below.
+        def provision(tags: list[str], sg_id: str, role: str, extra_devices: list[dict] = (),
+                      instance_type: str = k8s_instance_type) -> dict:
             rs = ec2c.describe_instances(
                 Filters=[
-                    {"Name":"tag:Name","Values":[tag]},
+                    {"Name":"tag:Name","Values":tags},
                     {"Name":"instance-state-name","Values":["pending","running","stopped"]},
                 ]
             )["Reservations"]
-            inst = None
-            if rs:
-                data = rs[0]["Instances"][0]
-                key  = data.get("KeyName")
-                if key != ssh_key_name:
-                    # stale-key → terminate & recreate
-                    stale = data["InstanceId"]
-                    print(f"Terminating stale {tag} {stale} (KeyName={key})")
-                    ec2c.terminate_instances(InstanceIds=[stale])
-                    ec2c.get_waiter("instance_terminated").wait(InstanceIds=[stale])
-                else:
+            found = {}
+            stale = []
+            for r in rs:
+                for data in r["Instances"]:
+                    tag = next(t["Value"] for t in data["Tags"] if t["Key"] == "Name")
+                    key = data.get("KeyName")
+                    if tag in found:
+                        continue
+                    if key != ssh_key_name:
+                        # stale-key → terminate & recreate
+                        print(f"Terminating stale {tag} {data['InstanceId']} (KeyName={key})")
+                        stale.append(data["InstanceId"])
+                        continue
                     inst = ec2.Instance(data["InstanceId"])
-                    state = inst.state["Name"]
+                    state = data["State"]["Name"]
                     print(f"Reusing {tag} {inst.id} ({state})")
                     if state == "stopped":
-                        inst.start(); inst.wait_until_running(); inst.reload()
-
-            if not inst:
+                        inst.start()
+                    found[tag] = inst
+            if stale:
+                ec2c.terminate_instances(InstanceIds=stale)
+                ec2c.get_waiter("instance_terminated").wait(InstanceIds=stale)
+
+            missing = [t for t in tags if t not in found]
+            if missing:
                 ami = latest_ubuntu_ami(ec2c, settings.default_os_version)
-                inst = ec2.create_instances(
+                launched = ec2.create_instances(
                     ImageId=ami,
-                    InstanceType=k8s_instance_type,
-                    MinCount=1, MaxCount=1,
+                    InstanceType=instance_type,
+                    MinCount=len(missing), MaxCount=len(missing),
                     KeyName=ssh_key_name,
                     NetworkInterfaces=[{
                         "SubnetId":subnet_id,
@@ -226,34 +378,66 @@ class K8sDeploymentHelm(Pipeline):
                             "VolumeType": "gp3",
                             "DeleteOnTermination": True,
                         },
-                    }],
+                    }, *extra_devices],
                     TagSpecifications=[{
                         "ResourceType":"instance",
                         "Tags":[
-                            {"Key":"Name",       "Value":tag},
+                            {"Key":"Name",       "Value":missing[0]},
                             {"Key":"Project",    "Value":"jeeves"},
-                            {"Key":"Role",       "Value":tag},
+                            {"Key":"Role",       "Value":role},
                             {"Key":"Deployment", "Value":deployment_name},
                         ],
                     }],
                     UserData="#!/usr/bin/env bash\nexit 0\n",
-                )[0]
-                print(f"Launched {tag} {inst.id} with InstanceType={k8s_instance_type} and 50 GB root disk")
-                inst.wait_until_running(); inst.reload()
-
-            return inst, inst.public_ip_address, inst.private_ip_address
-
+                )
+                for tag, inst in zip(missing, launched):
+                    if tag != missing[0]:
+                        ec2c.create_tags(Resources=[inst.id], Tags=[{"Key":"Name","Value":tag}])
+                    found[tag] = inst
+                    print(f"Launched {tag} {inst.id} with InstanceType={instance_type} and 50 GB root disk")
+            return found
+
+        history.step("provision")
         # ———————————
-        # 5) Provision each node
+        # 5) Provision each node (one batched launch per role, one shared wait)
         # ———————————
-        mongo_i,  mongo_pub,  mongo_pri  = provision("jeeves-mongo-master",     mongo_sg)
-        ctrl_i,   ctrl_pub,   ctrl_pri   = provision("jeeves-k8s-controller",  controller_sg)
-        worker_i, worker_pub, worker_pri = provision("jeeves-k8s-worker",      worker_sg)
+        worker_tags  = ["jeeves-k8s-worker"] + [f"jeeves-k8s-worker{i}" for i in range(2, self.workers + 1)]
+        replica_tags = [f"jeeves-mongo-read-replica{i}" for i in range(1, self.mongo_replicas + 1)]
+
+        nodes = self.restore_nodes(ec2, journal) if journal.done("provision") else None
+        if nodes is None:
+            journal.invalidate("provision")
+            nodes = {}
+            mongo_devices = storage.block_device_mappings()
+            nodes.update(provision(["jeeves-mongo-master"],   mongo_sg,      "jeeves-mongo-master", mongo_devices,
+                                   mongo_instance_type))
+            nodes.update(provision(["jeeves-k8s-controller"], controller_sg, "jeeves-k8s-controller"))
+            nodes.update(provision(worker_tags,               worker_sg,     "jeeves-k8s-worker"))
+            if replica_tags:
+                nodes.update(provision(replica_tags,          mongo_sg,      "jeeves-mongo-read-replica", mongo_devices,
+                                       mongo_instance_type))
+
+            print(f"⏳ Waiting for {len(nodes)} instance(s) to reach 'running'…")
+            ec2c.get_waiter("instance_running").wait(InstanceIds=[i.id for i in nodes.values()])
+            for inst in nodes.values():
+                inst.reload()
+
+            journal.record("provision", nodes={
+                tag: {"id": i.id, "public_ip": i.public_ip_address, "private_ip": i.private_ip_address}
+                for tag, i in nodes.items()
+            })
+
+        def addrs(tag: str):
+            inst = nodes[tag]
+            return inst, inst.public_ip_address, inst.private_ip_address
+
+        mongo_i,  mongo_pub,  mongo_pri  = addrs("jeeves-mongo-master")
+        ctrl_i,   ctrl_pub,   ctrl_pri   = addrs("jeeves-k8s-controller")
+        worker_i, worker_pub, worker_pri = addrs("jeeves-k8s-worker")
 
         print(json.dumps({
-            "mongo":      {"id":mongo_i.id,  "public":mongo_pub,  "private":mongo_pri},
-            "controller":{"id":ctrl_i.id,   "public":ctrl_pub,   "private":ctrl_pri},
-            "worker":    {"id":worker_i.id, "public":worker_pub, "private":worker_pri},
+            tag: {"id": i.id, "public": i.public_ip_address, "private": i.private_ip_address}
+            for tag, i in nodes.items()
         }, indent=2))
 
         ssh_key_path = pathlib.Path(env["SSH_KEY_PATH"]).expanduser()
@@ -289,8 +473,24 @@ class K8sDeploymentHelm(Pipeline):
         # 7) Write terraform.tfvars
         # ———————————
         # Parse WORKERHA/MONGOHA into real bools (default to False)
-        workerha_val = env.get("WORKERHA", "false").lower() in ("1", "true", "yes")
-        mongoha_val  = env.get("MONGOHA",  "false").lower() in ("1", "true", "yes")
+        workerha_val = env.get("WORKERHA", "false").lower() in ("1", "true", "yes") or self.workers > 1
+        mongoha_val  = env.get("MONGOHA",  "false").lower() in ("1", "true", "yes") or self.mongo_replicas > 0
+
+        # Rocket.Chat pods are scaled by the chart from concurrent_users
+        mongo_hosts = [f"{mongo_pri}:27017"] + [
+            f"{nodes[t].private_ip_address}:27017" for t in replica_tags if t in nodes]
+        urls = mongo_url.build(
+            env.get("MONGO_USERNAME", ""), env.get("MONGO_PASSWORD", ""), mongo_hosts,
+            env.get("REPLSET_NAME", "rs0"),
+            self.plan.rc_replicas or mongo_url.processes_for_users(
+                self.plan.users or env.get("CONCURRENT_USERS")),
+            db=env.get("MONGO_URL_DB", "rocketchat"),
+        )
+        print(f"Rocket.Chat → MongoDB: {urls.describe()}")
+
+        def slot(tag: str, attr: str) -> str:
+            # unused worker / read-replica slots stay empty
+            return getattr(nodes[tag], attr) if tag in nodes else ""
 
         tfvars = {
             "ssh_key_path":               str(key_dest.resolve()),
@@ -298,14 +498,14 @@ class K8sDeploymentHelm(Pipeline):
             "mongo_master_private_ip":    mongo_pri,
             "mongo_master_ssh_key_name":  ssh_key_name,
             "worker_ssh_key_path":        key_dest.name,
-            **{f"mongo_read_replica{i}_ip":         "" for i in range(1, 5)},
-            **{f"mongo_read_replica{i}_private_ip": "" for i in range(1, 5)},
+            **{f"mongo_read_replica{i}_ip":         slot(f"jeeves-mongo-read-replica{i}", "public_ip_address")  for i in range(1, 5)},
+            **{f"mongo_read_replica{i}_private_ip": slot(f"jeeves-mongo-read-replica{i}", "private_ip_address") for i in range(1, 5)},
             "controller_ip":              ctrl_pub,
             "controller_private_ip":      ctrl_pri,
             "worker_ip":                  worker_pub,
             "worker_private_ip":          worker_pri,
-            **{f"worker{i}_ip":               "" for i in range(2, 6)},
-            **{f"worker{i}_private_ip":       "" for i in range(2, 6)},
+            **{f"worker{i}_ip":               slot(f"jeeves-k8s-worker{i}", "public_ip_address")  for i in range(2, 6)},
+            **{f"worker{i}_private_ip":       slot(f"jeeves-k8s-worker{i}", "private_ip_address") for i in range(2, 6)},
             "mongo_username":             env.get("MONGO_USERNAME", ""),
             "mongo_password":             env.get("MONGO_PASSWORD", ""),
             "mongodb_service_db":         env.get("MONGODB_SERVICE_DB", ""),
@@ -314,8 +514,10 @@ class K8sDeploymentHelm(Pipeline):
             "kube_config_context":        env.get("KUBE_CONFIG_CONTEXT", "microk8s"),
             "namespace":                  env.get("NAMESPACE", "psautoinfra"),
             "mongo_url_db":               env.get("MONGO_URL_DB", "rocketchat"),
+            "mongo_url":                  urls.url,
+            "mongo_oplog_url":            urls.oplog_url,
             "worker_key_name":            env.get("WORKER_KEY_NAME", ""),
-            "concurrent_users":           env.get("CONCURRENT_USERS", 1),
+            "concurrent_users":           self.plan.users or env.get("CONCURRENT_USERS", 1),
             "controller_node_name":       env.get("CONTROLLER_NODE_NAME", ""),
             "workerha":                   workerha_val,
             "mongoha":                    mongoha_val,
@@ -326,21 +528,14 @@ class K8sDeploymentHelm(Pipeline):
             "acme_email":                 env.get("ACME_EMAIL", ""),
         }
 
-        with open(tfvars_path, "w") as f:
-            for k, v in tfvars.items():
-                if isinstance(v, bool):
-                    # write booleans unquoted, lowercase
-                    f.write(f"{k} = {str(v).lower()}\n")
-                else:
-                    f.write(f'{k} = "{v}"\n')
-
+        write_tfvars(tfvars_path, tfvars)
         print(f"Wrote terraform.tfvars to {tfvars_path}")
 
+        history.step("ssh_ready")
         # ———————————
         # 8) Pre-apply: ensure SSH is up then re-install public key
         # ———————————
-        print("🔑 Waiting for SSH on worker (pre-apply)…")
-        wait_for_ssh(worker_pub, ssh_key_path)
+        worker_hosts = {tag: nodes[tag].public_ip_address for tag in worker_tags}
         pubkey = pubkey_path.read_text().strip()
         install_cmd = "\n".join([
             "mkdir -p ~/.ssh",
@@ -350,61 +545,69 @@ class K8sDeploymentHelm(Pipeline):
             "EOF",
             "chmod 600 ~/.ssh/authorized_keys",
         ])
-        subprocess.run([
-            "ssh", "-o", "StrictHostKeyChecking=no",
-            "-i", str(ssh_key_path),
-            f"ubuntu@{worker_pub}",
-            install_cmd
-        ], check=True)
-        print("✔ Public key re-installed on worker (pre-apply)")
+        if journal.done("nodes_ready"):
+            print("⏭  SSH keys and Mongo data volumes already in place (journal)")
+        else:
+            print(f"🔑 Waiting for SSH on {len(worker_hosts)} worker(s) (pre-apply)…")
+            for host in worker_hosts.values():
+                wait_for_ssh(host, ssh_key_path)
+            fleet.check(fleet.run_on_hosts(worker_hosts, install_cmd, ssh_key_path),
+                        "authorized_keys install")
+            print("✔ Public key re-installed on worker(s) (pre-apply)")
+
+            # ———————————
+            # 8.0) Mount the Mongo data volume before Terraform installs mongod
+            # ———————————
+            if storage.dedicated:
+                mongo_tags = ["jeeves-mongo-master"] + replica_tags
+                mount_script = pathlib.Path(__file__).parents[2] / "scripts" / "mount_data_volume.sh"
+                for tag in mongo_tags:
+                    if storage.kind in ("gp3", "io2") and not storage.data_volume_id(nodes[tag]):
+                        raise RuntimeError(
+                            f"Existing {tag} {nodes[tag].id} has no {storage.kind} data volume; "
+                            "destroy it first or set MONGO_DATA_VOLUME=root"
+                        )
+                    wait_for_ssh(nodes[tag].public_ip_address, ssh_key_path)
+                print(f"💾 Mounting {storage.describe()} on {len(mongo_tags)} Mongo node(s)…")
+                fleet.check(
+                    fleet.run_on_hosts(
+                        {tag: nodes[tag].public_ip_address for tag in mongo_tags}, "sudo bash -s", ssh_key_path,
+                        input={tag: storage.mount_env(nodes[tag]) + mount_script.read_text() for tag in mongo_tags},
+                        timeout=600,
+                    ),
+                    "Mongo data volume mount",
+                )
 
-        # ———————————
-        # 8.1) Establish SSH tunnel for Kubernetes API
-        # ———————————
-        # Configuration
-        ssh_key_path = ssh_key_path
-        controller_pub = ctrl_pub
-        local_port = 16443
-
-        def tunnel_exists(port):
-            """Check if any process is listening on the given local port."""
-            result = subprocess.run(
-                ["lsof", f"-iTCP:{port}", "-sTCP:LISTEN", "-t"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.DEVNULL
-            )
-            return result.returncode == 0
-
-        def kill_existing_tunnel(port):
-            """Kill any existing listener on the given port (use with caution)."""
-            subprocess.run(
-                f"lsof -tiTCP:{port} | xargs -r kill -9",
-                shell=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-        print(f"🔌 Preparing to start SSH tunnel for K8s API (localhost:{local_port})…")
-        if tunnel_exists(local_port):
-            print(f"⚠️  Tunnel already exists on localhost:{local_port}, skipping setup.")
+            # ———————————
+            # 8.0.1) Point apt at the cache before Terraform installs packages
+            # ———————————
+            if self.apt:
+                apt_url = self.apt
+                if self.apt == "node":
+                    wait_for_ssh(mongo_pub, ssh_key_path)
+                    fleet.check([fleet.run_on_host(mongo_pub, "sudo bash -s", ssh_key_path, timeout=600,
+                                                   input=apt_cache.prefix(serve=True),
+                                                   label="jeeves-mongo-master")],
+                                "APT cache")
+                    apt_url = apt_cache.url_for(mongo_pri)
+                clients = {tag: i.public_ip_address for tag, i in nodes.items()
+                           if not (self.apt == "node" and tag == "jeeves-mongo-master")}
+                for host in clients.values():
+                    wait_for_ssh(host, ssh_key_path)
+                fleet.check(
+                    fleet.run_on_hosts(clients, "sudo bash -s", ssh_key_path,
+                                       input=apt_cache.prefix(apt_url), timeout=600),
+                    "APT cache configuration",
+                )
+                print(f"✔ {len(clients)} node(s) install packages through the APT cache at {apt_url}")
+
+            journal.record("nodes_ready")
+
+        history.step("dns")
+        if journal.done("dns") and journal.outputs("dns").get("ip") == ctrl_pub:
+            print(f"⏭  Route 53 already points {settings.domain.strip()} at {ctrl_pub} (journal)")
         else:
-            print(f"🔧 No tunnel found. Cleaning up stale listeners and opening new SSH tunnel to {controller_pub}…")
-            kill_existing_tunnel(local_port)  # optional: if stale tunnels might exist
-            try:
-                subprocess.run([
-                    "ssh",
-                    "-o", "StrictHostKeyChecking=no",
-                    "-i", ssh_key_path,
-                    "-fN",  # go to background, no remote command
-                    "-L", f"{local_port}:127.0.0.1:{local_port}",
-                    f"ubuntu@{controller_pub}"
-                ], check=True)
-                print(f"✅ SSH tunnel established on localhost:{local_port} → {controller_pub}")
-            except subprocess.CalledProcessError:
-                print("❌ Failed to establish SSH tunnel. Continuing anyway — controller may not be up yet.")
-            # Give some time before anything depends on it
-            time.sleep(5)
-
-         # 11) Update Route53 A record
+            # 8.1) Update Route53 A record
             print("🔑 Updating Route 53 A record…")
             domain = settings.domain.strip()
             if "." not in domain:
@@ -437,144 +640,224 @@ class K8sDeploymentHelm(Pipeline):
             info = resp.get("ChangeInfo",{})
             print(f"Route53 change: ID={info.get('Id')} Status={info.get('Status')}")
 
+            journal.record("dns", domain=domain, ip=ctrl_pub)
+
+        history.step("terraform_infra")
         # ———————————
         # 9) Run Terraform (infra + k8s install, then full apply)
         # ———————————
         os.environ["KUBE_INSECURE_SKIP_TLS_VERIFY"] = "true"
         print("📦 Running Terraform (infra stage only)...")
-        subprocess.run(["terraform", "init"], cwd=str(tf_dir), check=True)
-
-        # Stage 1: Infra + MicroK8s installation (no K8s resources yet)
-        infra_targets = [
-            "aws_instance.jeeves-mongo-master",
-            "aws_instance.jeeves-k8s-controller",
-            "aws_instance.jeeves-k8s-worker",
-            "module.rocketchat.null_resource.check_existing_pvs",
-            "null_resource.microk8s_install",  # <—— this must install MicroK8s!
-            # anything else that sets up the controller
-        ]
-        infra_cmd = [
-            "terraform", "apply", "-auto-approve", f"-var-file={tfvars_path.name}"
-        ] + sum([["-target", t] for t in infra_targets], [])
-
-        max_attempts = 2
-        for attempt in range(1, max_attempts + 1):
-            try:
-                subprocess.run(infra_cmd, cwd=str(tf_dir), check=True)
-                print("✅ Infra-only Terraform apply succeeded.")
-                break
-            except subprocess.CalledProcessError:
-                if attempt == max_attempts:
-                    print("❌ Infra apply failed after retries.")
-                    raise
-                print(f"⚠️ Infra apply failed on attempt {attempt}, retrying in 20 seconds…")
-                time.sleep(20)
-
-        # 🕒 Wait for MicroK8s install to complete on controller
-        print("🕒 Giving MicroK8s 10s to settle before fetching kubeconfig…")
-        time.sleep(10)
-
-        # 🧾 Fetch MicroK8s kubeconfig from controller
-        print("📥 Fetching MicroK8s kubeconfig from controller...")
-        remote_cmd = "microk8s config"
-        result = subprocess.run([
-            "ssh", "-o", "StrictHostKeyChecking=no", "-i", str(ssh_key_path),
-            f"ubuntu@{ctrl_pub}", remote_cmd
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-        if result.returncode != 0:
-            raise RuntimeError(f"❌ Failed to fetch kubeconfig:\n{result.stderr}")
+        supervisor.run(["terraform", "init"], cwd=str(tf_dir), check=True, timeout=600)
 
+        if journal.done("terraform_infra"):
+            print("⏭  Infra-only Terraform apply already done (journal)")
+        else:
+            # Stage 1: Infra + MicroK8s installation (no K8s resources yet)
+            infra_targets = [
+                "aws_instance.jeeves-mongo-master",
+                "aws_instance.jeeves-k8s-controller",
+                "aws_instance.jeeves-k8s-worker",
+                "module.rocketchat.null_resource.check_existing_pvs",
+                "null_resource.microk8s_install",  # <—— this must install MicroK8s!
+                # anything else that sets up the controller
+            ]
+            infra_cmd = [
+                "terraform", "apply", "-auto-approve", f"-var-file={tfvars_path.name}"
+            ] + sum([["-target", t] for t in infra_targets], [])
+
+            max_attempts = 2
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    supervisor.run(infra_cmd, cwd=str(tf_dir), check=True, timeout=TERRAFORM_TIMEOUT)
+                    print("✅ Infra-only Terraform apply succeeded.")
+                    break
+                except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+                    if attempt == max_attempts:
+                        print("❌ Infra apply failed after retries.")
+                        raise
+                    print(f"⚠️ Infra apply failed on attempt {attempt}, retrying in 20 seconds…")
+                    time.sleep(20)
+
+            journal.record("terraform_infra")
+
+        history.step("kubeconfig")
+        # 🧾 Fetch MicroK8s kubeconfig from controller (retry while MicroK8s settles)
         kubeconfig_path = tf_dir / "microk8s.config"
-        with open(kubeconfig_path, "w") as f:
-            f.write(result.stdout)
-        print(f"✅ Wrote kubeconfig to {kubeconfig_path}")
+        if journal.done("kubeconfig") and kubeconfig_path.exists():
+            print(f"⏭  Reusing kubeconfig {kubeconfig_path} (journal)")
+        else:
+            journal.invalidate("kubeconfig")
+            print("📥 Fetching MicroK8s kubeconfig from controller...")
+            remote_cmd = "microk8s config"
+            delay, deadline = 0.5, time.time() + 120
+            while True:
+                result = supervisor.run([
+                    "ssh", "-o", "StrictHostKeyChecking=no", "-o", "LogLevel=ERROR",
+                    "-i", str(ssh_key_path), f"ubuntu@{ctrl_pub}", remote_cmd
+                ], timeout=30, stream=False)
+                if result.ok:
+                    break
+                if time.time() + delay > deadline:
+                    raise RuntimeError(f"❌ Failed to fetch kubeconfig:\n{result.output}")
+                time.sleep(delay)
+                delay = min(delay * 2, 10)
+
+            with open(kubeconfig_path, "w") as f:
+                f.write(result.output)
+            print(f"✅ Wrote kubeconfig to {kubeconfig_path}")
+            journal.record("kubeconfig", kubeconfig_path=str(kubeconfig_path.resolve()))
         tfvars["kube_config_path"] = str(kubeconfig_path.resolve())
 
+        history.step("tunnel")
+        # ———————————
+        # 9.1) Establish SSH tunnel for Kubernetes API
+        # ———————————
+        # One in-process tunnel serves Terraform, kubectl and helm for the
+        # rest of the run; it reconnects on its own if the SSH session drops.
+        # start() returns once the apiserver port answers through it.
+        print(f"🔌 Opening SSH tunnel for K8s API via {ctrl_pub}…")
+        tunnel = SSHTunnel(ctrl_pub, ssh_key_path, remote_port=16443, local_port=16443).start(timeout=300)
+        api_server = f"https://127.0.0.1:{tunnel.local_port}"
+
         # ----------------------------------------
-        # PATCH kubeconfig to use localhost for SSH tunnel
+        # PATCH kubeconfig to use the local end of the SSH tunnel
         # ----------------------------------------
-        kubeconfig_path = tf_dir / "microk8s.config"
-        controller_private_ip = ctrl_pri  # already available earlier
-
-        print("🩹 Patching microk8s.config to use localhost (for SSH tunnel)...")
-        with open(kubeconfig_path, "r+") as f:
-            content = f.read()
-            before_patch = f"https://{controller_private_ip}:16443"
-            after_patch = "https://127.0.0.1:16443"
-            if before_patch in content:
-                print(f"🔁 Replacing '{before_patch}' → '{after_patch}'")
-                content = content.replace(before_patch, after_patch)
-                f.seek(0)
-                f.write(content)
-                f.truncate()
-                print("✅ microk8s.config patched for local access")
-            else:
-                print("✅ No need to patch, already pointing to localhost")
-
-
-
-        # Run just the MicroK8s wait resource
-        subprocess.run([
-            "terraform", "apply", "-auto-approve",
-            "-target=null_resource.wait_for_microk8s_ready",
-            f"-var-file={tfvars_path.name}"
-        ], cwd=str(tf_dir), check=True)
-
-        # ✅ Double-check API is actually ready using kubectl (from kubeconfig)
-        print("🩺 Confirming kube-apiserver is truly accepting requests...")
-        for i in range(30):
-            result = subprocess.run([
-                "kubectl",
-                "--kubeconfig", tfvars["kube_config_path"],
-                "get", "namespace", "kube-system"
-            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            if result.returncode == 0:
-                print("✅ kube-apiserver is responsive.")
-                break
-            print(f"⌛ Attempt {i+1}/30: kube-apiserver still warming up...")
-            time.sleep(5)
+        print(f"🩹 Patching microk8s.config to use {api_server} (SSH tunnel)...")
+        if patch_kubeconfig_server(kubeconfig_path, api_server):
+            print("✅ microk8s.config patched for local access")
         else:
-            raise RuntimeError("❌ kube-apiserver did not become ready in time")
+            print("✅ No need to patch, already pointing to the tunnel")
 
+        # Terraform, kubectl and helm all pick up the tunnelled kubeconfig
+        os.environ["KUBECONFIG"] = tfvars["kube_config_path"]
+        os.environ["KUBE_CONFIG_PATH"] = tfvars["kube_config_path"]
+        write_tfvars(tfvars_path, tfvars)
 
-        # Stage 2: Full apply including Kubernetes resources, with retry on failure
-        print("🚀 Running full Terraform apply (K8s stage, with retry)...")
-        apply_cmd = ["terraform", "apply", "-auto-approve", f"-var-file={tfvars_path.name}"]
-
-        max_attempts = 2
-        for attempt in range(1, max_attempts + 1):
+        # ✅ Probe /readyz in-process until kube-apiserver accepts requests
+        print("🩺 Waiting for kube-apiserver /readyz...")
+        try:
+            waited = wait_for_apiserver(kubeconfig_path, timeout=150)
+        except TimeoutError as e:
+            raise RuntimeError(f"❌ kube-apiserver did not become ready in time: {e}")
+        print(f"✅ kube-apiserver is ready (after {waited:.1f}s).")
+
+        mirror_host = self.mirror
+        if mirror_job:
+            history.step("registry_mirror")
             try:
-                subprocess.run(apply_cmd, cwd=str(tf_dir), check=True)
-                print("✅ Full Terraform apply succeeded.")
-                break
-            except subprocess.CalledProcessError as e:
-                if attempt == max_attempts:
-                    print("❌ Final Terraform apply attempt failed.")
-                    raise
-                print(f"⚠️ Terraform apply failed on attempt {attempt}, retrying in 20 seconds…")
-                time.sleep(20)
+                mirror_host = mirror_job.result()
+            except Exception as e:
+                # the mirror only speeds up pulls; the public registries still work
+                print(f"⚠️  Registry mirror unavailable ({e}); pulling from the public registries")
+                mirror_host = None
+        if mirror_host:
+            # containerd picks up hosts.toml on the next pull, before the charts are installed
+            k8s_hosts = {"jeeves-k8s-controller": ctrl_pub, **worker_hosts}
+            fleet.check(
+                fleet.run_on_hosts(k8s_hosts, "sudo bash -s", ssh_key_path,
+                                   input=registry_mirror.microk8s_script(mirror_host), timeout=120),
+                "registry mirror configuration",
+            )
+            print(f"✔ MicroK8s pulls images through the mirror on {mirror_host}")
+
+        # Traefik is installed by the full apply; give it last deploy's certificate
+        acme_path = env.get("ACME_HOST_PATH", "").strip()
+        if acme_store.location() and not acme_path:
+            print("ℹ️  ACME_STORE is set but ACME_HOST_PATH is not; the certificate store is not used")
+        elif acme_path and not journal.done("terraform_full"):
+            acme_store.restore_to_host(ctrl_pub, ssh_key_path, settings.domain.strip(), acme_path,
+                                       label="jeeves-k8s-controller")
+
+        history.step("terraform_full")
+        if journal.done("terraform_full"):
+            print("⏭  Full Terraform apply already done (journal)")
+        else:
+            # Run just the MicroK8s wait resource
+            supervisor.run([
+                "terraform", "apply", "-auto-approve",
+                "-target=null_resource.wait_for_microk8s_ready",
+                f"-var-file={tfvars_path.name}"
+            ], cwd=str(tf_dir), check=True, timeout=TERRAFORM_TIMEOUT)
+
+
+            # Stage 2: Full apply including Kubernetes resources, with retry on failure
+            print("🚀 Running full Terraform apply (K8s stage, with retry)...")
+            apply_cmd = ["terraform", "apply", "-auto-approve", f"-var-file={tfvars_path.name}"]
+
+            max_attempts = 2
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    supervisor.run(apply_cmd, cwd=str(tf_dir), check=True, timeout=TERRAFORM_TIMEOUT)
+                    print("✅ Full Terraform apply succeeded.")
+                    break
+                except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+                    if attempt == max_attempts:
+                        print("❌ Final Terraform apply attempt failed.")
+                        raise
+                    print(f"⚠️ Terraform apply failed on attempt {attempt}, retrying in 20 seconds…")
+                    time.sleep(20)
+
+            journal.record("terraform_full")
+
+        # Label what was applied from manifests so the destroy pipeline can
+        # sweep Jeeves' objects by label and leave everyone else's alone
+        try:
+            with KubeAPI(kubeconfig_path) as api:
+                labelled = label_objects(api, applied_object_paths(tf_dir, env.get("NAMESPACE", "psautoinfra")))
+            print(f"🏷  Labelled {len(labelled)} object(s) app.kubernetes.io/managed-by=jeeves")
+        except Exception as e:
+            print(f"⚠️  Could not label the applied objects ({e}); destroy will delete them by name only")
 
+        history.step("post_apply")
         # ———————————
         # 10) Post-apply: re-ensure SSH & re-install key
         # ———————————
-        print("🔄 Terraform apply done – re-checking SSH on worker…")
-        wait_for_ssh(worker_pub, ssh_key_path)
-        subprocess.run([
-            "ssh", "-o", "StrictHostKeyChecking=no",
-            "-i", str(ssh_key_path),
-            f"ubuntu@{worker_pub}",
-            install_cmd
-        ], check=True)
-        print("✔ Public key re-installed on worker (post-apply)")
-
-
-
-
+        print("🔄 Terraform apply done – re-checking SSH on worker(s)…")
+        for host in worker_hosts.values():
+            wait_for_ssh(host, ssh_key_path)
+        fleet.check(fleet.run_on_hosts(worker_hosts, install_cmd, ssh_key_path),
+                    "authorized_keys install")
+        print("✔ Public key re-installed on worker(s) (post-apply)")
+
+        if acme_path:
+            acme_store.save_from_host(ctrl_pub, ssh_key_path, settings.domain.strip(), acme_path,
+                                      label="jeeves-k8s-controller")
+
+        tunnel.stop()
+        journal.finish()
         print("✅ ps-auto-infra Terraform deployment complete!")
-
-def run(**kwargs):
-    K8sDeploymentHelm().run()
+        post_deploy()
+
+    @staticmethod
+    def restore_nodes(ec2, journal: Journal) -> dict | None:
+        """
+        Re-load the journaled instances with one describe call. Returns
+        tag → ec2.Instance, or None if any is gone, not running or has a
+        different public IP than recorded.
+        """
+        recorded = journal.outputs("provision")["nodes"]
+        try:
+            found = {i.id: i for i in ec2.instances.filter(
+                InstanceIds=[n["id"] for n in recorded.values()])}
+        except ClientError as e:
+            print(f"⚠️  Journaled instances no longer valid ({e.response['Error']['Code']})")
+            return None
+        nodes = {}
+        for tag, n in recorded.items():
+            inst = found.get(n["id"])
+            if inst is None or inst.state["Name"] != "running" or inst.public_ip_address != n["public_ip"]:
+                print(f"⚠️  Journaled {tag} {n['id']} is not running at {n['public_ip']}")
+                return None
+            nodes[tag] = inst
+        print(f"⏭  Reusing {len(nodes)} journaled instance(s)")
+        return nodes
+
+
+def run(workers=None, mongo_replicas=None, resume=False, users=None, registry_mirror=None,
+        apt_cache=None, **kwargs):
+    K8sDeploymentHelm(workers=workers, mongo_replicas=mongo_replicas, resume=resume, users=users,
+                      mirror=registry_mirror, apt=apt_cache).execute()
 
 
 
@@ -9,11 +9,19 @@ import socket
 import subprocess
 import time
 import pathlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from botocore.exceptions import ClientError
 from botocore.exceptions import ClientError as BotoClientError
 from ..pipeline import Pipeline
-from ..aws_helpers import session, latest_ubuntu_ami
+from ..aws_helpers import session, latest_ubuntu_ami, instance_vcpus
 from ..config import settings
+from ..preflight import Preflight
+from ..warm_pool import WarmPool, pool_size, refill_in_background, role_variant
+from .. import acme_store, apt_cache, fleet, history, mongo_tuning, mongo_url, registry_mirror, sizing, supervisor
+from .verify import post_deploy
+
+SCRIPTS_DIR = pathlib.Path(__file__).parents[2] / "scripts"
 
 
 def wait_for_port(host: str, port: int = 22, timeout: int = 300) -> None:
@@ -31,6 +39,24 @@ def wait_for_port(host: str, port: int = 22, timeout: int = 300) -> None:
     raise TimeoutError(f"Timeout waiting for {host}:{port}")
 
 
+def wait_for_dns(domain: str, ip: str, timeout: int = 300) -> None:
+    """
+    Block until `domain` resolves to `ip`, or raise RuntimeError.
+    """
+    print(f"Waiting up to {timeout // 60}m for {domain} → {ip} …", flush=True)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if socket.gethostbyname(domain) == ip:
+                print(f"✔ DNS is live: {domain} → {ip}", flush=True)
+                return
+        except socket.gaierror:
+            pass
+        print("… still waiting for DNS to propagate", flush=True)
+        time.sleep(5)
+    raise RuntimeError(f"DNS did not propagate to {ip} within {timeout // 60} minutes")
+
+
 class RcMongoDocker(Pipeline):
     pipeline_name        = "Rocket.Chat and MongoDB Docker"
     pipeline_description = "Two-node Deployment. One with Rocket.Chat and one MongoDB EC2 bootstrap"
@@ -40,10 +66,105 @@ class RcMongoDocker(Pipeline):
       - MongoDB node (jeeves-mongo, SG 'jeeves-basic')
       - Rocket.Chat node (jeeves-rocketchat, SG 'jeeves-rc')
     Installs via SSH the non-interactive bootstrap scripts under scripts/.
+
+    With rc_nodes > 1 the single Rocket.Chat node is replaced by N app
+    nodes (jeeves-rocketchat-appN) behind a Traefik front node (jeeves-rc-lb).
+
+    Each Rocket.Chat node runs one (single-threaded) Rocket.Chat container per
+    vCPU of its instance type unless rc_replicas / ROCKETCHAT_SCALE says otherwise.
+
+    With users / CONCURRENT_USERS the instance types, node count, replicas
+    and MongoDB data volume come from the sizing planner (jeeves/sizing.py).
+
+    With mirror / REGISTRY_MIRROR the Rocket.Chat and Traefik nodes pull
+    their images through an in-VPC registry mirror (jeeves/registry_mirror.py);
+    a new jeeves-registry node is bootstrapped while MongoDB is.
+
+    With apt / APT_CACHE the MongoDB node also runs an APT cache
+    (jeeves/apt_cache.py) that every later node installs its packages through.
+
+    With ACME_STORE the Traefik node's acme.json is saved after the deploy
+    and handed to the next deploy of DOMAIN (jeeves/acme_store.py).
     """
 
+    MAX_RC_NODES    = 10
+    MAX_RC_REPLICAS = 16
+
+    # Exported to the Rocket.Chat bootstrap; all must be set before launching
+    RC_ENV = ("RELEASE", "IMAGE", "TRAEFIK_RELEASE", "ROOT_URL", "DOMAIN", "LETSENCRYPT_EMAIL")
+
+    def __init__(self, rc_nodes: int | str | None = None, rc_replicas: int | str | None = None,
+                 users: int | str | None = None, mirror: str | None = None,
+                 apt: str | None = None):
+        self.plan = sizing.plan(int(users)) if users else sizing.plan_from_env()
+        self.mirror = registry_mirror.mode(mirror)
+        self.apt = apt_cache.mode(apt)
+        self.rc_nodes = int(rc_nodes if rc_nodes is not None else self.plan.rc_nodes or 1)
+        if not 1 <= self.rc_nodes <= self.MAX_RC_NODES:
+            raise ValueError(f"--rc-nodes must be between 1 and {self.MAX_RC_NODES}")
+        replicas = rc_replicas if rc_replicas is not None else self.plan.rc_replicas
+        self.rc_replicas = int(replicas) if replicas else None
+        if self.rc_replicas is not None and not 1 <= self.rc_replicas <= self.MAX_RC_REPLICAS:
+            raise ValueError(f"--rc-replicas must be between 1 and {self.MAX_RC_REPLICAS}")
+
+    def history_params(self) -> dict:
+        params = super().history_params()
+        params.update(tier=self.plan.tier, users=self.plan.users,
+                      mongo_instance_type=self.plan.mongo_type, rc_instance_type=self.plan.rc_type,
+                      lb_instance_type=self.plan.lb_type if self.rc_nodes > 1 else None)
+        return params
+
+    def scripts(self) -> list[pathlib.Path]:
+        scripts = [SCRIPTS_DIR / "mongodb_bootstrap.sh", SCRIPTS_DIR / "mount_data_volume.sh",
+                   SCRIPTS_DIR / "rocket_chat_ec2_bootstrap.sh"]
+        if self.rc_nodes > 1:
+            scripts.append(SCRIPTS_DIR / "traefik_lb_bootstrap.sh")
+        scripts.append(registry_mirror.CLIENT_SCRIPT)
+        if self.mirror == "node":
+            scripts.append(SCRIPTS_DIR / "registry_mirror_bootstrap.sh")
+        if self.apt:
+            scripts.append(apt_cache.SCRIPT)
+        return scripts
+
+    def preflight(self) -> None:
+        pf = Preflight("rc_mongo_docker")
+        env = pf.require_env("SSH_KEY_NAME", "SSH_KEY_PATH", "SSH_PUBLIC_KEY_PATH",
+                             "MONGO_USERNAME", "MONGO_PASSWORD", *self.RC_ENV)
+        if "SSH_KEY_PATH" in env:
+            pf.require_key(env["SSH_KEY_PATH"])
+        if "SSH_PUBLIC_KEY_PATH" in env:
+            pf.require_files(env["SSH_PUBLIC_KEY_PATH"])
+        pf.require_files(*self.scripts())
+        pf.require_tools("ssh")
+
+        sess = session()
+        if pf.check_credentials(sess):
+            ec2c = sess.client("ec2")
+            pf.check_instance_types(ec2c, [self.plan.mongo_type, self.plan.rc_type]
+                                    + ([self.plan.lb_type] if self.rc_nodes > 1 else [])
+                                    + ([registry_mirror.instance_type()] if self.mirror == "node" else []))
+            pf.run("storage profile", self.plan.storage().validate, ec2c, self.plan.mongo_type)
+            pf.run("MongoDB tuning profile", mongo_tuning.from_env,
+                   ec2c, self.plan.mongo_type, self.plan.storage())
+            pf.run("ACME certificate store", acme_store.check, sess)
+            if settings.domain.strip():
+                pf.check_hosted_zone(sess, settings.domain.strip())
+        pf.check()
+
     def run(self) -> None:
         env = os.environ
+        # Resolve every input up front so a missing one fails before launching
+        rc_env     = {k: env[k] for k in self.RC_ENV}
+        mongo_user = env["MONGO_USERNAME"]
+        mongo_pass = env["MONGO_PASSWORD"]
+        deployment_name = env.get("DEPLOYMENT_NAME")
+        if not deployment_name:
+            deployment_name = datetime.utcnow().strftime("deploy-%Y%m%d%H%M%S")
+        print(f"▶ Deployment name: {deployment_name}")
+        print(f"▶ Sizing: {self.plan.describe()}; MongoDB {self.plan.mongo_type}, "
+              f"Rocket.Chat {self.rc_nodes} × {self.plan.rc_type}"
+              + (f" behind a {self.plan.lb_type} Traefik node" if self.rc_nodes > 1 else ""))
+        self.plan.save(deployment_name)
 
         # 1) SSH key settings
         key_name    = env.get("SSH_KEY_NAME")
@@ -54,6 +175,7 @@ class RcMongoDocker(Pipeline):
                 "Please set SSH_KEY_NAME, SSH_KEY_PATH, and SSH_PUBLIC_KEY_PATH in your .env"
             )
 
+        history.step("keypair")
         # 2) AWS clients & KeyPair import if needed
         sess = session()
         ec2c = sess.client("ec2")
@@ -68,6 +190,12 @@ class RcMongoDocker(Pipeline):
             else:
                 raise
 
+        # Mongo data volume: validate against the instance type before launching
+        storage = self.plan.storage()
+        storage.validate(ec2c, self.plan.mongo_type)
+        print(f"MongoDB storage: {storage.describe()}")
+
+        history.step("network")
         # 3) Default VPC & Subnet
         vpcs = ec2c.describe_vpcs(Filters=[{"Name":"isDefault","Values":["true"]}])["Vpcs"]
         if not vpcs:
@@ -77,6 +205,7 @@ class RcMongoDocker(Pipeline):
         if not subnets:
             raise RuntimeError(f"No subnet found in VPC {vpc_id}")
         subnet_id = subnets[0]["SubnetId"]
+        subnet_az = subnets[0]["AvailabilityZone"]
 
         # 4) Security Group for MongoDB node (ensure SSH + Mongo)
         sg_resp = ec2c.describe_security_groups(
@@ -186,8 +315,32 @@ class RcMongoDocker(Pipeline):
         except BotoClientError as e:
             if e.response["Error"]["Code"] != "InvalidPermission.Duplicate":
                 raise
+        if self.apt == "node":
+            apt_cache.allow(ec2c, basic_sg_id, [rc_sg_id, basic_sg_id])
+            print(f"Allowed port {apt_cache.PORT} (APT cache) into 'jeeves-basic' ({basic_sg_id})")
+
+        # The registry mirror comes up while MongoDB is launched and bootstrapped
+        mirror_job = None
+        if self.mirror == "node":
+            print("Starting the registry mirror in the background…")
+            executor = ThreadPoolExecutor(max_workers=1)
+            mirror_job = executor.submit(
+                registry_mirror.ensure_node, sess.resource("ec2"), sess.client("ec2"),
+                vpc_id, subnet_id, key_name, key_path, registry_mirror.preseed_images(),
+            )
+            executor.shutdown(wait=False)
+
+        # Warm pools of stopped, pre-bootstrapped nodes (WARM_POOL_SIZE > 0)
+        pools = {
+            role: WarmPool(ec2c, ec2, role, self.plan.instance_type(role), key_name,
+                           role_variant(role, storage))
+            for role in ("mongo", "rocketchat") if pool_size(role)
+            # pool members have an empty data volume, not the seed snapshot
+            and not (role == "mongo" and storage.seeded)
+        }
+        claimed: set[str] = set()
 
-
+        history.step("mongo_instance")
         # 7) MongoDB EC2 instance
         mongo_inst = None
         resp = ec2c.describe_instances(
@@ -209,11 +362,26 @@ class RcMongoDocker(Pipeline):
             if mongo_inst:
                 break
 
+        if not mongo_inst and "mongo" in pools:
+            mongo_inst = pools["mongo"].claim(
+                "jeeves-mongo", {"Role": "mongo-node", "Deployment": deployment_name})
+            if mongo_inst:
+                claimed.add("mongo")
+                mongo_inst.wait_until_running(); mongo_inst.reload()
+
+        elif mongo_inst and storage.seeded:
+            print(f"⚠️  Reusing {mongo_inst.id}; MONGO_DATA_SNAPSHOT only applies to a new MongoDB node")
+            storage.snapshot = storage.snapshot_id = None
+
+        fsr_enabled_here = False
         if not mongo_inst:
+            if storage.seeded and storage.prewarm == "fsr":
+                print(f"Enabling Fast Snapshot Restore for {storage.snapshot_id} in {subnet_az}…")
+                fsr_enabled_here = storage.enable_fast_restore(ec2c, subnet_az)
             ami = latest_ubuntu_ami(ec2c, settings.default_os_version)
             mongo_inst = ec2.create_instances(
                 ImageId=ami,
-                InstanceType=settings.default_instance_type,
+                InstanceType=self.plan.mongo_type,
                 MinCount=1, MaxCount=1,
                 KeyName=key_name,
                 NetworkInterfaces=[{
@@ -222,6 +390,7 @@ class RcMongoDocker(Pipeline):
                     "AssociatePublicIpAddress": True,
                     "Groups": [basic_sg_id],
                 }],
+                BlockDeviceMappings=storage.block_device_mappings(),
                 TagSpecifications=[
                     {"ResourceType":"instance",
                      "Tags":[
@@ -241,11 +410,15 @@ class RcMongoDocker(Pipeline):
             )[0]
             print(f"Launching MongoDB {mongo_inst.id}…")
             mongo_inst.wait_until_running(); mongo_inst.reload()
+            if fsr_enabled_here:
+                # the volume is initialized at creation; FSR is billed per hour
+                storage.disable_fast_restore(ec2c, subnet_az)
 
         mongo_public_ip  = mongo_inst.public_ip_address
         mongo_private_ip = mongo_inst.private_ip_address
         print(f"MongoDB up: {mongo_inst.id} @ public {mongo_public_ip}, private {mongo_private_ip}")
 
+        history.step("mongo_bootstrap")
         # 7) Install MongoDB via SSH (with logging and timeout)
         install_timeout = 120  # seconds
         interval        = 5    # seconds between retries
@@ -265,25 +438,37 @@ class RcMongoDocker(Pipeline):
                     )
                 print(f"… still waiting (elapsed {int(elapsed)}s)", flush=True)
 
-        mongo_script = pathlib.Path(__file__).parents[2] / "scripts" / "mongodb_bootstrap.sh"
-        if not mongo_script.exists():
-            raise FileNotFoundError(f"Missing script: {mongo_script}")
+        mongo_script = SCRIPTS_DIR / "mongodb_bootstrap.sh"
+        mount_script = SCRIPTS_DIR / "mount_data_volume.sh"
+        if storage.kind in ("gp3", "io2") and not storage.data_volume_id(mongo_inst):
+            raise RuntimeError(
+                f"Existing MongoDB {mongo_inst.id} has no {storage.kind} data volume; "
+                "destroy it first or set MONGO_DATA_VOLUME=root"
+            )
+
+        # Tuning follows the node actually running, which may be a reused one
+        tuning = mongo_tuning.from_env(ec2c, mongo_inst.instance_type, storage)
+        if tuning:
+            print(f"MongoDB tuning ({tuning.workload}): WiredTiger cache {tuning.cache_gb} GiB of "
+                  f"{tuning.memory_gb} GiB, {tuning.block_compressor}, "
+                  f"oplog {tuning.oplog_size_mb or 'default'} MB")
 
         # prepare env for non-interactive run
         port       = env.get("MONGO_PORT", "27017")
         repl_name  = env.get("REPLSET_NAME", "rs0")
-        mongo_user = env["MONGO_USERNAME"]
-        mongo_pass = env["MONGO_PASSWORD"]
         header = "\n".join([
             f"export MONGO_PORT={port}",
             f"export REPLSET_NAME={repl_name}",
             f"export MONGO_USERNAME={mongo_user}",
             f"export MONGO_PASSWORD={mongo_pass}",
-        ]) + "\n"
+        ]) + "\n" + storage.mount_env(mongo_inst) + (tuning.bootstrap_env() if tuning else "")
+        # The MongoDB node is the first up, so it hosts the APT cache
+        apt_url = apt_cache.url_for(mongo_private_ip) if self.apt == "node" else self.apt
+        header += apt_cache.prefix(serve=True) if self.apt == "node" else apt_cache.prefix(apt_url)
 
         print("→ Installing MongoDB via SSH…", flush=True)
         try:
-            subprocess.run(
+            supervisor.run(
                 [
                     "ssh",
                     "-o", "BatchMode=yes",
@@ -292,14 +477,85 @@ class RcMongoDocker(Pipeline):
                     f"ubuntu@{mongo_public_ip}", "sudo", "bash", "-s",
                 ],
                 check=True,
-                input=header + mongo_script.read_text(),
-                text=True,
+                input=header + mount_script.read_text() + mongo_script.read_text(),
                 timeout=600,  # kill if the bootstrap hangs beyond 10m
             )
         except subprocess.TimeoutExpired:
             raise RuntimeError("MongoDB bootstrap script timed out after 10 minutes")
         print("✔ MongoDB installed\n", flush=True)
 
+        rc_script = SCRIPTS_DIR / "rocket_chat_ec2_bootstrap.sh"
+
+        # One Rocket.Chat process per core unless overridden
+        rc_replicas = self.rc_replicas
+        if rc_replicas is None:
+            vcpus = instance_vcpus(ec2c, self.plan.rc_type)
+            rc_replicas = min(vcpus, self.MAX_RC_REPLICAS)
+            print(f"{self.plan.rc_type} has {vcpus} vCPUs → {rc_replicas} Rocket.Chat replicas per node")
+
+        urls = mongo_url.build(mongo_user, mongo_pass, [f"{mongo_private_ip}:{port}"], repl_name,
+                               rc_processes=self.rc_nodes * rc_replicas)
+        print(f"Rocket.Chat → MongoDB: maxPoolSize={urls.max_pool_size} per process, "
+              f"compressors={urls.compressors}")
+
+        rc_header = "\n".join([
+            f"export ROCKETCHAT_SCALE={rc_replicas}",
+            f"export MONGO_USERNAME={mongo_user}",
+            f"export MONGO_PASSWORD={mongo_pass}",
+            f"export MONGO_HOST={mongo_private_ip}",
+            f"export MONGO_PORT={port}",
+            f"export REPLSET={repl_name}",
+        ] + [f"export {k}={v}" for k, v in rc_env.items()]) + "\n" + urls.env()
+
+        node_env, mirror_host = apt_cache.prefix(apt_url), self.mirror
+        if mirror_job:
+            history.step("registry_mirror")
+            try:
+                mirror_host = mirror_job.result()
+            except Exception as e:
+                # the mirror only speeds up pulls; the public registries still work
+                print(f"⚠️  Registry mirror unavailable ({e}); pulling from the public registries")
+                mirror_host = None
+        node_env = registry_mirror.client_prefix(mirror_host) + node_env
+        if mirror_host:
+            print(f"Rocket.Chat nodes pull images through the mirror on {mirror_host}")
+        if apt_url:
+            print(f"Rocket.Chat nodes install packages through the APT cache at {apt_url}")
+        rc_header += node_env
+
+        if self.rc_nodes > 1:
+            tier = self.deploy_rc_tier(
+                ec2, ec2c,
+                key_name=key_name, key_path=key_path, subnet_id=subnet_id,
+                rc_sg_id=rc_sg_id, deployment_name=deployment_name,
+                rc_header=rc_header, rc_script=rc_script, rc_replicas=rc_replicas,
+                pools=pools, claimed=claimed, node_env=node_env,
+            )
+            if claimed:
+                refill_in_background(sorted(claimed))
+            lb = tier.pop("jeeves-rc-lb")
+            summary = {
+                "mongodb":    {
+                    "id":         mongo_inst.id,
+                    "public_ip":  mongo_public_ip,
+                    "private_ip": mongo_private_ip,
+                    "storage":    storage.describe(),
+                    "tuning":     tuning.describe() if tuning else "mongod defaults",
+                    "connection": urls.describe(),
+                },
+                "traefik":    {"id": lb.id, "public_ip": lb.public_ip_address},
+                "rocketchat": {
+                    name: {"id": inst.id, "public_ip": inst.public_ip_address,
+                           "private_ip": inst.private_ip_address, "replicas": rc_replicas}
+                    for name, inst in tier.items()
+                },
+            }
+            print(json.dumps(summary, indent=2))
+            print(f"\nSSH into the Traefik front node:\n  ssh -i {key_path} ubuntu@{lb.public_ip_address}")
+            post_deploy()
+            return
+
+        history.step("rc_instance")
         # 9) Rocket.Chat EC2 instance
         rc_inst = None
         resp = ec2c.describe_instances(
@@ -321,11 +577,18 @@ class RcMongoDocker(Pipeline):
             if rc_inst:
                 break
 
+        if not rc_inst and "rocketchat" in pools:
+            rc_inst = pools["rocketchat"].claim(
+                "jeeves-rocketchat", {"Role": "rocketchat-node", "Deployment": deployment_name})
+            if rc_inst:
+                claimed.add("rocketchat")
+                rc_inst.wait_until_running(); rc_inst.reload()
+
         if not rc_inst:
             ami = latest_ubuntu_ami(ec2c, settings.default_os_version)
             rc_inst = ec2.create_instances(
                 ImageId=ami,
-                InstanceType=settings.default_instance_type,
+                InstanceType=self.plan.rc_type,
                 MinCount=1, MaxCount=1,
                 KeyName=key_name,
                 NetworkInterfaces=[{
@@ -356,38 +619,27 @@ class RcMongoDocker(Pipeline):
 
         rc_ip = rc_inst.public_ip_address
         print(f"Rocket.Chat up: {rc_inst.id} @ {rc_ip}")
+        if claimed:
+            refill_in_background(sorted(claimed))
 
         # ────────────────────────────────────────────────────
         # Update DNS and wait for propagation before SSHing in
         # ────────────────────────────────────────────────────
 
 
+        history.step("rc_bootstrap")
         # 10) Install Rocket.Chat via SSH
         wait_for_port(rc_ip, 22)
-        rc_script = pathlib.Path(__file__).parents[2] / "scripts" / "rocket_chat_ec2_bootstrap.sh"
-        if not rc_script.exists():
-            raise FileNotFoundError(f"Missing script: {rc_script}")
-
-        rc_header = "\n".join([
-            f"export MONGO_USERNAME={mongo_user}",
-            f"export MONGO_PASSWORD={mongo_pass}",
-            f"export MONGO_HOST={mongo_private_ip}",
-            f"export MONGO_PORT={port}",
-            f"export REPLSET={repl_name}",
-            f"export RELEASE={env['RELEASE']}",
-            f"export IMAGE={env['IMAGE']}",
-            f"export TRAEFIK_RELEASE={env['TRAEFIK_RELEASE']}",
-            f"export ROOT_URL={env['ROOT_URL']}",
-            f"export DOMAIN={env['DOMAIN']}",
-            f"export LETSENCRYPT_EMAIL={env['LETSENCRYPT_EMAIL']}",
-        ]) + "\n"
         print("Installing Rocket.Chat via SSH…")
         try:
-            subprocess.run([
+            supervisor.run([
                 "ssh","-o","StrictHostKeyChecking=no",
                 "-i", str(key_path),
                 f"ubuntu@{rc_ip}", "sudo","bash","-s"
-            ], check=True, input=rc_header + rc_script.read_text(), text=True)
+            ], check=True, input=rc_header + acme_store.prefix(settings.domain.strip()) + rc_script.read_text(),
+               timeout=900)
+        except subprocess.TimeoutExpired:
+            raise RuntimeError("Rocket.Chat bootstrap script timed out after 15 minutes")
         except subprocess.CalledProcessError as e:
             if e.returncode == 22:
                 # curl inside the bootstrap returned 22 (HTTP error),
@@ -398,6 +650,7 @@ class RcMongoDocker(Pipeline):
         print("✔ Rocket.Chat & Traefik installed\n")
 
 
+        history.step("dns")
         # Determine the domain from settings
         domain = settings.domain.strip()
         if not domain:
@@ -406,21 +659,8 @@ class RcMongoDocker(Pipeline):
         print("Updating DNS record for DOMAIN…", flush=True)
         from .route53_update import Route53Update
         Route53Update().run()
-
-        print(f"Waiting up to 5m for {domain} → {rc_ip} …", flush=True)
-        deadline = time.time() + 300
-        while time.time() < deadline:
-            try:
-                resolved = socket.gethostbyname(domain)
-                if resolved == rc_ip:
-                    print(f"✔ DNS is live: {domain} → {rc_ip}", flush=True)
-                    break
-            except socket.gaierror:
-                pass
-            print("… still waiting for DNS to propagate", flush=True)
-            time.sleep(5)
-        else:
-            raise RuntimeError(f"DNS did not propagate to {rc_ip} within 5 minutes")
+        wait_for_dns(domain, rc_ip)
+        acme_store.save_from_host(rc_ip, key_path, domain, label="jeeves-rocketchat")
 
 
 
@@ -432,10 +672,14 @@ class RcMongoDocker(Pipeline):
                 "id":         mongo_inst.id,
                 "public_ip":  mongo_public_ip,
                 "private_ip": mongo_private_ip,
+                "storage":    storage.describe(),
+                "tuning":     tuning.describe() if tuning else "mongod defaults",
+                "connection": urls.describe(),
             },
             "rocketchat": {
                 "id":        rc_inst.id,
                 "public_ip": rc_ip,
+                "replicas":  rc_replicas,
             },
         }
         print(json.dumps(summary, indent=2))
@@ -451,6 +695,168 @@ class RcMongoDocker(Pipeline):
         except Exception as e:
             print(f"⚠️  Failed to update Route 53: {e}")
 
+        post_deploy()
+
+    def deploy_rc_tier(self, ec2, ec2c, *, key_name: str, key_path: pathlib.Path,
+                       subnet_id: str, rc_sg_id: str, deployment_name: str,
+                       rc_header: str, rc_script: pathlib.Path, rc_replicas: int = 1,
+                       pools: dict | None = None, claimed: set | None = None,
+                       node_env: str = "") -> dict:
+        """
+        Launch the app nodes and the Traefik front node in one go, bootstrap
+        the app nodes in parallel, health-check every backend from the front
+        node, and only then point DOMAIN at it. Returns name → instance.
+        """
+        env = os.environ
+
+        # The front node reaches every replica (3000, 3001, …) inside the SG
+        try:
+            ec2c.authorize_security_group_ingress(
+                GroupId=rc_sg_id,
+                IpPermissions=[{
+                    "IpProtocol": "tcp", "FromPort": 3000, "ToPort": 3000 + self.MAX_RC_REPLICAS - 1,
+                    "UserIdGroupPairs": [{"GroupId": rc_sg_id}],
+                }]
+            )
+        except BotoClientError as e:
+            if e.response["Error"]["Code"] != "InvalidPermission.Duplicate":
+                raise
+
+        app_names = [f"jeeves-rocketchat-app{i}" for i in range(1, self.rc_nodes + 1)]
+        groups = {"rocketchat-node": app_names, "rocketchat-lb": ["jeeves-rc-lb"]}
+
+        history.step("rc_tier_instances")
+        # 9) Reuse what exists, launch the rest with one call per role
+        nodes = {}
+        resp = ec2c.describe_instances(Filters=[
+            {"Name": "tag:Name",            "Values": app_names + ["jeeves-rc-lb"]},
+            {"Name": "instance-state-name", "Values": ["pending", "running", "stopped"]},
+        ])
+        for r in resp.get("Reservations", []):
+            for inst in r.get("Instances", []):
+                name = next(t["Value"] for t in inst["Tags"] if t["Key"] == "Name")
+                if name in nodes:
+                    continue
+                nodes[name] = ec2.Instance(inst["InstanceId"])
+                print(f"Found existing {name} {inst['InstanceId']} ({inst['State']['Name']})")
+                if inst["State"]["Name"] == "stopped":
+                    nodes[name].start()
+
+        # App nodes come from the warm pool first
+        if pools and "rocketchat" in pools:
+            for name in [n for n in app_names if n not in nodes]:
+                inst = pools["rocketchat"].claim(
+                    name, {"Role": "rocketchat-node", "Deployment": deployment_name})
+                if inst is None:
+                    break
+                nodes[name] = inst
+                claimed.add("rocketchat")
+
+        ami = None
+        for role, names in groups.items():
+            missing = [n for n in names if n not in nodes]
+            if not missing:
+                continue
+            ami = ami or latest_ubuntu_ami(ec2c, settings.default_os_version)
+            launched = ec2.create_instances(
+                ImageId=ami,
+                InstanceType=self.plan.lb_type if role == "rocketchat-lb" else self.plan.rc_type,
+                MinCount=len(missing), MaxCount=len(missing),
+                KeyName=key_name,
+                NetworkInterfaces=[{
+                    "SubnetId": subnet_id,
+                    "DeviceIndex": 0,
+                    "AssociatePublicIpAddress": True,
+                    "Groups": [rc_sg_id],
+                }],
+                TagSpecifications=[
+                    {"ResourceType":"instance",
+                     "Tags":[
+                       {"Key":"Name",     "Value":missing[0]},
+                       {"Key":"Project",  "Value":"jeeves"},
+                       {"Key":"Role",     "Value":role},
+                       {"Key": "Deployment",  "Value": deployment_name},
+                     ]},
+                    {"ResourceType":"volume",
+                     "Tags":[
+                       {"Key":"Project",  "Value":"jeeves"},
+                       {"Key": "Deployment",  "Value": deployment_name},
+                     ]}
+                  ],
+                UserData="#!/usr/bin/env bash\nexit 0\n",
+            )
+            for name, inst in zip(missing, launched):
+                if name != missing[0]:
+                    ec2c.create_tags(Resources=[inst.id], Tags=[{"Key": "Name", "Value": name}])
+                nodes[name] = inst
+                print(f"Launching {name} {inst.id}…")
+
+        ec2c.get_waiter("instance_running").wait(InstanceIds=[i.id for i in nodes.values()])
+        for inst in nodes.values():
+            inst.reload()
+            wait_for_port(inst.public_ip_address, 22)
+        lb = nodes["jeeves-rc-lb"]
+        apps = {n: nodes[n] for n in app_names}
+        print(f"Rocket.Chat tier up: {len(apps)} app node(s) behind {lb.id} @ {lb.public_ip_address}")
+
+        history.step("rc_tier_bootstrap")
+        # 10) Install Rocket.Chat on every app node concurrently
+        print(f"Installing Rocket.Chat on {len(apps)} app nodes via SSH…")
+        fleet.check(
+            fleet.run_on_hosts(
+                {n: i.public_ip_address for n, i in apps.items()}, "sudo bash -s", key_path,
+                input="export RC_MODE=app\n" + rc_header + rc_script.read_text(), timeout=1200,
+            ),
+            "Rocket.Chat app bootstrap",
+        )
+
+        history.step("rc_tier_health")
+        # Every backend must answer from the front node's side of the SG
+        backends = [f"{i.private_ip_address}:{3000 + r}" for i in apps.values() for r in range(rc_replicas)]
+        probe = " ".join([
+            f"for b in {' '.join(backends)}; do",
+            "  for i in $(seq 60); do curl -sf -m 5 http://$b/api/info >/dev/null && break; sleep 5; done;",
+            "  curl -sf -m 5 http://$b/api/info >/dev/null || { echo \"$b unhealthy\"; exit 1; };",
+            "  echo \"$b healthy\";",
+            "done",
+        ])
+        fleet.check(
+            [fleet.run_on_host(lb.public_ip_address, probe, key_path, timeout=600, label="jeeves-rc-lb")],
+            "Backend health check",
+        )
+        print(f"✔ All {len(backends)} backends healthy")
+
+        history.step("rc_tier_lb")
+        lb_script = SCRIPTS_DIR / "traefik_lb_bootstrap.sh"
+        lb_header = "\n".join([
+            f"export TRAEFIK_RELEASE={env['TRAEFIK_RELEASE']}",
+            f"export DOMAIN={env['DOMAIN']}",
+            f"export LETSENCRYPT_EMAIL={env['LETSENCRYPT_EMAIL']}",
+            f"export BACKENDS={','.join(backends)}",
+        ]) + "\n" + node_env + acme_store.prefix(settings.domain.strip())
+        print("Installing Traefik on the front node via SSH…")
+        fleet.check(
+            [fleet.run_on_host(lb.public_ip_address, "sudo bash -s", key_path, timeout=900,
+                               input=lb_header + lb_script.read_text(), label="jeeves-rc-lb")],
+            "Traefik front-node bootstrap",
+        )
+        print("✔ Traefik front node installed\n")
+
+        history.step("dns")
+        # DNS moves to the front node only after every backend passed
+        domain = settings.domain.strip()
+        if not domain:
+            raise RuntimeError("DOMAIN must be set in settings")
+        print("Updating DNS record for DOMAIN…", flush=True)
+        from .route53_update import Route53Update
+        Route53Update(ip=lb.public_ip_address).run()
+        wait_for_dns(domain, lb.public_ip_address)
+        # Traefik requests its certificate once DOMAIN resolves to it
+        acme_store.save_from_host(lb.public_ip_address, key_path, domain, label="jeeves-rc-lb")
+        return nodes
+
 
-def run(**kwargs):
-    RcMongoDocker().run()
+def run(rc_nodes=None, rc_replicas=None, users=None, registry_mirror=None, apt_cache=None,
+        **kwargs):
+    RcMongoDocker(rc_nodes=rc_nodes, rc_replicas=rc_replicas, users=users,
+                  mirror=registry_mirror, apt=apt_cache).execute()
@@ -14,12 +14,27 @@ from botocore.exceptions import ClientError
 from ..pipeline import Pipeline
 from ..aws_helpers import session
 from ..config import settings
+from ..preflight import Preflight
 
 
 class Route53Update(Pipeline):
     pipeline_name        = "Update Route53 SubDomain"
     pipeline_description = "Updates Route53 SubDomain A record. Creates if it does not exist"
     docs_path            = pathlib.Path(__file__).parents[2] / "docs" / "route53_update.md"
+
+    def __init__(self, tag: str = "jeeves-rocketchat", ip: str | None = None):
+        # `ip` skips discovery, e.g. to point DOMAIN at a Traefik front node
+        self.tag = tag
+        self.ip  = ip
+
+    def preflight(self) -> None:
+        pf = Preflight("route53_update")
+        pf.require_env("DOMAIN")
+        sess = session()
+        if pf.check_credentials(sess) and settings.domain.strip():
+            pf.check_hosted_zone(sess, settings.domain.strip())
+        pf.check()
+
     def run(self) -> None:
         # 1) Read DOMAIN from settings
         domain = settings.domain.strip()
@@ -28,20 +43,24 @@ class Route53Update(Pipeline):
 
         # 2) Discover the Rocket.Chat EC2 instance by tag
         sess = session()
-        ec2 = sess.resource("ec2")
-        running = list(ec2.instances.filter(
-            Filters=[
-                {"Name": "tag:Name", "Values": ["jeeves-rocketchat"]},
-                {"Name": "instance-state-name", "Values": ["running"]},
-            ]
-        ))
-        if not running:
-            raise RuntimeError("No running EC2 instance tagged 'jeeves-rocketchat' found")
-        rc = running[0]
-        public_ip = rc.public_ip_address
-        if not public_ip:
-            raise RuntimeError(f"Instance {rc.id} has no public IP")
-        print(f"Rocket.Chat instance: {rc.id} → {public_ip}")
+        if self.ip:
+            public_ip = self.ip
+            print(f"Target: {public_ip}")
+        else:
+            ec2 = sess.resource("ec2")
+            running = list(ec2.instances.filter(
+                Filters=[
+                    {"Name": "tag:Name", "Values": [self.tag]},
+                    {"Name": "instance-state-name", "Values": ["running"]},
+                ]
+            ))
+            if not running:
+                raise RuntimeError(f"No running EC2 instance tagged '{self.tag}' found")
+            rc = running[0]
+            public_ip = rc.public_ip_address
+            if not public_ip:
+                raise RuntimeError(f"Instance {rc.id} has no public IP")
+            print(f"Rocket.Chat instance: {rc.id} → {public_ip}")
 
         # 3) Find the Hosted Zone for the domain’s parent zone
         #    e.g. for 'chat.example.com', we look up 'example.com.'
@@ -87,5 +106,5 @@ class Route53Update(Pipeline):
         info = resp.get("ChangeInfo", {})
         print(f"Change submitted: ID={info.get('Id')} Status={info.get('Status')}")
 
-def run(**kwargs):
-    Route53Update().run()
+def run(tag="jeeves-rocketchat", ip=None, **kwargs):
+    Route53Update(tag=tag, ip=ip).execute()
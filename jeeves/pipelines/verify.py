@@ -0,0 +1,81 @@
+# jeeves/pipelines/verify.py
+
+"""
+Pipeline: verify
+
+Probes a deployed Rocket.Chat from the runner: /api/info, /health, the
+websocket upgrade, the TLS certificate and request latency, all at once.
+rc_mongo_docker and rc_microservices_helm run the same suite as their
+last step; this pipeline re-runs it on demand, or against a local
+stand-in server with --stand-in.
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+
+from ..pipeline import Pipeline
+from ..config import settings
+from ..preflight import Preflight
+from .. import history, verify
+
+
+def default_url() -> str:
+    """ROOT_URL if set, else https://DOMAIN."""
+    root = os.environ.get("ROOT_URL", "").strip()
+    domain = settings.domain.strip()
+    return root or (f"https://{domain}" if domain else "")
+
+
+def post_deploy(url: str | None = None) -> None:
+    """
+    The verification step at the end of a deploy pipeline. A failing suite
+    only warns, since the deployment itself has finished; VERIFY=strict
+    makes it fail the run and VERIFY=false skips it.
+    """
+    mode = os.environ.get("VERIFY", "true").lower()
+    if mode == "false":
+        print("⏭  Verification skipped (VERIFY=false)")
+        return
+    history.step("verify")
+    verify.check(url or default_url(), strict=mode == "strict", **verify.settings_from_env())
+
+
+class Verify(Pipeline):
+    pipeline_name        = "Verify Deployment"
+    pipeline_description = "Probes Rocket.Chat's API, websocket, TLS and latency from the runner"
+    docs_path            = pathlib.Path(__file__).parents[2] / "docs" / "verify.md"
+
+    def __init__(self, url: str | None = None, stand_in: bool | str = False,
+                 wait: float | str | None = None):
+        self.url = url or default_url()
+        self.stand_in = str(stand_in).lower() in ("1", "true", "yes")
+        self.wait = wait
+
+    def preflight(self) -> None:
+        pf = Preflight("verify")
+        if not self.stand_in:
+            if not self.url:
+                pf.fail("nothing to verify: pass --url or set ROOT_URL or DOMAIN")
+            else:
+                try:
+                    verify.Target.parse(self.url)
+                except ValueError as e:
+                    pf.fail(str(e))
+        pf.check()
+
+    def run(self) -> None:
+        history.step("verify")
+        opts = verify.settings_from_env()
+        if self.wait is not None:
+            opts["wait"] = float(self.wait)
+        if self.stand_in:
+            with verify.StandInServer() as url:
+                verify.check(url, **{**opts, "wait": 0})
+        else:
+            verify.check(self.url, **opts)
+
+
+def run(url=None, stand_in=False, wait=None, **kwargs):
+    Verify(url=url, stand_in=stand_in, wait=wait).execute()
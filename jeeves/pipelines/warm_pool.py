@@ -0,0 +1,167 @@
+# jeeves/pipelines/warm_pool.py
+
+"""
+Pipeline: warm_pool
+
+Tops up the warm pools of stopped, pre-bootstrapped MongoDB and
+Rocket.Chat nodes that rc_mongo_docker claims from, or drains them.
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+
+from ..pipeline import Pipeline
+from ..aws_helpers import session, latest_ubuntu_ami
+from ..config import settings
+from ..preflight import Preflight
+from ..storage import StorageProfile
+from ..warm_pool import ROLES, LaunchSpec, WarmPool, pool_size, prepare_header, role_variant
+from .. import fleet, history, registry_mirror, sizing
+from ..fleet import wait_for_ssh
+
+
+def _storage(plan: sizing.Plan) -> StorageProfile:
+    # members get an empty data volume; seeding from a snapshot happens at deploy time
+    storage = plan.storage()
+    storage.snapshot = None
+    return storage
+
+
+class WarmPoolRefill(Pipeline):
+    pipeline_name        = "Warm Pool"
+    pipeline_description = "Keeps stopped, pre-bootstrapped MongoDB and Rocket.Chat nodes ready to claim"
+    docs_path            = pathlib.Path(__file__).parents[2] / "docs" / "warm_pool.md"
+
+    def __init__(self, roles: str | None = None, drain: bool | str = False):
+        self.roles = [r.strip() for r in (roles or ",".join(ROLES)).split(",") if r.strip()]
+        unknown = set(self.roles) - set(ROLES)
+        if unknown:
+            raise ValueError(f"--roles must be among {', '.join(ROLES)}, got {', '.join(sorted(unknown))}")
+        self.drain = str(drain).lower() in ("1", "true", "yes")
+        # same instance types and volume as rc_mongo_docker will claim with
+        self.plan = sizing.plan_from_env()
+
+    def history_params(self) -> dict:
+        params = super().history_params()
+        params.update(roles=",".join(self.roles),
+                      **{f"{r}_instance_type": self.plan.instance_type(r) for r in self.roles})
+        return params
+
+    def pools(self, ec2c, ec2) -> dict[str, WarmPool]:
+        storage = _storage(self.plan)
+        return {
+            role: WarmPool(ec2c, ec2, role, self.plan.instance_type(role),
+                           os.environ["SSH_KEY_NAME"], role_variant(role, storage))
+            for role in self.roles
+        }
+
+    def preflight(self) -> None:
+        pf = Preflight("warm_pool")
+        env = pf.require_env("SSH_KEY_NAME", "SSH_KEY_PATH",
+                             *(("RELEASE", "IMAGE", "TRAEFIK_RELEASE") if "rocketchat" in self.roles else ()))
+        if self.drain:
+            pf.check_credentials(session())
+            pf.check()
+            return
+        if "SSH_KEY_PATH" in env:
+            pf.require_key(env["SSH_KEY_PATH"])
+        pf.require_files(*(ROLES[r]["script"] for r in self.roles))
+        if "rocketchat" in self.roles:
+            pf.require_files(registry_mirror.CLIENT_SCRIPT)
+        pf.require_tools("ssh")
+
+        sess = session()
+        if pf.check_credentials(sess):
+            ec2c = sess.client("ec2")
+            pf.check_instance_types(ec2c, [self.plan.instance_type(r) for r in self.roles])
+            if "mongo" in self.roles:
+                pf.run("storage profile", _storage(self.plan).validate, ec2c, self.plan.mongo_type)
+            sgs = {ROLES[r]["security_group"] for r in self.roles}
+            found = {
+                g["GroupName"] for g in ec2c.describe_security_groups(
+                    Filters=[{"Name": "group-name", "Values": sorted(sgs)}]
+                )["SecurityGroups"]
+            }
+            for sg in sorted(sgs - found):
+                pf.fail(f"security group '{sg}' not found; run rc_mongo_docker once first")
+        pf.check()
+
+    def run(self) -> None:
+        env = os.environ
+        key_path = pathlib.Path(env["SSH_KEY_PATH"]).expanduser()
+
+        sess = session()
+        ec2c = sess.client("ec2")
+        ec2  = sess.resource("ec2")
+        pools = self.pools(ec2c, ec2)
+
+        if self.drain:
+            for role, pool in pools.items():
+                ids = pool.drain()
+                print(f"Drained {role} pool: {', '.join(ids) or 'empty'}")
+            return
+
+        history.step("launch")
+        # 1) Launch what is missing, one batched call per role
+        vpc = ec2c.describe_vpcs(Filters=[{"Name": "isDefault", "Values": ["true"]}])["Vpcs"][0]
+        subnet_id = ec2c.describe_subnets(
+            Filters=[{"Name": "vpc-id", "Values": [vpc["VpcId"]]}]
+        )["Subnets"][0]["SubnetId"]
+        sg_ids = {
+            g["GroupName"]: g["GroupId"] for g in ec2c.describe_security_groups(Filters=[
+                {"Name": "group-name", "Values": sorted({ROLES[r]["security_group"] for r in pools})},
+                {"Name": "vpc-id",     "Values": [vpc["VpcId"]]},
+            ])["SecurityGroups"]
+        }
+        storage = _storage(self.plan)
+        ami = None
+        launched: dict[str, list] = {}
+        for role, pool in pools.items():
+            size = pool_size(role)
+            need = pool.deficit(size)
+            print(f"{role} pool ({pool.variant}): target {size}, launching {need}")
+            if not need:
+                continue
+            ami = ami or latest_ubuntu_ami(ec2c, settings.default_os_version)
+            launched[role] = pool.launch(need, LaunchSpec(
+                image_id=ami,
+                subnet_id=subnet_id,
+                security_groups=[sg_ids[ROLES[role]["security_group"]]],
+                block_devices=storage.block_device_mappings() if role == "mongo" else [],
+            ))
+        if not launched:
+            print("✔ Warm pools are full")
+            return
+
+        members = [i for insts in launched.values() for i in insts]
+        ec2c.get_waiter("instance_running").wait(InstanceIds=[i.id for i in members])
+        for inst in members:
+            inst.reload()
+            wait_for_ssh(inst.public_ip_address, key_path)
+
+        history.step("prepare")
+        # 2) Prepare every new member concurrently, then stop and mark it ready
+        hosts, stdin = {}, {}
+        for role, insts in launched.items():
+            script = prepare_header(role) + ROLES[role]["script"].read_text()
+            for inst in insts:
+                hosts[inst.id] = inst.public_ip_address
+                stdin[inst.id] = script
+        results = {r.label: r for r in fleet.run_on_hosts(hosts, "sudo bash -s", key_path,
+                                                          input=stdin, timeout=1200)}
+        fleet.print_summary(list(results.values()))
+
+        for role, insts in launched.items():
+            ready  = [i for i in insts if results[i.id].ok]
+            failed = [i.id for i in insts if not results[i.id].ok]
+            if failed:
+                print(f"⚠️  Terminating {role} members that failed to prepare: {', '.join(failed)}")
+                ec2c.terminate_instances(InstanceIds=failed)
+            pools[role].park(ready)
+            print(f"✔ {len(ready)} {role} member(s) ready")
+
+
+def run(roles=None, drain=False, **kwargs):
+    WarmPoolRefill(roles=roles, drain=drain).execute()
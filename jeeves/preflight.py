@@ -0,0 +1,167 @@
+# jeeves/preflight.py
+
+"""
+Preflight checks run before a pipeline creates anything.
+
+A pipeline's preflight() collects every requirement (env vars, local
+files, CLIs, credentials, instance-type availability) into one Preflight
+and calls check(), which reports all failures together in a single
+PreflightError. Everything here is local or a cheap read-only API call,
+so a bad configuration fails in seconds instead of after provisioning.
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+import shutil
+import time
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+
+class PreflightError(RuntimeError):
+    """One or more preflight checks failed."""
+
+
+class Preflight:
+    """
+    Usage:
+        pf = Preflight("rc_mongo_docker")
+        pf.require_env("RELEASE", "IMAGE")
+        pf.require_files(script_path)
+        pf.require_tools("ssh")
+        pf.check_credentials(sess)
+        pf.check_instance_types(ec2c, ["t3.large"])
+        pf.check()
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.failures: list[str] = []
+        self.start = time.monotonic()
+
+    def fail(self, message: str) -> None:
+        self.failures.append(message)
+
+    # ———————————
+    # Local checks
+    # ———————————
+    def require_env(self, *names: str) -> dict[str, str]:
+        """Record every unset/empty variable; return the ones that are set."""
+        found = {}
+        for name in names:
+            value = os.environ.get(name, "")
+            if value.strip():
+                found[name] = value
+            else:
+                self.fail(f"environment variable {name} is not set")
+        return found
+
+    def require_files(self, *paths: str | pathlib.Path) -> None:
+        for path in paths:
+            path = pathlib.Path(path).expanduser()
+            if not path.exists():
+                self.fail(f"missing file {path}")
+
+    def require_key(self, path: str | pathlib.Path) -> None:
+        """The private key must exist and not be readable by others (ssh refuses it)."""
+        path = pathlib.Path(path).expanduser()
+        if not path.is_file():
+            self.fail(f"missing SSH private key {path}")
+        elif path.stat().st_mode & 0o077:
+            self.fail(f"SSH private key {path} is accessible by others; run chmod 600 {path}")
+
+    def require_tools(self, *tools: str) -> None:
+        for tool in tools:
+            if shutil.which(tool) is None:
+                self.fail(f"'{tool}' not found on PATH")
+
+    # ———————————
+    # AWS checks (read-only, one call each)
+    # ———————————
+    def check_credentials(self, sess) -> dict | None:
+        """One STS call proves the credentials and region work."""
+        try:
+            ident = sess.client("sts").get_caller_identity()
+        except (ClientError, BotoCoreError) as e:
+            self.fail(f"AWS credentials rejected: {e}")
+            return None
+        print(f"  ✔ AWS identity {ident['Arn']} ({sess.region_name})")
+        return ident
+
+    def check_instance_types(self, ec2c, instance_types: list[str], subnet_id: str | None = None) -> None:
+        """
+        Every instance type must be offered in the availability zone of
+        `subnet_id` (default: the first subnet of the default VPC, which is
+        where the pipelines launch).
+        """
+        try:
+            if subnet_id:
+                subnet = ec2c.describe_subnets(SubnetIds=[subnet_id])["Subnets"][0]
+            else:
+                vpcs = ec2c.describe_vpcs(Filters=[{"Name": "isDefault", "Values": ["true"]}])["Vpcs"]
+                if not vpcs:
+                    self.fail("no default VPC found")
+                    return
+                subnets = ec2c.describe_subnets(
+                    Filters=[{"Name": "vpc-id", "Values": [vpcs[0]["VpcId"]]}]
+                )["Subnets"]
+                if not subnets:
+                    self.fail(f"no subnet found in VPC {vpcs[0]['VpcId']}")
+                    return
+                subnet = subnets[0]
+            az = subnet["AvailabilityZone"]
+            wanted = sorted(set(instance_types))
+            offered = {
+                o["InstanceType"]
+                for o in ec2c.describe_instance_type_offerings(
+                    LocationType="availability-zone",
+                    Filters=[
+                        {"Name": "location",      "Values": [az]},
+                        {"Name": "instance-type", "Values": wanted},
+                    ],
+                )["InstanceTypeOfferings"]
+            }
+        except (ClientError, BotoCoreError) as e:
+            self.fail(f"could not check instance-type offerings: {e}")
+            return
+        for t in wanted:
+            if t not in offered:
+                self.fail(f"instance type {t} is not offered in {az} ({subnet['SubnetId']})")
+
+    def check_hosted_zone(self, sess, domain: str) -> None:
+        """The parent zone of `domain` must be hosted in Route 53."""
+        if domain.count(".") < 1:
+            self.fail(f"DOMAIN '{domain}' is not a valid subdomain")
+            return
+        parent = ".".join(domain.split(".")[1:]) + "."
+        try:
+            hz = sess.client("route53").list_hosted_zones_by_name(
+                DNSName=parent, MaxItems="1"
+            )["HostedZones"]
+        except (ClientError, BotoCoreError) as e:
+            self.fail(f"could not list Route 53 hosted zones: {e}")
+            return
+        if not hz or hz[0]["Name"] != parent:
+            self.fail(f"no Route 53 hosted zone for '{parent}'")
+
+    def run(self, description: str, fn, *args, **kwargs):
+        """Run an extra check; any exception it raises becomes a failure."""
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            self.fail(f"{description}: {e}")
+            return None
+
+    # ———————————
+    # Verdict
+    # ———————————
+    def check(self) -> None:
+        took = time.monotonic() - self.start
+        if self.failures:
+            raise PreflightError(
+                f"Preflight for {self.name} failed ({took:.1f}s):\n"
+                + "\n".join(f"  ✘ {f}" for f in self.failures)
+            )
+        print(f"✔ Preflight for {self.name} passed in {took:.1f}s")
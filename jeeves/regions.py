@@ -0,0 +1,136 @@
+# jeeves/regions.py
+
+"""
+Run one pipeline in several AWS regions at once.
+
+Settings, the boto3 session, the AMI and instance-type caches and the step
+journal are all per process and per region, so every region runs as a
+separate `jeeves pipelines run` child process with its own
+AWS_DEFAULT_REGION. The children run concurrently under the supervisor,
+their output is prefixed with `[region]`, and a combined table of results
+and timings is printed at the end.
+
+Each region gets its own DEPLOYMENT_NAME (`<name>-<region>`) and, when
+DOMAIN is set, its own hostname, so the regional deployments do not fight
+over one DNS record: `chat.example.com` becomes `chat-eu-west-1.example.com`
+unless DOMAIN_<REGION> (e.g. DOMAIN_EU_WEST_1) says otherwise.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
+from . import supervisor
+
+_REGION_RE = re.compile(r"^[a-z]{2}(-gov)?-[a-z]+-\d$")
+
+# Pipelines that keep state in one place on disk and cannot run twice at once
+NOT_REGION_SAFE = {
+    "rc_microservices_helm":         "its Terraform state and kubeconfig live in the one ps-auto-infra directory",
+    "destroy_rc_microservices_helm": "its Terraform state and kubeconfig live in the one ps-auto-infra directory",
+}
+
+
+@dataclass
+class RegionResult:
+    region: str
+    deployment: str
+    domain: str
+    exit_code: int | None       # None when the region's run timed out
+    duration: float
+    output: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0
+
+
+def parse_regions(value: str, pipeline: str | None = None) -> list[str]:
+    """Split and check a `--regions r1,r2,...` value for `pipeline`."""
+    if pipeline in NOT_REGION_SAFE:
+        raise ValueError(f"{pipeline} cannot fan out across regions: {NOT_REGION_SAFE[pipeline]}")
+    regions = list(dict.fromkeys(r.strip() for r in value.split(",") if r.strip()))
+    bad = [r for r in regions if not _REGION_RE.match(r)]
+    if bad:
+        raise ValueError(f"not an AWS region: {', '.join(bad)}")
+    if not regions:
+        raise ValueError("--regions needs at least one region")
+    return regions
+
+
+def region_domain(domain: str, region: str, env=None) -> str:
+    """
+    Hostname for `region`: DOMAIN_<REGION> if set, else the region appended
+    to the first label of `domain`, which keeps it in the same hosted zone.
+    """
+    env = os.environ if env is None else env
+    override = env.get("DOMAIN_" + region.upper().replace("-", "_"))
+    if override:
+        return override
+    if not domain:
+        return ""
+    first, _, zone = domain.partition(".")
+    return f"{first}-{region}.{zone}" if zone else f"{first}-{region}"
+
+
+def region_env(region: str, deployment: str, env=None) -> dict[str, str]:
+    """Environment of the child process that runs the pipeline in `region`."""
+    env = dict(os.environ if env is None else env)
+    env.update({
+        "AWS_DEFAULT_REGION": region,
+        "AWS_REGION":         region,
+        "DEPLOYMENT_NAME":    f"{deployment}-{region}",
+        "PYTHONUNBUFFERED":   "1",
+    })
+    domain = region_domain(env.get("DOMAIN", ""), region, env)
+    if domain:
+        env["DOMAIN"] = domain
+        env["ROOT_URL"] = f"https://{domain}"
+    return env
+
+
+def fan_out(pipeline: str, args: list[str], regions: list[str],
+            timeout: float | None = None) -> list[RegionResult]:
+    """
+    Run `jeeves pipelines run <pipeline> <args>` in every region
+    concurrently and return one result per region, in `regions` order.
+    """
+    deployment = os.environ.get("DEPLOYMENT_NAME") or \
+        datetime.utcnow().strftime("deploy-%Y%m%d%H%M%S")
+    print(f"▶ {pipeline} in {len(regions)} regions: {', '.join(regions)} (deployment {deployment}-<region>)")
+
+    def one(region: str) -> RegionResult:
+        env = region_env(region, deployment)
+        res = supervisor.run(
+            [sys.executable, "-m", "jeeves.cli", "pipelines", "run", pipeline, *args],
+            env=env, timeout=timeout, label=region,
+        )
+        return RegionResult(region, env["DEPLOYMENT_NAME"], env.get("DOMAIN", ""),
+                            res.exit_code, res.duration, res.output)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(regions)) as pool:
+        results = list(pool.map(one, regions))
+    print_summary(results, time.monotonic() - start)
+    return results
+
+
+def print_summary(results: list[RegionResult], wall: float) -> None:
+    """One row per region, then the wall time against the sequential total."""
+    print()
+    print(f"{'region':<16} {'status':<8} {'time':>8}  {'deployment':<36} domain")
+    for r in results:
+        status = "ok" if r.ok else ("timeout" if r.exit_code is None else f"exit {r.exit_code}")
+        print(f"{r.region:<16} {status:<8} {r.duration:7.1f}s  {r.deployment:<36} {r.domain or '-'}")
+    total = sum(r.duration for r in results)
+    print(f"\n{len(results)} regions in {wall:.1f}s wall time ({total:.1f}s if run one after another)")
+    for r in results:
+        if not r.ok:
+            last = r.output.strip().splitlines()[-1:] or ["(no output)"]
+            print(f"✘ {r.region}: {last[0]}")
@@ -0,0 +1,225 @@
+# jeeves/registry_mirror.py
+
+"""
+In-VPC pull-through registry mirror.
+
+With REGISTRY_MIRROR (or --registry-mirror) set, Rocket.Chat, Traefik and
+Helm microservice images are pulled from a mirror inside the deployment
+VPC. Each node then pulls from the mirror in parallel, and only the
+mirror's first pull of an image goes out to the public registry.
+
+  REGISTRY_MIRROR=true      launch or reuse the `jeeves-registry` node in the
+                            default VPC. It runs one registry:2 proxy per
+                            upstream in UPSTREAMS and is kept across
+                            deployments so its cache stays warm.
+  REGISTRY_MIRROR=10.0.1.5  use the mirror already running on that host,
+                            with the same ports (e.g. a local registry:2
+                            for testing).
+
+Docker nodes get the mirrors as REGISTRY_MIRRORS in their bootstrap env,
+followed by scripts/registry_mirror_client.sh. That snippet points the
+daemon's registry-mirrors at the docker.io proxy and pulls every other
+image through its registry's proxy. MicroK8s nodes get a
+containerd hosts.toml per upstream instead.
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+import time
+
+from botocore.exceptions import ClientError
+
+from .aws_helpers import latest_ubuntu_ami
+from .config import settings
+from . import fleet
+
+SCRIPTS_DIR   = pathlib.Path(__file__).parents[1] / "scripts"
+CLIENT_SCRIPT = SCRIPTS_DIR / "registry_mirror_client.sh"
+
+NAME           = "jeeves-registry"
+SECURITY_GROUP = "jeeves-registry"
+
+# registry host → (upstream URL, mirror port on the jeeves-registry node)
+UPSTREAMS = {
+    "docker.io":            ("https://registry-1.docker.io", 5000),
+    "registry.rocket.chat": ("https://registry.rocket.chat", 5001),
+    "ghcr.io":              ("https://ghcr.io", 5002),
+    "quay.io":              ("https://quay.io", 5003),
+}
+
+# containerd's `server` for each upstream; docker.io's differs from its API host
+_CONTAINERD_SERVER = {"docker.io": "https://docker.io"}
+
+MICROK8S_CERTS_D = "/var/snap/microk8s/current/args/certs.d"
+
+
+def mode(value: str | None = None, env=None) -> str | None:
+    """None (off), "node" (jeeves-registry) or the host of an existing mirror."""
+    env = os.environ if env is None else env
+    value = (value if value is not None else env.get("REGISTRY_MIRROR", "")).strip()
+    if value.lower() in ("", "0", "false", "no", "off"):
+        return None
+    if value.lower() in ("1", "true", "yes", "on", "node"):
+        return "node"
+    return value
+
+
+def mirrors(host: str) -> dict[str, str]:
+    """Mirror URL per registry host, for a mirror running on `host`."""
+    return {reg: f"http://{host}:{port}" for reg, (_, port) in UPSTREAMS.items()}
+
+
+def client_env(host: str) -> str:
+    """Export line for the Docker bootstrap scripts."""
+    spec = ",".join(f"{reg}={url}" for reg, url in mirrors(host).items())
+    return f"export REGISTRY_MIRRORS={spec}\n"
+
+
+def client_prefix(host: str | None = None) -> str:
+    """
+    Script text to prepend to a Docker bootstrap: its image-pull functions,
+    going through the mirror on `host` if given. Always needed, since the
+    bootstraps pull their images with them.
+    """
+    return (client_env(host) if host else "") + CLIENT_SCRIPT.read_text()
+
+
+def microk8s_script(host: str) -> str:
+    """Shell that makes containerd on a MicroK8s node pull through the mirror."""
+    lines = ["set -euo pipefail"]
+    for reg, url in mirrors(host).items():
+        server = _CONTAINERD_SERVER.get(reg, UPSTREAMS[reg][0])
+        lines += [
+            f"mkdir -p {MICROK8S_CERTS_D}/{reg}",
+            f"cat > {MICROK8S_CERTS_D}/{reg}/hosts.toml <<'EOF'",
+            f'server = "{server}"',
+            "",
+            f'[host."{url}"]',
+            '  capabilities = ["pull", "resolve"]',
+            "EOF",
+        ]
+    # containerd reads hosts.toml on every pull; no restart needed
+    return "\n".join(lines) + "\n"
+
+
+def preseed_images(env=None) -> list[str]:
+    """Images to cache on the mirror before nodes pull them."""
+    env = os.environ if env is None else env
+    images = []
+    if env.get("IMAGE") and env.get("RELEASE"):
+        images.append(f"{env['IMAGE']}:{env['RELEASE']}")
+    if env.get("TRAEFIK_RELEASE"):
+        images.append(f"traefik:{env['TRAEFIK_RELEASE']}")
+    images += [i.strip() for i in env.get("REGISTRY_PRESEED", "").split(",") if i.strip()]
+    return images
+
+
+def _security_group(ec2c, vpc_id: str) -> str:
+    sgs = ec2c.describe_security_groups(Filters=[
+        {"Name": "group-name", "Values": [SECURITY_GROUP]},
+        {"Name": "vpc-id",     "Values": [vpc_id]},
+    ])["SecurityGroups"]
+    if sgs:
+        return sgs[0]["GroupId"]
+    sg_id = ec2c.create_security_group(
+        GroupName=SECURITY_GROUP, Description="SSH + registry mirror from the VPC", VpcId=vpc_id,
+    )["GroupId"]
+    ec2c.create_tags(Resources=[sg_id], Tags=[
+        {"Key": "Name",    "Value": SECURITY_GROUP},
+        {"Key": "Project", "Value": "jeeves"},
+        {"Key": "Role",    "Value": "registry-sg"},
+    ])
+    cidr = ec2c.describe_vpcs(VpcIds=[vpc_id])["Vpcs"][0]["CidrBlock"]
+    ports = [p for _, p in UPSTREAMS.values()]
+    for perm in (
+        {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]},
+        {"IpProtocol": "tcp", "FromPort": min(ports), "ToPort": max(ports),
+         "IpRanges": [{"CidrIp": cidr}]},
+    ):
+        try:
+            ec2c.authorize_security_group_ingress(GroupId=sg_id, IpPermissions=[perm])
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "InvalidPermission.Duplicate":
+                raise
+    return sg_id
+
+
+def instance_type(env=None) -> str:
+    env = os.environ if env is None else env
+    return env.get("REGISTRY_INSTANCE_TYPE", "t3.medium")
+
+
+def ensure_node(ec2, ec2c, vpc_id: str, subnet_id: str, key_name: str,
+                key_path: str | pathlib.Path, images: list[str] | None = None,
+                env=None) -> str:
+    """
+    Launch or reuse the jeeves-registry node, bootstrap its proxies, cache
+    `images`, and return its private IP.
+    """
+    env = os.environ if env is None else env
+    inst = None
+    for r in ec2c.describe_instances(Filters=[
+        {"Name": "tag:Name",            "Values": [NAME]},
+        {"Name": "instance-state-name", "Values": ["pending", "running", "stopping", "stopped"]},
+    ])["Reservations"]:
+        for data in r["Instances"]:
+            inst = ec2.Instance(data["InstanceId"])
+            print(f"Reusing registry mirror {inst.id} ({data['State']['Name']})")
+            if data["State"]["Name"] == "stopping":
+                inst.wait_until_stopped()
+            if data["State"]["Name"] in ("stopping", "stopped"):
+                inst.start()
+            break
+        if inst:
+            break
+
+    if inst is None:
+        inst = ec2.create_instances(
+            ImageId=latest_ubuntu_ami(ec2c, settings.default_os_version),
+            InstanceType=instance_type(env),
+            MinCount=1, MaxCount=1,
+            KeyName=key_name,
+            NetworkInterfaces=[{
+                "SubnetId": subnet_id,
+                "DeviceIndex": 0,
+                "AssociatePublicIpAddress": True,
+                "Groups": [_security_group(ec2c, vpc_id)],
+            }],
+            BlockDeviceMappings=[{
+                # the image cache lives on the root volume
+                "DeviceName": "/dev/sda1",
+                "Ebs": {"VolumeSize": int(env.get("REGISTRY_VOLUME_GB", 100)),
+                        "VolumeType": "gp3", "DeleteOnTermination": True},
+            }],
+            TagSpecifications=[{
+                "ResourceType": "instance",
+                "Tags": [
+                    {"Key": "Name",    "Value": NAME},
+                    {"Key": "Project", "Value": "jeeves"},
+                    {"Key": "Role",    "Value": "registry-mirror"},
+                ],
+            }],
+            UserData="#!/usr/bin/env bash\nexit 0\n",
+        )[0]
+        print(f"Launching registry mirror {inst.id}…")
+    inst.wait_until_running()
+    inst.reload()
+
+    host = inst.public_ip_address
+    deadline = time.time() + 300
+    while not fleet.run_on_host(host, "true", key_path, timeout=15, label=NAME, stream=False).ok:
+        if time.time() > deadline:
+            raise TimeoutError(f"No SSH on {NAME} {host} after 300s")
+        time.sleep(5)
+
+    upstreams = ",".join(f"{reg}={url}={port}" for reg, (url, port) in UPSTREAMS.items())
+    header = (f"export MIRROR_UPSTREAMS={upstreams}\n"
+              f"export PRESEED_IMAGES={','.join(images or [])}\n")
+    fleet.check([fleet.run_on_host(
+        host, "sudo bash -s", key_path, timeout=1800, label=NAME,
+        input=header + (SCRIPTS_DIR / "registry_mirror_bootstrap.sh").read_text(),
+    )], "registry mirror bootstrap")
+    print(f"✔ Registry mirror ready on {inst.private_ip_address}")
+    return inst.private_ip_address
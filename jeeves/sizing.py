@@ -0,0 +1,263 @@
+# jeeves/sizing.py
+
+"""
+Sizing planner: from a target number of concurrent users to instance
+types, node counts, the MongoDB data volume and Rocket.Chat replicas.
+
+The capacity table has one row (tier) per deployment size. A plan takes
+the smallest tier whose `max_users` covers the target, then applies the
+environment on top, so any explicit setting still wins:
+
+  MONGO_INSTANCE_TYPE       MongoDB nodes (both pipelines)
+  RC_INSTANCE_TYPE          Rocket.Chat nodes (rc_mongo_docker)
+  LB_INSTANCE_TYPE          Traefik front node of a multi-node tier (rc_mongo_docker)
+  KUBERNETES_INSTANCE_TYPE  MicroK8s controller and workers (rc_microservices_helm)
+  RC_NODES, ROCKETCHAT_SCALE, WORKERS, MONGO_REPLICAS
+  MONGO_DATA_VOLUME, MONGO_DATA_SIZE_GB, MONGO_DATA_IOPS, MONGO_DATA_THROUGHPUT
+
+~/.jeeves/sizing.json overrides fields of the built-in tiers by name, or
+adds tiers:
+
+  {"tiers": {"m": {"max_users": 4000, "rc_type": "c7i.2xlarge"}}}
+
+calibrate() rewrites the tiers' max_users in that file from saved
+loadtest results. Without a target (no CONCURRENT_USERS) a plan is just
+the environment, with DEFAULT_INSTANCE_TYPE for every role, as before.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+from dataclasses import asdict, dataclass, fields, replace
+
+from .config import settings
+from .journal import deployment_dir, state_dir
+from .storage import StorageProfile
+
+
+@dataclass
+class Tier:
+    name: str
+    max_users: int
+    mongo_type: str
+    rc_type: str              # rc_mongo_docker Rocket.Chat nodes
+    rc_nodes: int
+    rc_replicas: int          # Rocket.Chat containers per app node
+    k8s_type: str             # rc_microservices_helm controller and workers
+    workers: int
+    mongo_replicas: int       # rc_microservices_helm read replicas
+    volume: str = "root"      # MONGO_DATA_VOLUME
+    volume_gb: int = 100
+    volume_iops: int | None = None
+    volume_throughput: int | None = None
+    lb_type: str = "c6i.large"  # rc_mongo_docker Traefik front node (one container)
+
+    def storage_env(self) -> dict[str, str]:
+        env = {"MONGO_DATA_VOLUME": self.volume, "MONGO_DATA_SIZE_GB": str(self.volume_gb)}
+        if self.volume_iops:
+            env["MONGO_DATA_IOPS"] = str(self.volume_iops)
+        if self.volume_throughput:
+            env["MONGO_DATA_THROUGHPUT"] = str(self.volume_throughput)
+        return env
+
+
+# One Rocket.Chat container (a single Node.js process) serves roughly 500
+# active users; MongoDB moves to memory-optimized types once the working
+# set outgrows general-purpose ones.
+CAPACITY = [
+    Tier("xs",    200, "t3.large",    "t3.large",    1,  2, "t3.xlarge",  1, 0, lb_type="t3.medium"),
+    Tier("s",    1000, "m6i.large",   "c6i.xlarge",  1,  4, "m6i.xlarge", 1, 0, "gp3", 100, 3000, 125),
+    Tier("m",    3000, "m6i.xlarge",  "c6i.2xlarge", 2,  4, "m6i.2xlarge", 2, 0, "gp3", 200, 6000, 250),
+    Tier("l",    7000, "r6i.2xlarge", "c6i.2xlarge", 4,  4, "m6i.2xlarge", 4, 2, "gp3", 500, 12000, 500,
+         lb_type="c6i.xlarge"),
+    Tier("xl",  15000, "r6i.4xlarge", "c6i.4xlarge", 6,  8, "m6i.4xlarge", 5, 2, "io2", 1000, 32000,
+         lb_type="c6i.xlarge"),
+]
+
+# A load test passes a tier's size when it meets both
+CALIBRATE_MAX_ERROR_RATE = 0.01
+CALIBRATE_MAX_P95_MS     = 1000.0
+
+
+def table_path() -> pathlib.Path:
+    return state_dir() / "sizing.json"
+
+
+def _read_overrides(path: pathlib.Path) -> dict:
+    try:
+        return json.loads(path.read_text()).get("tiers", {})
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        raise ValueError(f"{path} is not valid JSON: {e}") from e
+
+
+def load_table(path: pathlib.Path | None = None) -> list[Tier]:
+    """The built-in CAPACITY with sizing.json applied, smallest tier first."""
+    overrides = _read_overrides(path or table_path())
+    known = {f.name for f in fields(Tier)}
+    tiers = {t.name: t for t in CAPACITY}
+    for name, values in overrides.items():
+        unknown = set(values) - known
+        if unknown:
+            raise ValueError(f"sizing.json tier '{name}': unknown field(s) {', '.join(sorted(unknown))}")
+        if name in tiers:
+            tiers[name] = replace(tiers[name], **values)
+        else:
+            try:
+                tiers[name] = Tier(name=name, **values)
+            except TypeError as e:
+                raise ValueError(f"sizing.json tier '{name}': {e}") from e
+    return sorted(tiers.values(), key=lambda t: t.max_users)
+
+
+def pick_tier(users: int, table: list[Tier]) -> Tier:
+    for tier in table:
+        if users <= tier.max_users:
+            return tier
+    raise ValueError(f"No sizing tier covers {users} users (largest: '{table[-1].name}', "
+                     f"{table[-1].max_users}); add one in {table_path()}")
+
+
+@dataclass
+class Plan:
+    users: int | None
+    tier: str | None
+    mongo_type: str
+    rc_type: str
+    lb_type: str
+    k8s_type: str
+    rc_nodes: int | None          # None: the pipeline's own default
+    rc_replicas: int | None
+    workers: int | None
+    mongo_replicas: int | None
+    storage_defaults: dict
+    overridden: list
+
+    def instance_type(self, role: str) -> str:
+        """Instance type of a warm-pool role ("mongo" or "rocketchat")."""
+        return self.mongo_type if role == "mongo" else self.rc_type
+
+    def storage(self, env=None) -> StorageProfile:
+        """StorageProfile with the tier's volume as defaults for MONGO_DATA_*."""
+        env = os.environ if env is None else env
+        return StorageProfile.from_env({**self.storage_defaults, **env})
+
+    def describe(self) -> str:
+        if self.tier is None:
+            return "no CONCURRENT_USERS target; instance types from the environment"
+        s = f"{self.users} users → tier '{self.tier}'"
+        return s + (f" (overridden: {', '.join(self.overridden)})" if self.overridden else "")
+
+    def save(self, deployment: str) -> None:
+        """Record the plan a deployment was built with, for loadtest results."""
+        path = deployment_dir(deployment) / "sizing.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(asdict(self), indent=2))
+
+
+def plan(users: int | None = None, env=None, table: list[Tier] | None = None) -> Plan:
+    """Sizing for `users` concurrent users; see the module docstring."""
+    env = os.environ if env is None else env
+    tier = pick_tier(users, table or load_table()) if users else None
+    default_type = settings.default_instance_type
+    overridden = []
+
+    def pick(key: str, tier_value, fallback, cast=str):
+        if env.get(key):
+            if tier is not None:
+                overridden.append(key)
+            return cast(env[key])
+        return tier_value if tier is not None else fallback
+
+    return Plan(
+        users=users,
+        tier=tier.name if tier else None,
+        mongo_type=pick("MONGO_INSTANCE_TYPE", tier and tier.mongo_type, default_type),
+        rc_type=pick("RC_INSTANCE_TYPE", tier and tier.rc_type, default_type),
+        lb_type=pick("LB_INSTANCE_TYPE", tier and tier.lb_type, default_type),
+        k8s_type=pick("KUBERNETES_INSTANCE_TYPE", tier and tier.k8s_type, default_type),
+        rc_nodes=pick("RC_NODES", tier and tier.rc_nodes, None, int),
+        rc_replicas=pick("ROCKETCHAT_SCALE", tier and tier.rc_replicas, None, int),
+        workers=pick("WORKERS", tier and tier.workers, None, int),
+        mongo_replicas=pick("MONGO_REPLICAS", tier and tier.mongo_replicas, None, int),
+        storage_defaults=tier.storage_env() if tier else {},
+        overridden=overridden + [k for k in (tier.storage_env() if tier else {}) if env.get(k)],
+    )
+
+
+def plan_from_env(env=None) -> Plan:
+    """plan() for CONCURRENT_USERS, if set."""
+    env = os.environ if env is None else env
+    users = int(env.get("CONCURRENT_USERS") or 0)
+    return plan(users or None, env)
+
+
+def load_applied(deployment: str) -> dict | None:
+    """The plan saved by Plan.save() for `deployment`, if any."""
+    try:
+        return json.loads((deployment_dir(deployment) / "sizing.json").read_text())
+    except (OSError, ValueError):
+        return None
+
+
+# ———————————
+# Calibration
+# ———————————
+def _passed(result: dict) -> bool:
+    deliver = result.get("operations", {}).get("deliver", {})
+    return (result.get("error_rate", 1.0) <= CALIBRATE_MAX_ERROR_RATE
+            and result.get("users_active") == result.get("profile", {}).get("users")
+            and deliver.get("p95_ms", float("inf")) <= CALIBRATE_MAX_P95_MS)
+
+
+def calibrate(results: list[dict], path: pathlib.Path | None = None,
+              write: bool = True) -> list[tuple[str, int, int, str]]:
+    """
+    Adjust each tier's max_users from loadtest results of deployments that
+    were built with it:
+
+      - a passing run at more users than max_users raises it to that count;
+      - a failing run at or below max_users lowers it to the largest passing
+        count below the failure, or to 80% of the failing count.
+
+    Returns (tier, old, new, reason) per change; writes them to sizing.json.
+    """
+    path = path or table_path()
+    table = {t.name: t for t in load_table(path)}
+    by_tier: dict[str, list[dict]] = {}
+    for r in results:
+        name = (r.get("sizing") or {}).get("tier")
+        if name in table:
+            by_tier.setdefault(name, []).append(r)
+
+    changes = []
+    for name, runs in by_tier.items():
+        current = table[name].max_users
+        passed = [r["profile"]["users"] for r in runs if _passed(r)]
+        failed = [r["profile"]["users"] for r in runs if not _passed(r)]
+        new, reason = current, ""
+        if passed and max(passed) > new:
+            new, reason = max(passed), f"passed at {max(passed)} users"
+        if failed and min(failed) <= new:
+            below = [u for u in passed if u < min(failed)]
+            new = max(below) if below else int(min(failed) * 0.8)
+            reason = f"failed at {min(failed)} users"
+        if new != current:
+            changes.append((name, current, new, reason))
+
+    if changes and write:
+        try:
+            data = json.loads(path.read_text())
+        except FileNotFoundError:
+            data = {}
+        tiers = data.setdefault("tiers", {})
+        for name, _, new, _ in changes:
+            tiers.setdefault(name, {})["max_users"] = new
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=2))
+        os.replace(tmp, path)
+    return changes
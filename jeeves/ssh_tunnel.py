@@ -0,0 +1,262 @@
+# jeeves/ssh_tunnel.py
+
+"""
+In-process SSH port forwarding.
+
+Replaces the detached `ssh -fN -L ...` daemon with a tunnel that lives
+inside the Jeeves process on one persistent paramiko transport. The
+tunnel listens on a free local port, is verified before start() returns,
+and reconnects on its own if the SSH session drops mid-run.
+"""
+
+from __future__ import annotations
+
+import atexit
+import pathlib
+import select
+import socket
+import threading
+import time
+
+import paramiko
+
+
+def free_local_port(preferred: int | None = None) -> int:
+    """
+    Return `preferred` if it can be bound on 127.0.0.1, otherwise any
+    free ephemeral port.
+    """
+    for port in ([preferred] if preferred else []) + [0]:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            try:
+                s.bind(("127.0.0.1", port))
+            except OSError:
+                continue
+            return s.getsockname()[1]
+    raise RuntimeError("No free local port available")
+
+
+class SSHTunnel:
+    """
+    Forward 127.0.0.1:<local_port> to <remote_host>:<remote_port> as seen
+    from `host`, over a single SSH connection authenticated with `key_path`.
+
+    Usage:
+        tunnel = SSHTunnel(ctrl_pub, key_path, remote_port=16443).start()
+        ... use tunnel.local_port ...
+        tunnel.stop()
+    """
+
+    def __init__(self, host: str, key_path: str | pathlib.Path, remote_port: int,
+                 remote_host: str = "127.0.0.1", user: str = "ubuntu",
+                 local_port: int | None = None, keepalive: int = 15):
+        self.host = host
+        self.key_path = str(pathlib.Path(key_path).expanduser())
+        self.remote_host = remote_host
+        self.remote_port = remote_port
+        self.user = user
+        self.keepalive = keepalive
+        self.local_port = free_local_port(local_port)
+
+        self._client: paramiko.SSHClient | None = None
+        self._listener: socket.socket | None = None
+        # Guards the reconnect: one thread reconnects, the others wait for it
+        self._cond = threading.Condition()
+        self._reconnecting = False
+        self._stopped = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self.reconnects = 0
+
+    # ———————————
+    # SSH session
+    # ———————————
+    def _connect(self, timeout: float = 30) -> None:
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            self.host,
+            username=self.user,
+            key_filename=self.key_path,
+            timeout=timeout,
+            banner_timeout=timeout,
+            auth_timeout=timeout,
+            look_for_keys=False,
+            allow_agent=False,
+        )
+        client.get_transport().set_keepalive(self.keepalive)
+        old, self._client = self._client, client
+        if old is not None:
+            old.close()
+
+    def _transport(self) -> paramiko.Transport:
+        """
+        Return a live transport, reconnecting if the session has died. The
+        reconnect runs outside the lock; other callers wait for its outcome.
+        """
+        with self._cond:
+            while True:
+                transport = self._client.get_transport() if self._client else None
+                if transport is not None and transport.is_active():
+                    return transport
+                if self._stopped.is_set():
+                    raise RuntimeError("SSH tunnel stopped")
+                if not self._reconnecting:
+                    self._reconnecting = True
+                    break
+                self._cond.wait(1.0)
+        print(f"🔁 SSH tunnel to {self.host} dropped, reconnecting…")
+        try:
+            self._reconnect()
+        finally:
+            with self._cond:
+                self._reconnecting = False
+                self._cond.notify_all()
+        return self._client.get_transport()
+
+    def _reconnect(self) -> None:
+        delay = 0.5
+        while not self._stopped.is_set():
+            try:
+                self._connect()
+                self.reconnects += 1
+                print(f"✅ SSH tunnel to {self.host} re-established")
+                return
+            except (OSError, paramiko.SSHException) as e:
+                print(f"⚠️  Tunnel reconnect to {self.host} failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, 10)
+        raise RuntimeError("SSH tunnel stopped")
+
+    def is_active(self) -> bool:
+        transport = self._client.get_transport() if self._client else None
+        return bool(transport and transport.is_active())
+
+    # ———————————
+    # Forwarding
+    # ———————————
+    def _open_channel(self, src: tuple) -> paramiko.Channel:
+        return self._transport().open_channel(
+            "direct-tcpip", (self.remote_host, self.remote_port), src, timeout=10
+        )
+
+    def _forward(self, sock: socket.socket) -> None:
+        try:
+            chan = self._open_channel(sock.getpeername())
+        except Exception as e:
+            print(f"⚠️  Tunnel could not open channel to {self.remote_host}:{self.remote_port}: {e}")
+            sock.close()
+            return
+        try:
+            while not self._stopped.is_set():
+                r, _, _ = select.select([sock, chan], [], [], 1.0)
+                if sock in r:
+                    data = sock.recv(65536)
+                    if not data:
+                        break
+                    chan.sendall(data)
+                if chan in r:
+                    data = chan.recv(65536)
+                    if not data:
+                        break
+                    sock.sendall(data)
+        except OSError:
+            pass
+        finally:
+            chan.close()
+            sock.close()
+
+    def _accept_loop(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                if self._stopped.is_set():
+                    return
+                continue
+            threading.Thread(target=self._forward, args=(sock,), daemon=True).start()
+
+    def _watchdog(self) -> None:
+        # Reconnect proactively so the next client doesn't pay for it.
+        while not self._stopped.wait(2.0):
+            if not self.is_active():
+                try:
+                    self._transport()
+                except RuntimeError:
+                    return
+
+    def _verify(self, deadline: float) -> None:
+        """
+        Prove the forward path works by opening a channel to the remote port.
+        'Connect failed' means nothing listens there yet; retry until `deadline`.
+        """
+        delay = 0.5
+        while True:
+            try:
+                self._open_channel(("127.0.0.1", self.local_port)).close()
+                print(f"✅ Tunnel verified: localhost:{self.local_port} → {self.host}:{self.remote_port}")
+                return
+            except paramiko.ChannelException as e:
+                if e.code != paramiko.common.OPEN_FAILED_CONNECT_FAILED:
+                    raise RuntimeError(f"SSH tunnel to {self.host} refused forwarding: {e}") from e
+                if time.time() + delay > deadline:
+                    raise RuntimeError(
+                        f"SSH tunnel to {self.host} is up but nothing listens on "
+                        f"{self.remote_host}:{self.remote_port}") from e
+            time.sleep(delay)
+            delay = min(delay * 2, 10)
+
+    # ———————————
+    # Lifecycle
+    # ———————————
+    def start(self, timeout: float = 60) -> "SSHTunnel":
+        """
+        Connect, listen locally and wait (within `timeout` seconds in all)
+        until a channel to the remote port opens.
+        """
+        deadline = time.time() + timeout
+        delay = 0.5
+        while True:
+            try:
+                self._connect()
+                break
+            except (OSError, paramiko.SSHException) as e:
+                if time.time() + delay > deadline:
+                    raise RuntimeError(f"Could not open SSH tunnel to {self.host}: {e}") from e
+                time.sleep(delay)
+                delay = min(delay * 2, 10)
+
+        try:
+            self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._listener.bind(("127.0.0.1", self.local_port))
+            self._listener.listen(64)
+            self._verify(deadline)
+        except Exception:
+            # any failure (bind, SSHException from open_channel, …) releases
+            # the listener and the transport
+            self.stop()
+            raise
+
+        for target in (self._accept_loop, self._watchdog):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+        atexit.register(self.stop)
+        return self
+
+    def stop(self) -> None:
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if self._listener is not None:
+            self._listener.close()
+        if self._client is not None:
+            self._client.close()
+        for t in self._threads:
+            t.join(timeout=3)
+
+    def __enter__(self) -> "SSHTunnel":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,268 @@
+# jeeves/storage.py
+
+"""
+Storage profiles for MongoDB nodes.
+
+A profile says where mongod keeps its data: on the root volume (the old
+behaviour), on a dedicated gp3 or io2 EBS volume with provisioned IOPS and
+throughput, or on the instance's local NVMe instance store. Profiles are
+validated against the instance type before anything is launched, and
+scripts/mount_data_volume.sh formats and mounts the device on the node.
+
+A gp3/io2 data volume can also be created from an EBS snapshot of another
+deployment's data volume (see the mongo_snapshot pipeline), so a new
+environment starts with that dataset instead of an empty database.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass
+
+from .aws_helpers import instance_type_info
+
+KINDS = ("root", "gp3", "io2", "instance-store")
+
+# How a volume restored from a snapshot is initialized before mongod starts:
+#   fsr  – Fast Snapshot Restore in the launch AZ (fully initialized at creation)
+#   read – read every block with parallel readers on the node
+#   none – lazy loading; first reads of each block go to S3
+PREWARM_MODES = ("fsr", "read", "none")
+
+# Device name requested for the data volume; on Nitro instances it shows up
+# as /dev/nvmeXn1 and is located by volume id instead.
+DATA_DEVICE = "/dev/sdf"
+
+# AWS limits per volume type: (min size, max size, min iops, max iops, max iops per GiB)
+_EBS_LIMITS = {
+    "gp3": (1, 16384, 3000, 16000, 500),
+    "io2": (4, 65536, 100, 256000, 1000),
+}
+_GP3_THROUGHPUT = (125, 1000)   # MiB/s
+_GP3_MAX_THROUGHPUT_PER_IOPS = 0.25
+
+
+@dataclass
+class StorageProfile:
+    kind: str = "root"
+    size_gb: int = 100
+    iops: int | None = None
+    throughput: int | None = None          # MiB/s, gp3 only
+    mount_point: str = "/var/lib/mongodb"
+    snapshot: str | None = None            # snapshot id or Name tag to seed the volume from
+    prewarm: str = "read"
+    snapshot_id: str | None = None         # set by resolve_snapshot()
+    snapshot_size_gb: int | None = None
+
+    @classmethod
+    def from_env(cls, env=None) -> "StorageProfile":
+        """
+        Build a profile from MONGO_DATA_VOLUME (root|gp3|io2|instance-store),
+        MONGO_DATA_SIZE_GB, MONGO_DATA_IOPS, MONGO_DATA_THROUGHPUT,
+        MONGO_DBPATH, MONGO_DATA_SNAPSHOT and MONGO_DATA_PREWARM.
+        """
+        env = os.environ if env is None else env
+
+        def num(key: str) -> int | None:
+            return int(env[key]) if env.get(key) else None
+
+        return cls(
+            kind=env.get("MONGO_DATA_VOLUME", "root").lower(),
+            size_gb=num("MONGO_DATA_SIZE_GB") or 100,
+            iops=num("MONGO_DATA_IOPS"),
+            throughput=num("MONGO_DATA_THROUGHPUT"),
+            mount_point=env.get("MONGO_DBPATH", "/var/lib/mongodb"),
+            snapshot=env.get("MONGO_DATA_SNAPSHOT") or None,
+            prewarm=env.get("MONGO_DATA_PREWARM", "read").lower(),
+        )
+
+    @property
+    def dedicated(self) -> bool:
+        return self.kind != "root"
+
+    @property
+    def seeded(self) -> bool:
+        return self.snapshot is not None
+
+    def resolve_snapshot(self, ec2_client) -> None:
+        """
+        Look up `snapshot` (an id, or the Name tag of a completed snapshot
+        owned by this account, newest first) and record its id and size.
+        """
+        if not self.seeded or self.snapshot_id:
+            return
+        if self.snapshot.startswith("snap-"):
+            snaps = ec2_client.describe_snapshots(SnapshotIds=[self.snapshot])["Snapshots"]
+        else:
+            snaps = ec2_client.describe_snapshots(OwnerIds=["self"], Filters=[
+                {"Name": "tag:Name", "Values": [self.snapshot]},
+                {"Name": "status",   "Values": ["completed"]},
+            ])["Snapshots"]
+        if not snaps:
+            raise ValueError(f"No completed EBS snapshot named '{self.snapshot}'")
+        snap = max(snaps, key=lambda s: s["StartTime"])
+        if snap["State"] != "completed":
+            raise ValueError(f"Snapshot {snap['SnapshotId']} is {snap['State']}, not completed")
+        self.snapshot_id = snap["SnapshotId"]
+        self.snapshot_size_gb = snap["VolumeSize"]
+        # the restored volume can grow but not shrink
+        self.size_gb = max(self.size_gb, self.snapshot_size_gb)
+
+    def validate(self, ec2_client, instance_type: str) -> None:
+        """
+        Raise ValueError if the profile is not valid on its own or cannot
+        be driven by `instance_type` (no instance store, or more IOPS or
+        throughput than the instance's EBS bandwidth allows). A seed
+        snapshot is resolved here as well.
+        """
+        if self.kind not in KINDS:
+            raise ValueError(f"MONGO_DATA_VOLUME must be one of {', '.join(KINDS)}, got '{self.kind}'")
+        if self.seeded:
+            if self.kind not in _EBS_LIMITS:
+                raise ValueError("MONGO_DATA_SNAPSHOT needs MONGO_DATA_VOLUME=gp3 or io2")
+            if self.prewarm not in PREWARM_MODES:
+                raise ValueError(
+                    f"MONGO_DATA_PREWARM must be one of {', '.join(PREWARM_MODES)}, got '{self.prewarm}'"
+                )
+            self.resolve_snapshot(ec2_client)
+        if not self.dedicated:
+            return
+
+        info = instance_type_info(ec2_client, instance_type)
+
+        if self.kind == "instance-store":
+            if not info["instance_storage_gb"] or not info["instance_store_nvme"]:
+                raise ValueError(
+                    f"{instance_type} has no NVMe instance store; pick a type such as "
+                    "m6id, r6id, i4i or c6id, or use a gp3/io2 data volume"
+                )
+            return
+
+        min_size, max_size, min_iops, max_iops, per_gb = _EBS_LIMITS[self.kind]
+        if not min_size <= self.size_gb <= max_size:
+            raise ValueError(f"{self.kind} size must be {min_size}-{max_size} GiB, got {self.size_gb}")
+        if self.kind == "io2" and self.iops is None:
+            raise ValueError("io2 needs MONGO_DATA_IOPS")
+        iops = self.iops or min_iops
+        if not min_iops <= iops <= max_iops:
+            raise ValueError(f"{self.kind} IOPS must be {min_iops}-{max_iops}, got {iops}")
+        if iops > per_gb * self.size_gb and iops > min_iops:
+            raise ValueError(
+                f"{iops} IOPS needs at least {-(-iops // per_gb)} GiB of {self.kind} "
+                f"({per_gb} IOPS/GiB), got {self.size_gb}"
+            )
+
+        if self.throughput is not None:
+            if self.kind != "gp3":
+                raise ValueError("MONGO_DATA_THROUGHPUT only applies to gp3")
+            lo, hi = _GP3_THROUGHPUT
+            if not lo <= self.throughput <= hi:
+                raise ValueError(f"gp3 throughput must be {lo}-{hi} MiB/s, got {self.throughput}")
+            if self.throughput > iops * _GP3_MAX_THROUGHPUT_PER_IOPS:
+                raise ValueError(
+                    f"gp3 throughput {self.throughput} MiB/s needs at least "
+                    f"{int(self.throughput / _GP3_MAX_THROUGHPUT_PER_IOPS)} IOPS"
+                )
+
+        if info["ebs_max_iops"] and iops > info["ebs_max_iops"]:
+            raise ValueError(
+                f"{instance_type} can drive at most {info['ebs_max_iops']} EBS IOPS, profile asks for {iops}"
+            )
+        if info["ebs_max_throughput"] and (self.throughput or 0) > info["ebs_max_throughput"]:
+            raise ValueError(
+                f"{instance_type} can drive at most {info['ebs_max_throughput']:.0f} MB/s of EBS "
+                f"throughput, profile asks for {self.throughput}"
+            )
+
+    def block_device_mappings(self) -> list[dict]:
+        """Extra BlockDeviceMappings for create_instances (none for root/instance store)."""
+        if self.kind not in _EBS_LIMITS:
+            return []
+        ebs = {
+            "VolumeSize":          self.size_gb,
+            "VolumeType":          self.kind,
+            "DeleteOnTermination": True,
+        }
+        if self.iops:
+            ebs["Iops"] = self.iops
+        if self.throughput:
+            ebs["Throughput"] = self.throughput
+        if self.snapshot_id:
+            ebs["SnapshotId"] = self.snapshot_id
+        return [{"DeviceName": DATA_DEVICE, "Ebs": ebs}]
+
+    def enable_fast_restore(self, ec2_client, availability_zone: str, timeout: int = 3600) -> bool:
+        """
+        Enable Fast Snapshot Restore for the seed snapshot in
+        `availability_zone` and wait until it is usable. Returns True if
+        this call enabled it (so the caller should disable it again once
+        the volume exists), False if it was already on.
+        """
+        filters = [
+            {"Name": "snapshot-id",       "Values": [self.snapshot_id]},
+            {"Name": "availability-zone", "Values": [availability_zone]},
+        ]
+
+        def state() -> str:
+            found = ec2_client.describe_fast_snapshot_restores(Filters=filters)["FastSnapshotRestores"]
+            return found[0]["State"] if found else "disabled"
+
+        enabled_here = False
+        if state() in ("disabled", "disabling"):
+            ec2_client.enable_fast_snapshot_restores(
+                AvailabilityZones=[availability_zone], SourceSnapshotIds=[self.snapshot_id]
+            )
+            enabled_here = True
+        deadline = time.time() + timeout
+        while (current := state()) != "enabled":
+            if time.time() > deadline:
+                raise TimeoutError(
+                    f"Fast Snapshot Restore for {self.snapshot_id} in {availability_zone} "
+                    f"still '{current}' after {timeout}s; set MONGO_DATA_PREWARM=read instead"
+                )
+            print(f"… Fast Snapshot Restore for {self.snapshot_id} in {availability_zone}: {current}", flush=True)
+            time.sleep(30)
+        return enabled_here
+
+    def disable_fast_restore(self, ec2_client, availability_zone: str) -> None:
+        """Stop paying for Fast Snapshot Restore once the seeded volume exists."""
+        ec2_client.disable_fast_snapshot_restores(
+            AvailabilityZones=[availability_zone], SourceSnapshotIds=[self.snapshot_id]
+        )
+
+    def data_volume_id(self, instance) -> str | None:
+        """EBS volume id of the data volume attached to a (reloaded) ec2.Instance."""
+        for bdm in instance.block_device_mappings or []:
+            if bdm.get("DeviceName") == DATA_DEVICE:
+                return bdm.get("Ebs", {}).get("VolumeId")
+        return None
+
+    def mount_env(self, instance=None) -> str:
+        """
+        Export lines for scripts/mount_data_volume.sh, plus MONGO_SEEDED for
+        mongodb_bootstrap.sh when the volume comes from a snapshot.
+        """
+        lines = [
+            f"export DATA_VOLUME_KIND={self.kind}",
+            f"export MONGO_DBPATH={self.mount_point}",
+        ]
+        if instance is not None and self.kind in _EBS_LIMITS:
+            lines.append(f"export DATA_VOLUME_ID={self.data_volume_id(instance) or ''}")
+        if self.seeded:
+            # with fsr the volume is already initialized
+            lines.append(f"export DATA_PREWARM={'true' if self.prewarm == 'read' else 'false'}")
+            lines.append("export MONGO_SEEDED=true")
+        return "\n".join(lines) + "\n"
+
+    def describe(self) -> str:
+        if self.kind == "root":
+            return "root volume"
+        if self.kind == "instance-store":
+            return f"NVMe instance store at {self.mount_point}"
+        extra = f", {self.iops or _EBS_LIMITS[self.kind][2]} IOPS"
+        if self.kind == "gp3":
+            extra += f", {self.throughput or _GP3_THROUGHPUT[0]} MiB/s"
+        if self.seeded:
+            extra += f", from {self.snapshot_id or self.snapshot} (prewarm: {self.prewarm})"
+        return f"{self.size_gb} GiB {self.kind}{extra} at {self.mount_point}"
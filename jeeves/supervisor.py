@@ -0,0 +1,269 @@
+# jeeves/supervisor.py
+
+"""
+Supervised execution of external commands (ssh, terraform, kubectl, helm).
+
+Every command runs in its own process group, so a timeout, Ctrl-C or
+interpreter exit kills the whole tree (terraform providers, ssh
+multiplexers) instead of leaving it behind. Concurrency is capped per
+tool, output is kept in a bounded tail buffer, and each command's exit
+code, duration and peak RSS are recorded in `history` (the last
+MAX_HISTORY commands, without their output).
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, replace
+
+# Default number of concurrent processes per tool; override with
+# JEEVES_MAX_<TOOL>, e.g. JEEVES_MAX_SSH=32. Unlisted tools are not capped.
+TOOL_LIMITS = {
+    "ssh":       16,
+    "terraform": 1,     # one state file, one writer
+    "helm":      4,
+    "kubectl":   8,
+}
+
+# Output kept per command; older lines are dropped first
+MAX_OUTPUT_BYTES = 1 << 20
+
+# Commands kept in `history`
+MAX_HISTORY = 2000
+
+# Seconds between SIGTERM and SIGKILL when stopping a process group
+KILL_GRACE = 5.0
+
+_print_lock = threading.Lock()
+_semaphores: dict[str, threading.BoundedSemaphore] = {}
+_semaphores_lock = threading.Lock()
+_live: dict[int, list[str]] = {}        # pgid → cmd of running commands
+_live_lock = threading.Lock()
+
+history: deque["CommandResult"] = deque(maxlen=MAX_HISTORY)
+
+
+@dataclass
+class CommandResult:
+    cmd: list[str]
+    exit_code: int | None       # None when the command timed out
+    duration: float
+    peak_rss_kb: int            # peak RSS of the largest process in the command's tree
+    output: str = ""            # tail of stdout+stderr, at most MAX_OUTPUT_BYTES
+    truncated: bool = False
+    started: float = 0.0        # wall-clock start (time.time())
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0
+
+    @property
+    def tool(self) -> str:
+        return os.path.basename(self.cmd[0])
+
+
+def _semaphore(tool: str) -> threading.BoundedSemaphore | None:
+    limit = int(os.environ.get(f"JEEVES_MAX_{tool.upper()}", TOOL_LIMITS.get(tool, 0)))
+    if limit <= 0:
+        return None
+    with _semaphores_lock:
+        if tool not in _semaphores:
+            _semaphores[tool] = threading.BoundedSemaphore(limit)
+        return _semaphores[tool]
+
+
+def _emit(label: str | None, line: str) -> None:
+    with _print_lock:
+        sys.stdout.write(f"[{label}] {line}" if label else line)
+        if not line.endswith("\n"):
+            sys.stdout.write("\n")
+        sys.stdout.flush()
+
+
+def _hwm_kb(pid: int) -> int:
+    """VmHWM (peak RSS since exec) of a live process, 0 where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def _rss_kb(usage) -> int:
+    # ru_maxrss covers the child and its reaped descendants (bash -c …), but
+    # also the forked interpreter before exec; KiB on Linux, bytes on macOS
+    return usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+
+
+def _exited(pid: int) -> bool:
+    """True once child `pid` has exited, without reaping it."""
+    try:
+        return os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    except ChildProcessError:
+        return True
+
+
+def _kill_group(pgid: int, grace: float = KILL_GRACE) -> None:
+    """
+    SIGTERM the process group led by child `pgid`, give the leader `grace`
+    seconds to exit, then SIGKILL whatever is left of the group.
+    """
+    try:
+        os.killpg(pgid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    deadline = time.monotonic() + grace
+    while time.monotonic() < deadline and not _exited(pgid):
+        time.sleep(0.1)
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+@atexit.register
+def _kill_all() -> None:
+    """Last line of defence: no command outlives the Jeeves process."""
+    with _live_lock:
+        pgids = list(_live)
+    for pgid in pgids:
+        _kill_group(pgid, grace=1.0)
+
+
+def run(cmd: list[str], *, timeout: float | None = 600, cwd: str | None = None,
+        env: dict | None = None, input: str | None = None, check: bool = False,
+        stream: bool = True, label: str | None = None,
+        max_output: int = MAX_OUTPUT_BYTES) -> CommandResult:
+    """
+    Run `cmd` to completion under supervision, optionally feeding `input`
+    on stdin. Output is streamed (prefixed with `[label]` if given) unless
+    `stream` is False, and its tail is returned in the result.
+
+    On timeout the process group is killed; with `check` this raises
+    subprocess.TimeoutExpired, and a non-zero exit raises
+    subprocess.CalledProcessError, as subprocess.run would.
+    """
+    cmd = [str(c) for c in cmd]
+    tool = os.path.basename(cmd[0])
+    sem = _semaphore(tool)
+    if sem:
+        sem.acquire()
+    try:
+        return _run(cmd, timeout, cwd, env, input, check, stream, label, max_output)
+    finally:
+        if sem:
+            sem.release()
+
+
+def _run(cmd, timeout, cwd, env, input, check, stream, label, max_output) -> CommandResult:
+    started = time.time()
+    start = time.monotonic()
+    proc = subprocess.Popen(
+        cmd, cwd=cwd, env=env,
+        stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        text=True, errors="replace",
+        start_new_session=True,        # own process group → killpg reaches the whole tree
+    )
+    pgid = proc.pid
+    with _live_lock:
+        _live[pgid] = cmd
+
+    if input is not None:
+        def feed():
+            try:
+                proc.stdin.write(input)
+                proc.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+        threading.Thread(target=feed, daemon=True).start()
+
+    tail: deque[str] = deque()
+    size = 0
+    truncated = False
+
+    def pump():
+        nonlocal size, truncated
+        for line in proc.stdout:
+            tail.append(line)
+            size += len(line)
+            while size > max_output and len(tail) > 1:
+                size -= len(tail.popleft())
+                truncated = True
+            if stream:
+                _emit(label, line)
+    reader = threading.Thread(target=pump, daemon=True)
+    reader.start()
+
+    exit_code = None
+    hwm_kb = rusage_kb = 0
+    deadline = None if timeout is None else start + timeout
+    try:
+        while True:
+            # VmHWM only grows, so the last sample before exit is the peak
+            hwm_kb = max(hwm_kb, _hwm_kb(proc.pid))
+            pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+            if pid:
+                exit_code = os.waitstatus_to_exitcode(status)
+                rusage_kb = _rss_kb(usage)
+                proc.returncode = exit_code
+                break
+            if deadline is not None and time.monotonic() > deadline:
+                if stream:
+                    _emit(label, f"⏱ {os.path.basename(cmd[0])} timed out after {timeout}s")
+                break
+            time.sleep(0.05)
+    finally:
+        if exit_code is None:
+            # timeout or KeyboardInterrupt: stop the whole group, then reap it
+            _kill_group(pgid)
+            try:
+                _, _, usage = os.wait4(proc.pid, 0)
+                rusage_kb = _rss_kb(usage)
+            except ChildProcessError:
+                pass
+            proc.returncode = -signal.SIGKILL
+        else:
+            # the leader exited; don't let stragglers it left behind live on
+            try:
+                os.killpg(pgid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        with _live_lock:
+            _live.pop(pgid, None)
+        reader.join(timeout=5)
+
+    result = CommandResult(cmd, exit_code, time.monotonic() - start, max(hwm_kb, rusage_kb),
+                           "".join(tail), truncated, started)
+    history.append(replace(result, output=""))
+
+    if check:
+        if exit_code is None:
+            raise subprocess.TimeoutExpired(cmd, timeout, output=result.output)
+        if exit_code != 0:
+            raise subprocess.CalledProcessError(exit_code, cmd, output=result.output)
+    return result
+
+
+def print_summary(results: list[CommandResult] | None = None) -> None:
+    """Table of exit code, duration and peak RSS per command (default: `history`)."""
+    results = history if results is None else results
+    if not results:
+        return
+    print()
+    print(f"{'command':<40} {'exit':>4} {'time':>8} {'peak RSS':>10}")
+    for r in results:
+        cmd = " ".join(r.cmd)
+        cmd = cmd if len(cmd) <= 40 else cmd[:37] + "…"
+        code = "T/O" if r.exit_code is None else str(r.exit_code)
+        print(f"{cmd:<40} {code:>4} {r.duration:7.1f}s {r.peak_rss_kb / 1024:8.1f}MB")
@@ -0,0 +1,360 @@
+# jeeves/verify.py
+
+"""
+Post-deploy verification of a Rocket.Chat endpoint, run from the runner.
+
+The probes run concurrently:
+
+  api_info   GET /api/info answers 200 with JSON carrying a version
+  health     GET /health answers 200
+  websocket  an Upgrade request on /websocket answers 101 with the right
+             Sec-WebSocket-Accept
+  tls        the certificate chain verifies for the hostname and does not
+             expire within `min_cert_days`
+  latency    `requests` GETs of /api/info over `concurrency` keep-alive
+             connections; p50/p95/p99 and errors, p95 must stay under
+             `max_p95_ms`
+
+StandInServer is a local stand-in that answers the same endpoints, so the
+suite (and pipelines calling it) can be exercised without a deployment.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import http.client
+import http.server
+import json
+import os
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+from .history import percentile
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+@dataclass
+class ProbeResult:
+    name: str
+    ok: bool
+    detail: str
+    seconds: float = 0.0
+    metrics: dict = field(default_factory=dict)
+
+
+@dataclass
+class Target:
+    scheme: str
+    host: str
+    port: int
+
+    @classmethod
+    def parse(cls, url: str) -> "Target":
+        parts = urlsplit(url if "://" in url else f"https://{url}")
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Cannot verify '{url}': need an http(s) URL")
+        return cls(parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+
+    @property
+    def tls(self) -> bool:
+        return self.scheme == "https"
+
+    def connection(self, timeout: float, context: ssl.SSLContext | None = None) -> http.client.HTTPConnection:
+        if self.tls:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout,
+                                               context=context or ssl.create_default_context())
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+
+def _get(target: Target, path: str, timeout: float, context=None) -> tuple[int, bytes]:
+    conn = target.connection(timeout, context)
+    try:
+        conn.request("GET", path, headers={"User-Agent": "jeeves-verify"})
+        resp = conn.getresponse()
+        return resp.status, resp.read()
+    finally:
+        conn.close()
+
+
+def _timed(name: str, fn) -> ProbeResult:
+    start = time.monotonic()
+    try:
+        result = fn()
+    except (OSError, ssl.SSLError, http.client.HTTPException, ValueError) as e:
+        result = ProbeResult(name, False, f"{type(e).__name__}: {e}")
+    result.seconds = time.monotonic() - start
+    return result
+
+
+# ———————————
+# Probes
+# ———————————
+def probe_api_info(target: Target, timeout: float = 10.0, context=None) -> ProbeResult:
+    status, body = _get(target, "/api/info", timeout, context)
+    if status != 200:
+        return ProbeResult("api_info", False, f"HTTP {status}")
+    info = json.loads(body)
+    if not isinstance(info, dict):
+        return ProbeResult("api_info", False, f"not a JSON object: {body[:80]!r}")
+    version = info.get("version")
+    if not version:
+        return ProbeResult("api_info", False, f"no version in {body[:80]!r}")
+    return ProbeResult("api_info", True, f"Rocket.Chat {version}", metrics={"version": version})
+
+
+def probe_health(target: Target, timeout: float = 10.0, context=None) -> ProbeResult:
+    status, body = _get(target, "/health", timeout, context)
+    return ProbeResult("health", status == 200, f"HTTP {status} {body[:40].decode(errors='replace').strip()}")
+
+
+def probe_websocket(target: Target, timeout: float = 10.0, context=None) -> ProbeResult:
+    key = base64.b64encode(os.urandom(16)).decode()
+    expected = base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+    sock = socket.create_connection((target.host, target.port), timeout=timeout)
+    try:
+        if target.tls:
+            sock = (context or ssl.create_default_context()).wrap_socket(sock, server_hostname=target.host)
+        sock.sendall((
+            "GET /websocket HTTP/1.1\r\n"
+            f"Host: {target.host}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n"
+            "User-Agent: jeeves-verify\r\n\r\n"
+        ).encode())
+        head = b""
+        while b"\r\n\r\n" not in head and len(head) < 16384:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            head += chunk
+    finally:
+        sock.close()
+    lines = head.split(b"\r\n\r\n", 1)[0].decode(errors="replace").split("\r\n")
+    status = lines[0] if lines else ""
+    headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lines[1:])}
+    if " 101 " not in f"{status} ":
+        return ProbeResult("websocket", False, status or "no response")
+    if headers.get("sec-websocket-accept") != expected:
+        return ProbeResult("websocket", False, "101 with a wrong Sec-WebSocket-Accept")
+    return ProbeResult("websocket", True, "101 Switching Protocols")
+
+
+def probe_tls(target: Target, timeout: float = 10.0, min_cert_days: int = 14,
+              context: ssl.SSLContext | None = None) -> ProbeResult:
+    if not target.tls:
+        return ProbeResult("tls", True, "skipped (plain HTTP)")
+    ctx = context or ssl.create_default_context()
+    with socket.create_connection((target.host, target.port), timeout=timeout) as raw:
+        with ctx.wrap_socket(raw, server_hostname=target.host) as tls:
+            cert = tls.getpeercert()
+            version = tls.version()
+    if not cert:
+        return ProbeResult("tls", False, f"{version}, certificate not verified")
+    days = (ssl.cert_time_to_seconds(cert["notAfter"]) - time.time()) / 86400
+    issuer = dict(x[0] for x in cert.get("issuer", ()))
+    issuer = issuer.get("organizationName") or issuer.get("commonName", "?")
+    detail = f"{version}, issuer {issuer}, expires {cert['notAfter']} ({days:.0f} days)"
+    return ProbeResult("tls", days >= min_cert_days, detail,
+                       metrics={"days_left": round(days, 1), "issuer": issuer})
+
+
+def probe_latency(target: Target, requests: int = 50, concurrency: int = 5,
+                  max_p95_ms: float = 1000.0, timeout: float = 10.0, context=None) -> ProbeResult:
+    """Request latency of /api/info over `concurrency` keep-alive connections."""
+    per_worker = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    samples: list[float] = []
+    errors: list[str] = []
+    lock = threading.Lock()
+
+    def worker(n: int) -> None:
+        conn = target.connection(timeout, context)
+        try:
+            for _ in range(n):
+                start = time.monotonic()
+                try:
+                    conn.request("GET", "/api/info", headers={"User-Agent": "jeeves-verify"})
+                    resp = conn.getresponse()
+                    resp.read()
+                    ok = resp.status == 200
+                except (OSError, http.client.HTTPException) as e:
+                    conn.close()        # reconnects on the next request
+                    ok, resp = False, e
+                elapsed = (time.monotonic() - start) * 1000
+                with lock:
+                    if ok:
+                        samples.append(elapsed)
+                    else:
+                        errors.append(str(getattr(resp, "status", resp)))
+        finally:
+            conn.close()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, [n for n in per_worker if n]))
+
+    if not samples:
+        return ProbeResult("latency", False, f"all {requests} requests failed ({errors[:1]})")
+    m = {
+        "requests": requests, "errors": len(errors),
+        "p50_ms": round(percentile(samples, 0.50), 1),
+        "p95_ms": round(percentile(samples, 0.95), 1),
+        "p99_ms": round(percentile(samples, 0.99), 1),
+        "max_ms": round(max(samples), 1),
+    }
+    ok = not errors and m["p95_ms"] <= max_p95_ms
+    detail = (f"p50 {m['p50_ms']}ms  p95 {m['p95_ms']}ms  p99 {m['p99_ms']}ms  "
+              f"max {m['max_ms']}ms, {len(errors)}/{requests} errors (p95 limit {max_p95_ms:.0f}ms)")
+    return ProbeResult("latency", ok, detail, metrics=m)
+
+
+# ———————————
+# Suite
+# ———————————
+def verify(url: str, *, requests: int = 50, concurrency: int = 5, max_p95_ms: float = 1000.0,
+           min_cert_days: int = 14, timeout: float = 10.0, context: ssl.SSLContext | None = None,
+           ) -> list[ProbeResult]:
+    """
+    Run every probe against `url` concurrently. `context` replaces the
+    system trust store, e.g. to trust a stand-in's self-signed certificate.
+    """
+    target = Target.parse(url)
+    probes = {
+        "api_info":  lambda: probe_api_info(target, timeout, context),
+        "health":    lambda: probe_health(target, timeout, context),
+        "websocket": lambda: probe_websocket(target, timeout, context),
+        "tls":       lambda: probe_tls(target, timeout, min_cert_days, context),
+        "latency":   lambda: probe_latency(target, requests, concurrency, max_p95_ms, timeout, context),
+    }
+    with ThreadPoolExecutor(max_workers=len(probes)) as pool:
+        futures = [pool.submit(_timed, name, fn) for name, fn in probes.items()]
+        return [f.result() for f in futures]
+
+
+def settings_from_env(env=None) -> dict:
+    """check() keyword arguments from VERIFY_* environment variables."""
+    env = os.environ if env is None else env
+    return {
+        "requests":      int(env.get("VERIFY_REQUESTS", 50)),
+        "concurrency":   int(env.get("VERIFY_CONCURRENCY", 5)),
+        "max_p95_ms":    float(env.get("VERIFY_MAX_P95_MS", 1000)),
+        "min_cert_days": int(env.get("VERIFY_MIN_CERT_DAYS", 14)),
+        "wait":          float(env.get("VERIFY_WAIT", 300)),
+    }
+
+
+def print_report(url: str, results: list[ProbeResult]) -> bool:
+    """Print one line per probe; True if all passed."""
+    print(f"\nVerification of {url}:")
+    for r in results:
+        print(f"  {'✔' if r.ok else '✘'} {r.name:<10} {r.seconds:6.2f}s  {r.detail}")
+    passed = sum(r.ok for r in results)
+    print(f"{passed}/{len(results)} checks passed")
+    return passed == len(results)
+
+
+def check(url: str, wait: float = 0, interval: float = 15, strict: bool = True,
+          **kwargs) -> list[ProbeResult]:
+    """
+    verify() and print_report(); if any probe failed, raise RuntimeError
+    or, when not `strict`, only print a warning.
+
+    A fresh deployment serves Traefik's default certificate until Let's
+    Encrypt answers, so with `wait` the failing suite is re-run every
+    `interval` seconds for up to `wait` seconds before giving up.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        results = verify(url, **kwargs)
+        failed = [r.name for r in results if not r.ok]
+        if not failed or time.monotonic() + interval > deadline:
+            break
+        print(f"… {', '.join(failed)} not passing yet, retrying in {interval:.0f}s", flush=True)
+        time.sleep(interval)
+    if not print_report(url, results):
+        if strict:
+            raise RuntimeError(f"Verification of {url} failed: {', '.join(failed)}")
+        print(f"⚠️  Verification of {url} failed: {', '.join(failed)}")
+    return results
+
+
+# ———————————
+# Local stand-in
+# ———————————
+class _StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"       # keep-alive, like Traefik
+    disable_nagle_algorithm = True      # headers and body go out in separate writes
+    version = "7.7.4"
+
+    def do_GET(self):
+        if self.path == "/websocket" and self.headers.get("Upgrade", "").lower() == "websocket":
+            accept = base64.b64encode(hashlib.sha1(
+                (self.headers["Sec-WebSocket-Key"] + _WS_GUID).encode()).digest()).decode()
+            self.send_response(101, "Switching Protocols")
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", accept)
+            self.end_headers()
+            self.close_connection = True
+            return
+        if self.path == "/api/info":
+            body = json.dumps({"version": self.version, "success": True}).encode()
+            ctype = "application/json"
+        elif self.path == "/health":
+            body, ctype = b"OK", "text/plain"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer:
+    """
+    Local stand-in for a Rocket.Chat endpoint behind Traefik.
+
+    Usage:
+        with StandInServer() as url:
+            verify.check(url)
+
+    With `certfile`/`keyfile` it serves HTTPS; pass verify() a context
+    that trusts the certificate.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 certfile: str | None = None, keyfile: str | None = None):
+        self.httpd = http.server.ThreadingHTTPServer((host, port), _StandInHandler)
+        self.httpd.daemon_threads = True
+        self.scheme = "http"
+        if certfile:
+            ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            ctx.load_cert_chain(certfile, keyfile)
+            self.httpd.socket = ctx.wrap_socket(self.httpd.socket, server_side=True)
+            self.scheme = "https"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"{self.scheme}://{host}:{port}"
+
+    def __enter__(self) -> str:
+        self._thread.start()
+        return self.url
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,271 @@
+# jeeves/warm_pool.py
+
+"""
+Warm pool of stopped, pre-bootstrapped instances.
+
+Pool members are ordinary EC2 instances tagged WarmPool=<role>. They are
+launched, bootstrapped with PREPARE_ONLY=true (packages installed, images
+pulled, nothing configured), stopped, and then tagged PoolState=ready.
+A pipeline that needs a node claims one by retagging it instead of
+launching a new one, so the node only has to start and run the fast,
+idempotent part of its bootstrap.
+
+A pool is keyed by role, instance type, key pair and a variant string
+(e.g. the Rocket.Chat release baked into the images). Only members whose
+variant matches are claimed.
+
+Claims made from one machine are serialized by a lock file in
+$JEEVES_HOME. Across machines a claim is best-effort: EC2 has no
+conditional tagging and tags are eventually consistent, so two runs can
+both believe they hold a member. Ownership is checked again after the
+instance has been started, and the run that lost moves on to the next
+member.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import pathlib
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from .journal import state_dir
+from . import registry_mirror
+
+POOL_TAG    = "WarmPool"       # role
+STATE_TAG   = "PoolState"      # preparing | ready
+VARIANT_TAG = "PoolVariant"
+CLAIM_TAG   = "PoolClaim"
+
+# Time for concurrent claimers' tag writes to land before reading back
+CLAIM_SETTLE = 2.0
+
+# Serializes claims by runs on this machine
+CLAIM_LOCK = "warm-pool.lock"
+
+SCRIPTS_DIR = pathlib.Path(__file__).parents[1] / "scripts"
+
+# Pooled roles: the security group members launch into (created by
+# rc_mongo_docker) and the bootstrap run with PREPARE_ONLY=true
+ROLES = {
+    "mongo":      {"security_group": "jeeves-basic", "script": SCRIPTS_DIR / "mongodb_bootstrap.sh"},
+    "rocketchat": {"security_group": "jeeves-rc",    "script": SCRIPTS_DIR / "rocket_chat_ec2_bootstrap.sh"},
+}
+
+
+def role_variant(role: str, storage=None, env=None) -> str:
+    """
+    What a member of `role` has baked in; a claim only takes members whose
+    variant matches the deployment's.
+    """
+    env = os.environ if env is None else env
+    if role == "mongo":
+        s = storage
+        return ":".join(str(v) for v in (s.kind, s.size_gb, s.iops or "", s.throughput or "")) \
+            if s is not None and s.dedicated else "root"
+    return f"{env.get('IMAGE', '')}:{env.get('RELEASE', '')}/traefik:{env.get('TRAEFIK_RELEASE', '')}"
+
+
+def prepare_header(role: str, env=None) -> str:
+    """Export lines (and the image-pull snippet) for a PREPARE_ONLY bootstrap of `role`."""
+    env = os.environ if env is None else env
+    lines = ["export PREPARE_ONLY=true"]
+    if role == "rocketchat":
+        lines += [f"export {k}={env[k]}" for k in ("RELEASE", "IMAGE", "TRAEFIK_RELEASE")]
+        return "\n".join(lines) + "\n" + registry_mirror.client_prefix()
+    return "\n".join(lines) + "\n"
+
+
+def pool_size(role: str) -> int:
+    """WARM_POOL_<ROLE>_SIZE, else WARM_POOL_SIZE, else 0 (no pool)."""
+    env = os.environ
+    key = f"WARM_POOL_{role.upper().replace('-', '_')}_SIZE"
+    return int(env.get(key) or env.get("WARM_POOL_SIZE") or 0)
+
+
+@dataclass
+class LaunchSpec:
+    """Everything create_instances needs for a new pool member."""
+    image_id: str
+    subnet_id: str
+    security_groups: list[str]
+    block_devices: list[dict] = field(default_factory=list)
+
+
+class WarmPool:
+    """
+    Usage:
+        pool = WarmPool(ec2c, ec2, "rocketchat", "t3.xlarge", key_name, variant)
+        inst = pool.claim("jeeves-rocketchat", {"Role": "rocketchat-node", "Deployment": dep})
+        if inst is None:
+            ... launch as usual ...
+    """
+
+    def __init__(self, ec2c, ec2, role: str, instance_type: str, key_name: str, variant: str = ""):
+        self.ec2c = ec2c
+        self.ec2 = ec2
+        self.role = role
+        self.instance_type = instance_type
+        self.key_name = key_name
+        self.variant = variant
+
+    def _filters(self, states: list[str], pool_states: list[str]) -> list[dict]:
+        return [
+            {"Name": f"tag:{POOL_TAG}",     "Values": [self.role]},
+            {"Name": f"tag:{STATE_TAG}",    "Values": pool_states},
+            {"Name": f"tag:{VARIANT_TAG}",  "Values": [self.variant]},
+            {"Name": "instance-type",       "Values": [self.instance_type]},
+            {"Name": "key-name",            "Values": [self.key_name]},
+            {"Name": "instance-state-name", "Values": states},
+        ]
+
+    def members(self, pool_states: tuple[str, ...] = ("ready", "preparing")) -> list[dict]:
+        """Live pool members (raw describe_instances dicts), oldest first."""
+        found = []
+        pages = self.ec2c.get_paginator("describe_instances").paginate(
+            Filters=self._filters(["pending", "running", "stopping", "stopped"], list(pool_states))
+        )
+        for page in pages:
+            for r in page["Reservations"]:
+                found.extend(r["Instances"])
+        return sorted(found, key=lambda i: i["LaunchTime"])
+
+    # ———————————
+    # Claiming
+    # ———————————
+    def claim(self, name: str, tags: dict[str, str]) -> object | None:
+        """
+        Take one ready member, retag it as `name` with `tags`, start it and
+        return it as an ec2.Instance (not yet running). None if the pool is
+        empty.
+
+        A claim writes a random token, waits CLAIM_SETTLE seconds and reads
+        the tag back; whoever's token survived starts the instance. The tag
+        is read once more after start_instances, when the writes have had
+        time to converge, before the member is retagged as ours. Runs on
+        this machine also take CLAIM_LOCK, so they never race each other.
+        """
+        lock = state_dir() / CLAIM_LOCK
+        lock.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                return self._claim(name, tags)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _claim(self, name: str, tags: dict[str, str]) -> object | None:
+        for data in self.members(("ready",)):
+            if data["State"]["Name"] != "stopped" or _tags(data).get(CLAIM_TAG):
+                continue
+            iid = data["InstanceId"]
+            token = uuid.uuid4().hex
+            self.ec2c.create_tags(Resources=[iid], Tags=[{"Key": CLAIM_TAG, "Value": token}])
+            time.sleep(CLAIM_SETTLE)
+            if not self._holds(iid, token):
+                print(f"Warm pool: {iid} was claimed by another run, trying the next one")
+                continue
+
+            self.ec2c.start_instances(InstanceIds=[iid])
+            time.sleep(CLAIM_SETTLE)
+            if not self._holds(iid, token):
+                # another run's token landed late; it owns the (started) instance
+                print(f"Warm pool: {iid} was taken over by another run, trying the next one")
+                continue
+
+            self.ec2c.delete_tags(Resources=[iid], Tags=[
+                {"Key": POOL_TAG}, {"Key": STATE_TAG}, {"Key": VARIANT_TAG}, {"Key": CLAIM_TAG},
+            ])
+            self.ec2c.create_tags(Resources=[iid], Tags=[
+                {"Key": "Name",    "Value": name},
+                {"Key": "Project", "Value": "jeeves"},
+                *({"Key": k, "Value": v} for k, v in tags.items()),
+            ])
+            print(f"♨️  Claimed warm {self.role} {iid} as {name}")
+            return self.ec2.Instance(iid)
+        return None
+
+    def _holds(self, iid: str, token: str) -> bool:
+        current = self.ec2c.describe_instances(InstanceIds=[iid])["Reservations"][0]["Instances"][0]
+        return _tags(current).get(CLAIM_TAG) == token
+
+    # ———————————
+    # Refilling
+    # ———————————
+    def deficit(self, size: int) -> int:
+        return max(0, size - len(self.members()))
+
+    def launch(self, count: int, spec: LaunchSpec) -> list:
+        """Launch `count` new members tagged PoolState=preparing."""
+        if count <= 0:
+            return []
+        return self.ec2.create_instances(
+            ImageId=spec.image_id,
+            InstanceType=self.instance_type,
+            MinCount=count, MaxCount=count,
+            KeyName=self.key_name,
+            NetworkInterfaces=[{
+                "SubnetId": spec.subnet_id,
+                "DeviceIndex": 0,
+                "AssociatePublicIpAddress": True,
+                "Groups": spec.security_groups,
+            }],
+            BlockDeviceMappings=spec.block_devices,
+            TagSpecifications=[{
+                "ResourceType": "instance",
+                "Tags": [
+                    {"Key": "Name",      "Value": f"jeeves-pool-{self.role}"},
+                    {"Key": "Project",   "Value": "jeeves"},
+                    {"Key": POOL_TAG,    "Value": self.role},
+                    {"Key": STATE_TAG,   "Value": "preparing"},
+                    {"Key": VARIANT_TAG, "Value": self.variant},
+                ],
+            }],
+            UserData="#!/usr/bin/env bash\nexit 0\n",
+        )
+
+    def park(self, instances: list) -> None:
+        """Stop prepared members and mark them ready."""
+        if not instances:
+            return
+        ids = [i.id for i in instances]
+        self.ec2c.stop_instances(InstanceIds=ids)
+        self.ec2c.get_waiter("instance_stopped").wait(InstanceIds=ids)
+        self.ec2c.create_tags(Resources=ids, Tags=[{"Key": STATE_TAG, "Value": "ready"}])
+
+    def drain(self) -> list[str]:
+        """Terminate every member of this pool (any variant)."""
+        rs = self.ec2c.describe_instances(Filters=[
+            {"Name": f"tag:{POOL_TAG}",     "Values": [self.role]},
+            {"Name": "instance-state-name", "Values": ["pending", "running", "stopping", "stopped"]},
+        ])["Reservations"]
+        ids = [i["InstanceId"] for r in rs for i in r["Instances"]]
+        if ids:
+            self.ec2c.terminate_instances(InstanceIds=ids)
+        return ids
+
+
+def refill_in_background(roles: list[str]) -> pathlib.Path:
+    """
+    Top the pools for `roles` back up in a detached `warm_pool` pipeline
+    run, so the claiming deployment does not wait for it. Returns the log.
+    """
+    log = state_dir() / "warm-pool.log"
+    log.parent.mkdir(parents=True, exist_ok=True)
+    with open(log, "a") as f:
+        subprocess.Popen(
+            [sys.executable, "-m", "jeeves.cli", "pipelines", "run", "warm_pool",
+             "--roles", ",".join(roles)],
+            stdin=subprocess.DEVNULL, stdout=f, stderr=subprocess.STDOUT,
+            start_new_session=True,      # outlives this run on purpose
+        )
+    print(f"♨️  Refilling warm pool ({', '.join(roles)}) in the background → {log}")
+    return log
+
+
+def _tags(data: dict) -> dict[str, str]:
+    return {t["Key"]: t["Value"] for t in data.get("Tags", [])}
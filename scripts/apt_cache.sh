@@ -0,0 +1,86 @@
+#!/usr/bin/env bash
+# -----------------------------------------------------------------------------
+# Shared APT cache – Ubuntu
+# With APT_CACHE_SERVE=true this node runs apt-cacher-ng for the others; with
+# APT_PROXY set, apt on this node goes through that cache. HTTPS repositories
+# (Docker, MongoDB) are cached too: they are fetched as http://HTTPS///host/…
+# through the cache, which talks HTTPS upstream. Prepended to the node
+# bootstraps by Jeeves; idempotent.
+# -----------------------------------------------------------------------------
+set -euo pipefail
+
+############################
+# 0. ENV VARS              #
+############################
+: "${APT_CACHE_SERVE:=false}"
+: "${APT_PROXY:=}"                      # e.g. http://10.0.1.10:3142
+: "${APT_CACHE_DAYS:=30}"               # keep unreferenced packages this long
+APT_PROXY_CONF=/etc/apt/apt.conf.d/01jeeves-proxy
+# Prefix for the HTTPS repositories the bootstraps add: https:// without a cache
+APT_HTTPS="https://"
+
+apt_info() { printf "\e[34m[INFO]\e[0m  %s\n" "$*"; }
+
+############################
+# 1. Cache server          #
+############################
+serve_apt_cache() {
+  if ! systemctl is-active --quiet apt-cacher-ng; then
+    apt_info "Installing apt-cacher-ng…"
+    while fuser /var/lib/dpkg/lock-frontend /var/lib/apt/lists/lock >/dev/null 2>&1; do
+      sleep 5
+    done
+    echo "apt-cacher-ng apt-cacher-ng/tunnelenable boolean false" | debconf-set-selections
+    apt-get update -y
+    DEBIAN_FRONTEND=noninteractive apt-get install -y apt-cacher-ng
+  fi
+  echo "ExThreshold: ${APT_CACHE_DAYS}" > /etc/apt-cacher-ng/zz-jeeves.conf
+  systemctl enable --quiet apt-cacher-ng
+  systemctl restart apt-cacher-ng
+  # this node's own installs fill the cache first
+  APT_PROXY="http://127.0.0.1:3142"
+}
+
+############################
+# 2. Client                #
+############################
+# Rewrite the HTTPS entries in sources.list.d to go through the cache, or back.
+rewrite_sources() {
+  local from=$1 to=$2 f
+  for f in /etc/apt/sources.list.d/*.list; do
+    [[ -f "$f" ]] && sed -i "s#${from}#${to}#g" "$f"
+  done
+  return 0
+}
+
+use_apt_proxy() {
+  local tries=0
+  if [[ -n "${APT_PROXY}" ]]; then
+    until curl -s -o /dev/null --max-time 5 "${APT_PROXY}/"; do
+      if (( ++tries >= 12 )); then
+        apt_info "APT cache ${APT_PROXY} unreachable; using the mirrors directly"
+        APT_PROXY=""
+        break
+      fi
+      sleep 5
+    done
+  fi
+  if [[ -z "${APT_PROXY}" ]]; then
+    # a node installed through a cache that is gone must still update
+    rm -f "${APT_PROXY_CONF}"
+    rewrite_sources "http://HTTPS///" "https://"
+    return 0
+  fi
+  printf 'Acquire::http::Proxy "%s";\n' "${APT_PROXY}" > "${APT_PROXY_CONF}"
+  rewrite_sources "https://" "http://HTTPS///"
+  APT_HTTPS="http://HTTPS///"
+  apt_info "apt goes through the cache at ${APT_PROXY}"
+}
+
+############################
+# 3. Main                  #
+############################
+if [[ "${APT_CACHE_SERVE}" == "true" ]]; then
+  serve_apt_cache
+fi
+use_apt_proxy
@@ -8,10 +8,30 @@ set -euo pipefail
 ############################
 # 0. Require ENV vars      #
 ############################
-: "${MONGO_PORT:?MONGO_PORT must be set}"
-: "${REPLSET_NAME:?REPLSET_NAME must be set}"
-: "${MONGO_USERNAME:?MONGO_USERNAME must be set}"
-: "${MONGO_PASSWORD:?MONGO_PASSWORD must be set}"
+: "${PREPARE_ONLY:=false}"          # true: install packages only (warm-pool image), configure nothing
+if [[ "${PREPARE_ONLY}" != "true" ]]; then
+  : "${MONGO_PORT:?MONGO_PORT must be set}"
+  : "${REPLSET_NAME:?REPLSET_NAME must be set}"
+  : "${MONGO_USERNAME:?MONGO_USERNAME must be set}"
+  : "${MONGO_PASSWORD:?MONGO_PASSWORD must be set}"
+fi
+: "${MONGO_ROLE:=primary}"          # primary | secondary (joins an existing set)
+: "${MONGO_KEYFILE_B64:=}"          # secondary only: primary's keyfile, base64
+: "${MONGO_DBPATH:=/var/lib/mongodb}"  # data directory (mount_data_volume.sh mounts it)
+: "${MONGO_SEEDED:=false}"          # true: MONGO_DBPATH was restored from another deployment's snapshot
+# Tuning profile (jeeves/mongo_tuning.py); empty keeps MongoDB's defaults
+: "${MONGO_TUNE_OS:=false}"         # true: apply THP, readahead, ulimit and sysctl settings below
+: "${MONGO_WT_CACHE_GB:=}"          # WiredTiger cache size
+: "${MONGO_BLOCK_COMPRESSOR:=}"     # snappy | zstd | zlib | none (new collections)
+: "${MONGO_JOURNAL_COMPRESSOR:=}"
+: "${MONGO_OPLOG_SIZE_MB:=}"
+: "${MONGO_READAHEAD_SECTORS:=32}"  # 512-byte sectors on the dbPath device
+: "${MONGO_THP:=never}"             # transparent huge pages
+: "${MONGO_NOFILE:=64000}"
+: "${MONGO_NPROC:=64000}"
+: "${MONGO_SWAPPINESS:=1}"
+: "${MONGO_MAX_MAP_COUNT:=262144}"
+: "${MONGO_TCP_KEEPALIVE:=120}"
 
 ############################
 # 1. Helpers               #
@@ -55,17 +75,23 @@ install_mongo() {
     curl -fsSL https://www.mongodb.org/static/pgp/server-7.0.asc \
       | gpg --dearmor -o /usr/share/keyrings/mongodb-server-7.0.gpg
     echo "deb [arch=amd64,arm64 signed-by=/usr/share/keyrings/mongodb-server-7.0.gpg] \
-https://repo.mongodb.org/apt/ubuntu jammy/mongodb-org/7.0 multiverse" \
+${APT_HTTPS:-https://}repo.mongodb.org/apt/ubuntu jammy/mongodb-org/7.0 multiverse" \
       > /etc/apt/sources.list.d/mongodb-org-7.0.list
 
     wait_for_apt
     apt-get update -y
     apt-get install -y mongodb-org net-tools netcat-openbsd openssl
-    systemctl enable mongod
     ok "MongoDB package installed"
   else
     info "MongoDB already installed"
   fi
+  systemctl enable mongod
+}
+
+prepare_dbpath() {
+  mkdir -p "${MONGO_DBPATH}"
+  chown -R mongodb:mongodb "${MONGO_DBPATH}"
+  ok "Data directory ${MONGO_DBPATH} ready"
 }
 
 ############################
@@ -80,30 +106,102 @@ setup_firewall() {
   ok "Firewall rules set"
 }
 
+############################
+# 5b. OS tuning            #
+############################
+# Settings MongoDB's production notes ask for. They are applied by a oneshot
+# unit ordered before mongod, so they survive reboots and warm-pool restarts.
+tune_os() {
+  info "Applying OS tuning (THP ${MONGO_THP}, readahead ${MONGO_READAHEAD_SECTORS} sectors)…"
+  cat > /usr/local/sbin/jeeves-mongo-tuning <<EOF
+#!/usr/bin/env bash
+for f in /sys/kernel/mm/transparent_hugepage/enabled /sys/kernel/mm/transparent_hugepage/defrag; do
+  [[ -w "\$f" ]] && echo ${MONGO_THP} > "\$f"
+done
+[[ -w /sys/kernel/mm/transparent_hugepage/khugepaged/defrag ]] && \\
+  echo 0 > /sys/kernel/mm/transparent_hugepage/khugepaged/defrag
+dev=\$(findmnt -no SOURCE --target "${MONGO_DBPATH}" || true)
+[[ -b "\$dev" ]] && blockdev --setra ${MONGO_READAHEAD_SECTORS} "\$dev"
+exit 0
+EOF
+  chmod 755 /usr/local/sbin/jeeves-mongo-tuning
+
+  cat > /etc/systemd/system/jeeves-mongo-tuning.service <<EOF
+[Unit]
+Description=Jeeves OS tuning for MongoDB
+After=local-fs.target
+Before=mongod.service
+
+[Service]
+Type=oneshot
+ExecStart=/usr/local/sbin/jeeves-mongo-tuning
+RemainAfterExit=yes
+
+[Install]
+WantedBy=multi-user.target mongod.service
+EOF
+
+  mkdir -p /etc/systemd/system/mongod.service.d
+  cat > /etc/systemd/system/mongod.service.d/jeeves-limits.conf <<EOF
+[Service]
+LimitNOFILE=${MONGO_NOFILE}
+LimitNPROC=${MONGO_NPROC}
+TasksMax=infinity
+EOF
+
+  cat > /etc/sysctl.d/60-jeeves-mongo.conf <<EOF
+vm.swappiness = ${MONGO_SWAPPINESS}
+vm.max_map_count = ${MONGO_MAX_MAP_COUNT}
+net.ipv4.tcp_keepalive_time = ${MONGO_TCP_KEEPALIVE}
+net.core.somaxconn = 4096
+EOF
+  sysctl -q -p /etc/sysctl.d/60-jeeves-mongo.conf
+
+  systemctl daemon-reload
+  systemctl enable jeeves-mongo-tuning.service
+  systemctl restart jeeves-mongo-tuning.service
+  ok "OS tuned for MongoDB"
+}
+
 ############################
 # 6. Write config files    #
 ############################
+# storage: and replication: sections, with the tuning profile's settings
+storage_conf() {
+  echo "storage:"
+  echo "  dbPath: ${MONGO_DBPATH}"
+  if [[ -n "${MONGO_WT_CACHE_GB}${MONGO_JOURNAL_COMPRESSOR}${MONGO_BLOCK_COMPRESSOR}" ]]; then
+    echo "  wiredTiger:"
+    if [[ -n "${MONGO_WT_CACHE_GB}${MONGO_JOURNAL_COMPRESSOR}" ]]; then
+      echo "    engineConfig:"
+      [[ -z "${MONGO_WT_CACHE_GB}" ]] || echo "      cacheSizeGB: ${MONGO_WT_CACHE_GB}"
+      [[ -z "${MONGO_JOURNAL_COMPRESSOR}" ]] || echo "      journalCompressor: ${MONGO_JOURNAL_COMPRESSOR}"
+    fi
+    if [[ -n "${MONGO_BLOCK_COMPRESSOR}" ]]; then
+      echo "    collectionConfig:"
+      echo "      blockCompressor: ${MONGO_BLOCK_COMPRESSOR}"
+    fi
+  fi
+  echo "replication:"
+  echo "  replSetName: ${REPLSET_NAME}"
+  [[ -z "${MONGO_OPLOG_SIZE_MB}" ]] || echo "  oplogSizeMB: ${MONGO_OPLOG_SIZE_MB}"
+}
+
 write_conf() {
   cat > /etc/mongod.conf.nosec <<EOF
-storage:
-  dbPath: /var/lib/mongodb
+$(storage_conf)
 net:
   bindIp: 0.0.0.0
   port: ${MONGO_PORT}
-replication:
-  replSetName: ${REPLSET_NAME}
 processManagement:
   timeZoneInfo: /usr/share/zoneinfo
 EOF
 
   cat > /etc/mongod.conf.sec <<EOF
-storage:
-  dbPath: /var/lib/mongodb
+$(storage_conf)
 net:
   bindIp: 0.0.0.0
   port: ${MONGO_PORT}
-replication:
-  replSetName: ${REPLSET_NAME}
 security:
   authorization: enabled
   keyFile: /etc/mongo-keyfile
@@ -117,7 +215,13 @@ EOF
 # 7. Create keyfile        #
 ############################
 create_keyfile() {
-  if [[ ! -f /etc/mongo-keyfile ]]; then
+  if [[ -n "${MONGO_KEYFILE_B64}" ]]; then
+    info "Installing shared replica-set keyfile…"
+    echo "${MONGO_KEYFILE_B64}" | base64 -d > /etc/mongo-keyfile
+    chown mongodb:mongodb /etc/mongo-keyfile
+    chmod 600 /etc/mongo-keyfile
+    ok "Keyfile installed"
+  elif [[ ! -f /etc/mongo-keyfile ]]; then
     info "Creating internal auth keyfile…"
     openssl rand -base64 756 > /etc/mongo-keyfile
     chown mongodb:mongodb /etc/mongo-keyfile
@@ -157,6 +261,23 @@ try {
 EOF
 }
 
+############################
+# 9b. Oplog size           #
+############################
+# oplogSizeMB only applies when the oplog is created; resize an existing
+# one (a reused or seeded node) to the profile's size.
+resize_oplog() {
+  [[ -n "${MONGO_OPLOG_SIZE_MB}" ]] || return 0
+  info "Sizing the oplog to ${MONGO_OPLOG_SIZE_MB} MB…"
+  mongosh --quiet <<EOF
+for (let i = 0; i < 30 && !db.getSiblingDB("local").getCollectionNames().includes("oplog.rs"); i++) {
+  sleep(1000);
+}
+const res = db.adminCommand({ replSetResizeOplog: 1, size: ${MONGO_OPLOG_SIZE_MB} });
+print(res.ok ? "Oplog sized." : "Oplog resize failed: " + res.errmsg);
+EOF
+}
+
 ############################
 # 10. Create admin user    #
 ############################
@@ -171,25 +292,85 @@ if (!adm.getUser("${MONGO_USERNAME}")) {
     roles:[{ role: "root", db: "admin" }]
   });
   print("Admin user created.");
+} else if ("${MONGO_SEEDED}" === "true") {
+  adm.updateUser("${MONGO_USERNAME}", { pwd: "${MONGO_PASSWORD}" });
+  print("Admin user from the seed snapshot: password reset.");
 } else {
   print("Admin user exists.");
 }
 EOF
 }
 
+############################
+# 10b. Seeded data volume  #
+############################
+# The snapshot carries the source deployment's replica-set config (its
+# member addresses) in the local database. Drop it once, with mongod
+# running standalone, so the set is initiated afresh on this node.
+reset_seeded_replset() {
+  [[ -f /etc/jeeves-seeded ]] && return
+  info "Seeded data volume: clearing the source replica-set config…"
+  cat > /etc/mongod.conf.standalone <<EOF
+storage:
+  dbPath: ${MONGO_DBPATH}
+net:
+  bindIp: 127.0.0.1
+  port: ${MONGO_PORT}
+processManagement:
+  timeZoneInfo: /usr/share/zoneinfo
+EOF
+  cp /etc/mongod.conf.standalone /etc/mongod.conf
+  systemctl restart mongod
+  wait_mongo
+  mongosh --quiet --port "${MONGO_PORT}" --eval 'db.getSiblingDB("local").dropDatabase()'
+  systemctl stop mongod
+  touch /etc/jeeves-seeded
+  ok "Source replica-set config dropped"
+}
+
 ############################
 # 11. Main workflow        #
 ############################
 install_mongo
+
+if [[ "${PREPARE_ONLY}" == "true" ]]; then
+  # mongod must not start on the next boot before the data volume is mounted
+  systemctl disable --now mongod
+  ok "MongoDB installed for the warm pool (not configured)"
+  exit 0
+fi
+
+prepare_dbpath
 setup_firewall
+if [[ "${MONGO_TUNE_OS}" == "true" ]]; then
+  tune_os
+fi
 write_conf
 
+if [[ "${MONGO_ROLE}" == "secondary" ]]; then
+  # Users and replica-set config arrive through initial sync once the
+  # primary runs rs.add() for this node; only the keyfile must match.
+  [[ -n "${MONGO_KEYFILE_B64}" ]] || error "MONGO_KEYFILE_B64 is required for a secondary"
+  create_keyfile
+  info "Starting mongod as '${REPLSET_NAME}' secondary (auth)…"
+  cp /etc/mongod.conf.sec /etc/mongod.conf
+  systemctl restart mongod
+  wait_mongo
+  ok "MongoDB secondary ready at ${NODE_ADDR}:${MONGO_PORT}, waiting for rs.add()"
+  exit 0
+fi
+
+if [[ "${MONGO_SEEDED}" == "true" ]]; then
+  reset_seeded_replset
+fi
+
 info "Starting mongod (no auth)…"
 cp /etc/mongod.conf.nosec /etc/mongod.conf
 systemctl restart mongod
 wait_mongo
 
 initiate_replset
+resize_oplog
 create_admin
 create_keyfile
 
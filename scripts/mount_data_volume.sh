@@ -0,0 +1,141 @@
+#!/usr/bin/env bash
+# -----------------------------------------------------------------------------
+# MongoDB data-volume preparation – Ubuntu
+# Formats and mounts a dedicated EBS volume or the local NVMe instance store
+# at MONGO_DBPATH. A volume restored from a snapshot keeps its filesystem and
+# can be pre-warmed. Prepended to mongodb_bootstrap.sh by Jeeves; idempotent.
+# -----------------------------------------------------------------------------
+set -euo pipefail
+
+############################
+# 0. ENV VARS              #
+############################
+: "${DATA_VOLUME_KIND:=root}"           # root | gp3 | io2 | instance-store
+: "${DATA_VOLUME_ID:=}"                 # EBS volume id (gp3/io2)
+: "${MONGO_DBPATH:=/var/lib/mongodb}"
+: "${DATA_PREWARM:=false}"              # true: read every block of a restored volume first
+: "${DATA_PREWARM_JOBS:=16}"            # parallel readers for the pre-warm
+# XFS is what MongoDB recommends for WiredTiger; no atime updates on data files
+: "${DATA_MOUNT_OPTS:=defaults,noatime,nofail}"
+
+info()  { printf "\e[34m[INFO]\e[0m  %s\n" "$*"; }
+ok()    { printf "\e[32m[ OK ]\e[0m  %s\n" "$*"; }
+error() { printf "\e[31m[ERR ]\e[0m  %s\n" "$*"; exit 1; }
+
+############################
+# 1. Locate the device     #
+############################
+find_ebs_device() {
+  local serial="${DATA_VOLUME_ID/-/}"     # vol-0abc… → vol0abc…
+  local dev
+  for _ in $(seq 60); do
+    # Nitro: NVMe device whose serial is the volume id
+    dev=$(ls /dev/disk/by-id/nvme-Amazon_Elastic_Block_Store_"${serial}" 2>/dev/null || true)
+    # Xen (t2, m4…): the requested device name, renamed to xvd*
+    [[ -z "$dev" && -b /dev/xvdf ]] && dev=/dev/xvdf
+    [[ -z "$dev" && -b /dev/sdf  ]] && dev=/dev/sdf
+    if [[ -n "$dev" ]]; then
+      readlink -f "$dev"
+      return
+    fi
+    sleep 2
+  done
+  error "Data volume ${DATA_VOLUME_ID} did not appear"
+}
+
+find_instance_store() {
+  local devs=()
+  for d in /dev/nvme*n1; do
+    [[ -b "$d" ]] || continue
+    if [[ "$(cat /sys/block/$(basename "$d")/device/model 2>/dev/null)" == *"Instance Storage"* ]]; then
+      devs+=("$d")
+    fi
+  done
+  (( ${#devs[@]} )) || error "No NVMe instance-store devices found"
+
+  if (( ${#devs[@]} == 1 )); then
+    echo "${devs[0]}"
+    return
+  fi
+  # Stripe several instance-store disks into one array
+  if [[ ! -b /dev/md0 ]]; then
+    info "Creating RAID0 over ${devs[*]}" >&2
+    command -v mdadm &>/dev/null || { apt-get update -y >&2; apt-get install -y mdadm >&2; }
+    mdadm --create /dev/md0 --level=0 --raid-devices=${#devs[@]} "${devs[@]}" --run >&2
+  fi
+  echo /dev/md0
+}
+
+############################
+# 2. Format & mount        #
+############################
+mount_data() {
+  local dev="$1"
+  if mountpoint -q "${MONGO_DBPATH}"; then
+    info "${MONGO_DBPATH} is already mounted"
+    return
+  fi
+
+  command -v mkfs.xfs &>/dev/null || { apt-get update -y; apt-get install -y xfsprogs; }
+  if ! blkid "$dev" &>/dev/null; then
+    info "Formatting ${dev} as XFS…"
+    mkfs.xfs -f "$dev"
+  fi
+
+  mkdir -p "${MONGO_DBPATH}"
+  local uuid
+  uuid=$(blkid -s UUID -o value "$dev")
+  if ! grep -q "UUID=${uuid}" /etc/fstab; then
+    echo "UUID=${uuid} ${MONGO_DBPATH} xfs ${DATA_MOUNT_OPTS} 0 2" >> /etc/fstab
+  fi
+  mount "${MONGO_DBPATH}"
+  ok "Mounted ${dev} at ${MONGO_DBPATH} (${DATA_MOUNT_OPTS})"
+}
+
+# No I/O scheduler on NVMe-backed EBS; readahead is set by the MongoDB
+# tuning profile (MONGO_READAHEAD_SECTORS in mongodb_bootstrap.sh)
+tune_device() {
+  local name
+  name=$(basename "$(readlink -f "$1")")
+  [[ -w /sys/block/${name}/queue/scheduler ]] && echo none > /sys/block/${name}/queue/scheduler 2>/dev/null || true
+}
+
+# Blocks of a volume restored from a snapshot are fetched from S3 on first
+# read. Read the whole device once, in parallel slices, so mongod does not
+# pay that latency on its first queries. Direct I/O keeps the page cache out.
+prewarm_device() {
+  local dev="$1" jobs="${DATA_PREWARM_JOBS}"
+  local size_mb slice start=$SECONDS
+  size_mb=$(( $(blockdev --getsize64 "$dev") / 1048576 ))
+  slice=$(( (size_mb + jobs - 1) / jobs ))
+  info "Pre-warming ${dev} (${size_mb} MiB) with ${jobs} parallel readers…"
+  seq 0 $(( jobs - 1 )) | xargs -P "${jobs}" -I{} \
+    sh -c 'dd if="$1" of=/dev/null bs=1M iflag=direct skip=$(( $2 * $3 )) count="$3" status=none' \
+      _ "$dev" {} "$slice"
+  ok "Pre-warmed ${dev} in $(( SECONDS - start ))s"
+}
+
+case "${DATA_VOLUME_KIND}" in
+  root)
+    info "MongoDB data stays on the root volume"
+    ;;
+  gp3|io2)
+    [[ -n "${DATA_VOLUME_ID}" ]] || error "DATA_VOLUME_ID is required for ${DATA_VOLUME_KIND}"
+    dev=$(find_ebs_device)
+    mount_data "$dev"
+    tune_device "$dev"
+    if [[ "${DATA_PREWARM}" == "true" && ! -f /var/lib/jeeves-prewarmed ]]; then
+      prewarm_device "$dev"
+      touch /var/lib/jeeves-prewarmed
+    fi
+    ;;
+  instance-store)
+    dev=$(find_instance_store)
+    mount_data "$dev"
+    tune_device "$dev"
+    info "Instance store is ephemeral: data on ${MONGO_DBPATH} is lost on stop/terminate"
+    ;;
+  *)
+    error "Unknown DATA_VOLUME_KIND '${DATA_VOLUME_KIND}'"
+    ;;
+esac
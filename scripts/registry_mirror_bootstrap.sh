@@ -0,0 +1,138 @@
+#!/usr/bin/env bash
+# -----------------------------------------------------------------------------
+# In-VPC pull-through registry mirror (Docker, registry:2) – Ubuntu 24.04
+# Runs one registry:2 proxy per upstream registry, then pulls PRESEED_IMAGES
+# through them so the first deployment already finds them cached.
+# Driven by env vars; safe to re-run.
+# -----------------------------------------------------------------------------
+set -euo pipefail
+
+############################
+# 0. Required ENV VARS     #
+############################
+# name=upstream-url=port,… (jeeves/registry_mirror.py UPSTREAMS)
+: "${MIRROR_UPSTREAMS:?MIRROR_UPSTREAMS (e.g. docker.io=https://registry-1.docker.io=5000) is required}"
+: "${PRESEED_IMAGES:=}"         # comma-separated image references
+: "${REGISTRY_RELEASE:=2}"
+: "${MIRROR_DATA:=/var/lib/registry-mirror}"
+
+############################
+# Helpers & Lock-wait      #
+############################
+info()  { printf "\e[34m[INFO]\e[0m  %s\n" "$*"; }
+ok()    { printf "\e[32m[ OK ]\e[0m  %s\n" "$*"; }
+error() { printf "\e[31m[ERR ]\e[0m  %s\n" "$*"; exit 1; }
+(( EUID == 0 )) || error "Must run as root"
+
+wait_for_apt() {
+  info "Waiting for existing apt/dpkg locks to clear…"
+  for lock in \
+    /var/lib/dpkg/lock-frontend \
+    /var/lib/dpkg/lock \
+    /var/lib/apt/lists/lock \
+    /var/cache/apt/archives/lock; do
+    while fuser "$lock" >/dev/null 2>&1; do
+      printf "[WAIT] lock on %s…\n" "$lock"
+      sleep 5
+    done
+  done
+}
+
+############################
+# Install Docker Engine    #
+############################
+install_docker() {
+  if ! command -v docker &>/dev/null; then
+    info "Installing Docker…"
+    wait_for_apt
+    apt-get update -y
+    wait_for_apt
+    apt-get install -y ca-certificates curl gnupg lsb-release
+    mkdir -p /etc/apt/keyrings
+    curl -fsSL https://download.docker.com/linux/ubuntu/gpg \
+      | gpg --batch --yes --dearmor -o /etc/apt/keyrings/docker.gpg
+    echo "deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.gpg] \
+${APT_HTTPS:-https://}download.docker.com/linux/ubuntu $(lsb_release -cs) stable" \
+      > /etc/apt/sources.list.d/docker.list
+    wait_for_apt
+    apt-get update -y
+    wait_for_apt
+    apt-get install -y docker-ce docker-ce-cli containerd.io docker-buildx-plugin docker-compose-plugin
+    systemctl enable docker && systemctl start docker
+    ok "Docker installed"
+  else
+    info "Docker already present"
+  fi
+}
+
+############################
+# Proxies                  #
+############################
+declare -A PORTS=()
+
+start_proxies() {
+  local spec name rest url port
+  for spec in ${MIRROR_UPSTREAMS//,/ }; do
+    name=${spec%%=*}; rest=${spec#*=}
+    url=${rest%=*};   port=${rest##*=}
+    PORTS[$name]=$port
+    if docker ps --format '{{.Names}}' | grep -xq "mirror-${name}"; then
+      info "mirror-${name} already running on :${port}"
+      continue
+    fi
+    docker rm -f "mirror-${name}" &>/dev/null || true
+    mkdir -p "${MIRROR_DATA}/${name}"
+    info "Starting mirror-${name} on :${port} → ${url}"
+    docker run -d --name "mirror-${name}" --restart=always \
+      -p "${port}:5000" \
+      -v "${MIRROR_DATA}/${name}:/var/lib/registry" \
+      -e REGISTRY_PROXY_REMOTEURL="${url}" \
+      -e REGISTRY_STORAGE_DELETE_ENABLED=true \
+      "registry:${REGISTRY_RELEASE}" >/dev/null
+  done
+
+  for name in "${!PORTS[@]}"; do
+    until curl -sf "http://127.0.0.1:${PORTS[$name]}/v2/" -o /dev/null; do sleep 1; done
+  done
+  ok "Mirrors up: ${!PORTS[*]}"
+}
+
+############################
+# Pre-seed                 #
+############################
+# Pull IMAGE through its mirror so the blobs land in the cache, then drop the
+# local copy: only the registry's storage needs to keep them.
+seed_one() {
+  local img=$1 reg path port
+  reg=${img%%/*}
+  if [[ "$img" != */* || ( "$reg" != *.* && "$reg" != *:* && "$reg" != localhost ) ]]; then
+    reg=docker.io; path=$img; [[ "$path" == */* ]] || path="library/$path"
+  else
+    path=${img#*/}
+  fi
+  port=${PORTS[$reg]:-}
+  [[ -n "$port" ]] || { info "No mirror for ${reg}; skipping ${img}"; return 0; }
+  docker pull -q "127.0.0.1:${port}/${path}" >/dev/null
+  docker rmi "127.0.0.1:${port}/${path}" >/dev/null
+  ok "Cached ${img}"
+}
+
+preseed() {
+  [[ -n "${PRESEED_IMAGES}" ]] || return 0
+  local img pids=()
+  for img in ${PRESEED_IMAGES//,/ }; do
+    seed_one "$img" & pids+=($!)
+  done
+  local failed=0
+  for pid in "${pids[@]}"; do wait "$pid" || failed=1; done
+  (( failed == 0 )) || error "Some images could not be cached"
+}
+
+############################
+# Main                     #
+############################
+install_docker
+start_proxies
+preseed
+
+ok "Registry mirror ready"
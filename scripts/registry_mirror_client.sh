@@ -0,0 +1,64 @@
+#!/usr/bin/env bash
+# -----------------------------------------------------------------------------
+# Registry mirror client – Docker nodes
+# configure_mirrors points dockerd at the in-VPC mirror in REGISTRY_MIRRORS;
+# pull_images pulls images in parallel through it, or from the public
+# registries without one. Prepended to the Docker bootstraps by Jeeves
+# (jeeves/registry_mirror.py); uses their info/ok/error helpers.
+# -----------------------------------------------------------------------------
+: "${REGISTRY_MIRRORS:=}"      # registry=http://mirror:port,… (REGISTRY_MIRROR in Jeeves)
+
+# Point dockerd at the in-VPC mirror (REGISTRY_MIRRORS from
+# jeeves/registry_mirror.py); a no-op without one.
+configure_mirrors() {
+  [[ -n "${REGISTRY_MIRRORS}" ]] || return 0
+  info "Using registry mirrors: ${REGISTRY_MIRRORS}"
+  python3 - <<'PY'
+import json, os
+mirrors = dict(kv.split("=", 1) for kv in os.environ["REGISTRY_MIRRORS"].split(","))
+path = "/etc/docker/daemon.json"
+try:
+    conf = json.load(open(path))
+except (OSError, ValueError):
+    conf = {}
+if "docker.io" in mirrors:
+    conf["registry-mirrors"] = [mirrors["docker.io"]]
+conf["insecure-registries"] = sorted({m.split("://", 1)[-1] for m in mirrors.values()})
+os.makedirs(os.path.dirname(path), exist_ok=True)
+json.dump(conf, open(path, "w"), indent=2)
+PY
+  systemctl restart docker
+  ok "Docker pulls through the mirror"
+}
+
+# Pull IMAGE through its registry's mirror and tag it with its own name,
+# so docker-compose finds it locally; falls back to the public registry.
+mirror_pull() {
+  local img=$1 reg path mirror=""
+  reg=${img%%/*}
+  if [[ "$img" != */* || ( "$reg" != *.* && "$reg" != *:* && "$reg" != localhost ) ]]; then
+    reg=docker.io; path=$img; [[ "$path" == */* ]] || path="library/$path"
+  else
+    path=${img#*/}
+  fi
+  if [[ -n "${REGISTRY_MIRRORS}" ]]; then
+    mirror=$(tr ',' '\n' <<<"${REGISTRY_MIRRORS}" | sed -n "s|^${reg}=[a-z]*://||p")
+  fi
+  if [[ -n "$mirror" ]] && docker pull -q "${mirror}/${path}" >/dev/null; then
+    docker tag "${mirror}/${path}" "$img"
+  else
+    docker pull -q "$img" >/dev/null
+  fi
+}
+
+# Pull all images at once
+pull_images() {
+  local img pids=() failed=0
+  for img in "$@"; do
+    info "Pulling ${img}…"
+    mirror_pull "${img}" & pids+=($!)
+  done
+  for pid in "${pids[@]}"; do wait "$pid" || failed=1; done
+  (( failed == 0 )) || error "Image pull failed"
+  ok "Images pulled"
+}
@@ -41,8 +41,9 @@ error() { printf "\e[31m[ERR ]\e[0m  %s\n" "$*"; exit 1; }
 ############################
 # 4. Compute URLs          #
 ############################
-MONGO_URL="mongodb://${MONGO_USERNAME}:${MONGO_PASSWORD}@${MONGO_HOST}:${MONGO_PORT}/${APP_DB}?replicaSet=${REPLSET}&authSource=admin&directConnection=true"
-MONGO_OPLOG_URL="mongodb://${MONGO_USERNAME}:${MONGO_PASSWORD}@${MONGO_HOST}:${MONGO_PORT}/${OPLOG_DB}?replicaSet=${REPLSET}&authSource=admin&directConnection=true"
+# Jeeves passes tuned URLs (jeeves/mongo_url.py); these are the bare fallbacks
+: "${MONGO_URL:=mongodb://${MONGO_USERNAME}:${MONGO_PASSWORD}@${MONGO_HOST}:${MONGO_PORT}/${APP_DB}?replicaSet=${REPLSET}&authSource=admin&directConnection=true}"
+: "${MONGO_OPLOG_URL:=mongodb://${MONGO_USERNAME}:${MONGO_PASSWORD}@${MONGO_HOST}:${MONGO_PORT}/${OPLOG_DB}?replicaSet=${REPLSET}&authSource=admin&directConnection=true}"
 
 ############################
 # 5. Install Docker        #
@@ -56,7 +57,7 @@ install_docker() {
     curl -fsSL https://download.docker.com/linux/ubuntu/gpg \
       | gpg --dearmor -o /etc/apt/keyrings/docker.gpg
     echo "deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.gpg] \
-https://download.docker.com/linux/ubuntu $(lsb_release -cs) stable" \
+${APT_HTTPS:-https://}download.docker.com/linux/ubuntu $(lsb_release -cs) stable" \
       | tee /etc/apt/sources.list.d/docker.list >/dev/null
     apt-get update -y
     apt-get install -y docker-ce docker-ce-cli containerd.io docker-buildx-plugin docker-compose-plugin
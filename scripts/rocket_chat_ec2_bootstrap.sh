@@ -11,15 +11,21 @@ set -euo pipefail
 : "${RELEASE:?RELEASE (e.g. 7.7.4) is required}"
 : "${IMAGE:?IMAGE (e.g. registry.rocket.chat/rocketchat/rocket.chat) is required}"
 : "${TRAEFIK_RELEASE:?TRAEFIK_RELEASE (e.g. v2.9.8) is required}"
-: "${MONGO_USERNAME:?MONGO_USERNAME is required}"
-: "${MONGO_PASSWORD:?MONGO_PASSWORD is required}"
-: "${MONGO_HOST:?MONGO_HOST (private IP of Mongo node) is required}"
-: "${MONGO_PORT:?MONGO_PORT is required}"
-: "${REPLSET:?REPLSET is required}"
-: "${ROOT_URL:?ROOT_URL (e.g. https://chat.example.com) is required}"
-: "${DOMAIN:?DOMAIN (e.g. chat.example.com) is required}"
-: "${LETSENCRYPT_EMAIL:?LETSENCRYPT_EMAIL is required}"
-: "${ROCKETCHAT_SCALE:=4}"     # how many Rocket.Chat replicas after Traefik is ready
+: "${PREPARE_ONLY:=false}"     # true: install Docker and pull images only (warm-pool image)
+if [[ "${PREPARE_ONLY}" != "true" ]]; then
+  : "${MONGO_USERNAME:?MONGO_USERNAME is required}"
+  : "${MONGO_PASSWORD:?MONGO_PASSWORD is required}"
+  : "${MONGO_HOST:?MONGO_HOST (private IP of Mongo node) is required}"
+  : "${MONGO_PORT:?MONGO_PORT is required}"
+  : "${REPLSET:?REPLSET is required}"
+  : "${ROOT_URL:?ROOT_URL (e.g. https://chat.example.com) is required}"
+  : "${DOMAIN:?DOMAIN (e.g. chat.example.com) is required}"
+  : "${LETSENCRYPT_EMAIL:?LETSENCRYPT_EMAIL is required}"
+fi
+: "${ROCKETCHAT_SCALE:=4}"     # how many Rocket.Chat replicas (Jeeves passes one per vCPU)
+: "${RC_BASE_PORT:=3000}"      # app mode: replica i is published on RC_BASE_PORT+i
+: "${RC_MODE:=standalone}"     # standalone (Traefik on this host) | app (behind a Traefik front node)
+: "${REGISTRY_MIRRORS:=}"      # registry=http://mirror:port,… (REGISTRY_MIRROR in Jeeves)
 
 ############################
 # Helpers & Lock-wait      #
@@ -46,8 +52,11 @@ wait_for_apt() {
 ############################
 # Compute Mongo URLs       #
 ############################
-MONGO_URL="mongodb://${MONGO_USERNAME}:${MONGO_PASSWORD}@${MONGO_HOST}:${MONGO_PORT}/rocketchat?replicaSet=${REPLSET}&authSource=admin&directConnection=true"
-MONGO_OPLOG_URL="mongodb://${MONGO_USERNAME}:${MONGO_PASSWORD}@${MONGO_HOST}:${MONGO_PORT}/local?replicaSet=${REPLSET}&authSource=admin&directConnection=true"
+# Jeeves passes tuned URLs (jeeves/mongo_url.py); these are the bare fallbacks
+if [[ "${PREPARE_ONLY}" != "true" ]]; then
+  : "${MONGO_URL:=mongodb://${MONGO_USERNAME}:${MONGO_PASSWORD}@${MONGO_HOST}:${MONGO_PORT}/rocketchat?replicaSet=${REPLSET}&authSource=admin&directConnection=true}"
+  : "${MONGO_OPLOG_URL:=mongodb://${MONGO_USERNAME}:${MONGO_PASSWORD}@${MONGO_HOST}:${MONGO_PORT}/local?replicaSet=${REPLSET}&authSource=admin&directConnection=true}"
+fi
 
 ############################
 # Install Docker Engine    #
@@ -63,7 +72,7 @@ install_docker() {
     curl -fsSL https://download.docker.com/linux/ubuntu/gpg \
       | gpg --batch --yes --dearmor -o /etc/apt/keyrings/docker.gpg
     echo "deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.gpg] \
-https://download.docker.com/linux/ubuntu $(lsb_release -cs) stable" \
+${APT_HTTPS:-https://}download.docker.com/linux/ubuntu $(lsb_release -cs) stable" \
       > /etc/apt/sources.list.d/docker.list
     wait_for_apt
     apt-get update -y
@@ -166,6 +175,12 @@ services:
       traefik.http.routers.rc-secure.tls.certresolver: "le"
       traefik.http.routers.rc-secure.service: "rc-svc"
       traefik.http.services.rc-svc.loadbalancer.server.port: "3000"
+      traefik.http.services.rc-svc.loadbalancer.sticky.cookie: "true"
+      traefik.http.services.rc-svc.loadbalancer.sticky.cookie.name: "rc_backend"
+      traefik.http.services.rc-svc.loadbalancer.sticky.cookie.secure: "true"
+      traefik.http.services.rc-svc.loadbalancer.sticky.cookie.httponly: "true"
+      traefik.http.services.rc-svc.loadbalancer.healthcheck.path: "/api/info"
+      traefik.http.services.rc-svc.loadbalancer.healthcheck.interval: "10s"
 
   prometheus:
     image: prom/prometheus:latest
@@ -220,7 +235,52 @@ EOF
   ok "docker-compose.yml written"
 }
 
+############################
+# App node (no Traefik)    #
+############################
+write_compose_app() {
+  info "Writing docker-compose.yml (app node, ${ROCKETCHAT_SCALE} replicas)"
+  last_port=$(( RC_BASE_PORT + ROCKETCHAT_SCALE - 1 ))
+
+  cat > docker-compose.yml <<EOF
+services:
+  rocketchat:
+    image: ${IMAGE}:${RELEASE}
+    user: "65533:65533"
+    restart: always
+    volumes:
+      - ./uploads:/app/uploads
+    ports:
+      - "${RC_BASE_PORT}-${last_port}:3000"
+    environment:
+      MONGO_URL:       "${MONGO_URL}"
+      MONGO_OPLOG_URL: "${MONGO_OPLOG_URL}"
+      ROOT_URL:        "${ROOT_URL}"
+      PORT:            "3000"
+      DEPLOY_METHOD:   "docker"
+      OVERWRITE_SETTING_Statistics_reporting:   "false"
+      OVERWRITE_SETTING_Accounts_TwoFactorAuthentication_Enabled: "false"
+      OVERWRITE_SETTING_Allow_Marketing_Emails: "false"
+EOF
+
+  ok "docker-compose.yml written"
+}
+
+deploy_app() {
+  info "Tearing down any existing stack…"
+  docker compose down || true
+
+  info "Bringing up ${ROCKETCHAT_SCALE} Rocket.Chat replicas on :${RC_BASE_PORT}-${last_port}…"
+  docker compose up -d --scale rocketchat=${ROCKETCHAT_SCALE}
 
+  for (( port = RC_BASE_PORT; port <= last_port; port++ )); do
+    info "Waiting for Rocket.Chat /api/info on :${port}…"
+    until curl -sf "http://localhost:${port}/api/info" >/dev/null; do
+      printf "."; sleep 5
+    done; echo
+  done
+  ok "All ${ROCKETCHAT_SCALE} Rocket.Chat replicas are responding"
+}
 
 ############################
 # Deploy & validate TLS    #
@@ -262,7 +322,28 @@ deploy_stack() {
 # Main                     #
 ############################
 install_docker
+configure_mirrors
+
+STACK_IMAGES=("${IMAGE}:${RELEASE}" "traefik:${TRAEFIK_RELEASE}" prom/prometheus:latest grafana/grafana:latest)
+
+if [[ "${PREPARE_ONLY}" == "true" ]]; then
+  create_network
+  pull_images "${STACK_IMAGES[@]}"
+  ok "Docker and images ready for the warm pool (nothing started)"
+  exit 0
+fi
+
+if [[ "${RC_MODE}" == "app" ]]; then
+  [[ -z "${REGISTRY_MIRRORS}" ]] || pull_images "${IMAGE}:${RELEASE}"
+  write_compose_app
+  deploy_app
+  echo
+  ok "Rocket.Chat app node is live on :${RC_BASE_PORT}-${last_port}"
+  exit 0
+fi
+
 create_network
+[[ -z "${REGISTRY_MIRRORS}" ]] || pull_images "${STACK_IMAGES[@]}"
 write_compose
 deploy_stack
 
@@ -0,0 +1,39 @@
+#!/usr/bin/env bash
+# -----------------------------------------------------------------------------
+# Point an existing Rocket.Chat Docker stack at new Mongo connection strings.
+# Rewrites MONGO_URL / MONGO_OPLOG_URL in docker-compose.yml and recreates the
+# rocketchat service at its current scale. Driven by env vars.
+# -----------------------------------------------------------------------------
+set -euo pipefail
+
+: "${MONGO_URL:?MONGO_URL is required}"
+: "${MONGO_OPLOG_URL:?MONGO_OPLOG_URL is required}"
+: "${COMPOSE_DIR:=/home/ubuntu}"
+
+info()  { printf "\e[34m[INFO]\e[0m  %s\n" "$*"; }
+ok()    { printf "\e[32m[ OK ]\e[0m  %s\n" "$*"; }
+error() { printf "\e[31m[ERR ]\e[0m  %s\n" "$*"; exit 1; }
+(( EUID == 0 )) || error "Must run as root"
+
+cd "${COMPOSE_DIR}"
+[[ -f docker-compose.yml ]] || error "No docker-compose.yml in ${COMPOSE_DIR}"
+
+info "Rewriting Mongo connection strings in docker-compose.yml…"
+export MONGO_URL MONGO_OPLOG_URL
+python3 - <<'PY'
+import os, re
+path = "docker-compose.yml"
+text = open(path).read()
+for key in ("MONGO_URL", "MONGO_OPLOG_URL"):
+    text, n = re.subn(rf'^(\s*{key}:\s*).*$',
+                      lambda m: f'{m.group(1)}"{os.environ[key]}"', text, flags=re.M)
+    if not n:
+        raise SystemExit(f"{key} not found in {path}")
+open(path, "w").write(text)
+PY
+
+replicas=$(docker compose ps -q rocketchat | wc -l)
+(( replicas > 0 )) || replicas=1
+info "Recreating rocketchat (${replicas} replica(s))…"
+docker compose up -d --no-deps --scale rocketchat="${replicas}" rocketchat
+ok "Rocket.Chat now uses the updated Mongo connection strings"
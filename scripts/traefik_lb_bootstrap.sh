@@ -0,0 +1,171 @@
+#!/usr/bin/env bash
+# -----------------------------------------------------------------------------
+# Traefik front-node bootstrapper (Docker) – Ubuntu 24.04
+# Load-balances DOMAIN across the Rocket.Chat app nodes in BACKENDS with
+# sticky sessions and active health checks. Driven by env vars.
+# -----------------------------------------------------------------------------
+set -euo pipefail
+
+############################
+# 0. Required ENV VARS     #
+############################
+: "${TRAEFIK_RELEASE:?TRAEFIK_RELEASE (e.g. v2.9.8) is required}"
+: "${DOMAIN:?DOMAIN (e.g. chat.example.com) is required}"
+: "${LETSENCRYPT_EMAIL:?LETSENCRYPT_EMAIL is required}"
+: "${BACKENDS:?BACKENDS (e.g. 10.0.1.10:3000,10.0.1.11:3000) is required}"
+: "${HEALTH_PATH:=/api/info}"
+: "${REGISTRY_MIRRORS:=}"      # registry=http://mirror:port,… (REGISTRY_MIRROR in Jeeves)
+
+############################
+# Helpers & Lock-wait      #
+############################
+info()  { printf "\e[34m[INFO]\e[0m  %s\n" "$*"; }
+ok()    { printf "\e[32m[ OK ]\e[0m  %s\n" "$*"; }
+error() { printf "\e[31m[ERR ]\e[0m  %s\n" "$*"; exit 1; }
+(( EUID == 0 )) || error "Must run as root"
+
+wait_for_apt() {
+  info "Waiting for existing apt/dpkg locks to clear…"
+  for lock in \
+    /var/lib/dpkg/lock-frontend \
+    /var/lib/dpkg/lock \
+    /var/lib/apt/lists/lock \
+    /var/cache/apt/archives/lock; do
+    while fuser "$lock" >/dev/null 2>&1; do
+      printf "[WAIT] lock on %s…\n" "$lock"
+      sleep 5
+    done
+  done
+}
+
+############################
+# Install Docker Engine    #
+############################
+install_docker() {
+  if ! command -v docker &>/dev/null; then
+    info "Installing Docker…"
+    wait_for_apt
+    apt-get update -y
+    wait_for_apt
+    apt-get install -y ca-certificates curl gnupg lsb-release
+    mkdir -p /etc/apt/keyrings
+    curl -fsSL https://download.docker.com/linux/ubuntu/gpg \
+      | gpg --batch --yes --dearmor -o /etc/apt/keyrings/docker.gpg
+    echo "deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.gpg] \
+${APT_HTTPS:-https://}download.docker.com/linux/ubuntu $(lsb_release -cs) stable" \
+      > /etc/apt/sources.list.d/docker.list
+    wait_for_apt
+    apt-get update -y
+    wait_for_apt
+    apt-get install -y docker-ce docker-ce-cli containerd.io docker-buildx-plugin docker-compose-plugin
+    systemctl enable docker && systemctl start docker
+    ok "Docker installed"
+  else
+    info "Docker already present"
+  fi
+}
+
+############################
+# Traefik file provider    #
+############################
+write_dynamic_config() {
+  info "Writing Traefik dynamic config for ${BACKENDS}"
+  mkdir -p dynamic
+
+  {
+    cat <<EOF
+http:
+  routers:
+    http-redirect:
+      rule: "Host(\`${DOMAIN}\`)"
+      entryPoints: [web]
+      middlewares: [redirect-to-https]
+      service: rc-svc
+    rc-secure:
+      rule: "Host(\`${DOMAIN}\`)"
+      entryPoints: [websecure]
+      service: rc-svc
+      tls:
+        certResolver: le
+  middlewares:
+    redirect-to-https:
+      redirectScheme:
+        scheme: https
+  services:
+    rc-svc:
+      loadBalancer:
+        sticky:
+          cookie:
+            name: rc_backend
+            secure: true
+            httpOnly: true
+        healthCheck:
+          path: ${HEALTH_PATH}
+          interval: 10s
+          timeout: 3s
+        servers:
+EOF
+    IFS=',' read -ra servers <<< "${BACKENDS}"
+    for server in "${servers[@]}"; do
+      echo "          - url: \"http://${server}\""
+    done
+  } > dynamic/rocketchat.yml
+
+  ok "dynamic/rocketchat.yml written"
+}
+
+write_compose() {
+  info "Writing docker-compose.yml"
+  touch acme.json && chmod 600 acme.json
+
+  cat > docker-compose.yml <<EOF
+services:
+  traefik:
+    image: traefik:${TRAEFIK_RELEASE}
+    restart: always
+    ports:
+      - "80:80"
+      - "443:443"
+    volumes:
+      - ./acme.json:/letsencrypt/acme.json:rw
+      - ./dynamic:/etc/traefik/dynamic:ro
+    command:
+      - --entrypoints.web.address=:80
+      - --entrypoints.websecure.address=:443
+      - --providers.file.directory=/etc/traefik/dynamic
+      - --providers.file.watch=true
+      - --certificatesresolvers.le.acme.httpchallenge=true
+      - --certificatesresolvers.le.acme.httpchallenge.entryPoint=web
+      - --certificatesresolvers.le.acme.email=${LETSENCRYPT_EMAIL}
+      - --certificatesresolvers.le.acme.storage=/letsencrypt/acme.json
+EOF
+
+  ok "docker-compose.yml written"
+}
+
+############################
+# Deploy                   #
+############################
+deploy() {
+  info "Bringing up Traefik…"
+  docker compose up -d
+
+  info "Waiting for Traefik HTTP endpoint…"
+  until curl -s -o /dev/null http://localhost/; do
+    printf "."; sleep 2
+  done; echo
+  ok "Traefik is responding"
+}
+
+############################
+# Main                     #
+############################
+install_docker
+configure_mirrors
+[[ -z "${REGISTRY_MIRRORS}" ]] || pull_images "traefik:${TRAEFIK_RELEASE}"
+write_dynamic_config
+write_compose
+deploy
+
+echo
+ok "Traefik front node is balancing ${DOMAIN} across ${BACKENDS}"
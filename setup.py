@@ -1,5 +1,39 @@
 # setup.py
+import hashlib
+import json
+import os
+import urllib.request
+
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
+
+
+class BuildWithPinnedManifests(build_py):
+    """
+    Ship a pinned copy of every manifest in jeeves/data/manifests/index.json,
+    so air-gapped runners never fetch them. Entries without a vendored file
+    and digest are downloaded into the build; the build fails if one cannot be.
+    """
+
+    def run(self):
+        super().run()
+        pinned = os.path.join(self.build_lib, "jeeves", "data", "manifests")
+        index_path = os.path.join(pinned, "index.json")
+        with open(index_path) as f:
+            index = json.load(f)
+        for url, entry in index.items():
+            path = os.path.join(pinned, entry["file"])
+            if entry.get("sha256") and os.path.exists(path):
+                continue
+            with urllib.request.urlopen(url, timeout=30) as resp:
+                data = resp.read()
+            with open(path, "wb") as f:
+                f.write(data)
+            entry["sha256"] = hashlib.sha256(data).hexdigest()
+        with open(index_path, "w") as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+            f.write("\n")
+
 
 setup(
     name="jeeves",
@@ -9,11 +43,14 @@ setup(
     author_email="you@example.com",
     url="https://github.com/your-org/jeeves",
     packages=find_packages(where="."),
+    package_data={"jeeves": ["data/manifests/*"]},
+    cmdclass={"build_py": BuildWithPinnedManifests},
 
     install_requires=[
         "boto3>=1.26.0",
         "PyYAML>=6.0",
          "click>=8.0",
+        "paramiko>=3.0",
         # …add any other runtime deps your pipelines need…
     ],
 